@@ -3,6 +3,12 @@ ASGI config for auth_service project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Running under ASGI also switches on settings.ASYNC_API, so the hot API paths are
+served by the native async views in authentication/async_views.py. Serve it with
+an ASGI server, e.g.:
+
+    uvicorn auth_service.asgi:application --workers 4
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -12,5 +18,11 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'auth_service.settings')
+os.environ.setdefault('AUTH_SERVICE_ASYNC_API', '1')
 
 application = get_asgi_application()
+
+# Load the username/email availability filter while the worker warms up
+from authentication.availability import availability_index  # noqa: E402
+
+availability_index.start()
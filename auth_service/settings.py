@@ -46,9 +46,15 @@ LOCAL_APPS = [
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
+# The full middleware stack, for the admin and any path not in MIDDLEWARE_PROFILES.
+# PrefixMiddleware hands paths that are to their own chain instead, and the middleware
+# below it is skipped (see authentication/middleware.py).
 MIDDLEWARE = [
-    'corsheaders.middleware.CorsMiddleware',
+    'authentication.middleware.ServerTimingMiddleware',  # First, so its total covers everything below
+    'authentication.middleware.ProbeMiddleware',         # Health probes answered right here
+    'corsheaders.middleware.CorsMiddleware',             # Answers CORS preflights itself
     'django.middleware.security.SecurityMiddleware',
+    'authentication.middleware.PrefixMiddleware',        # MIDDLEWARE_PROFILES paths branch off here
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,6 +63,18 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Leaner middleware by path prefix (longest match wins). The /auth/ API is stateless JWT
+# and doesn't need sessions, CSRF or messages - DRF checks CSRF itself for session-authenticated
+# requests. Everything else (the admin, too) runs the rest of MIDDLEWARE.
+API_MIDDLEWARE = [
+    'django.middleware.common.CommonMiddleware',
+]
+MIDDLEWARE_PROFILES = {
+    '/auth/': API_MIDDLEWARE,
+    '/health/': API_MIDDLEWARE,
+    '/metrics': API_MIDDLEWARE,
+}
+
 ROOT_URLCONF = 'auth_service.urls'
 
 TEMPLATES = [
@@ -77,15 +95,99 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'auth_service.wsgi.application'
 
+# Serve the hot API paths (login, register, profile, token refresh, logout) with native
+# async views instead of DRF's sync ones. auth_service/asgi.py switches this on, so it is
+# only active when running under an ASGI server like uvicorn (see README).
+ASYNC_API = os.environ.get('AUTH_SERVICE_ASYNC_API') == '1'
+
 
 # Database
-# Using SQLite for development - easy to set up and portable
-# The database will be created automatically as a file called 'db.sqlite3'
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Two setups, picked with AUTH_DB_ENGINE:
+#
+# sqlite (default) - db.sqlite3 next to manage.py (or AUTH_DB_PATH), created automatically.
+#   Tuned for a server with several workers: WAL journal (readers and the writer don't block
+#   each other), synchronous=NORMAL (safe with WAL - fsyncs at checkpoints instead of on
+#   every commit), a busy timeout so a writer waits for the lock instead of failing with
+#   "database is locked", and IMMEDIATE transactions so a transaction that reads and then
+#   writes can't deadlock upgrading its lock.
+# postgres - AUTH_DB_NAME/USER/PASSWORD/HOST/PORT. Connections stay open for CONN_MAX_AGE
+#   seconds (and are checked before reuse), or with AUTH_DB_POOL=1 come from psycopg's
+#   connection pool (pip install "psycopg[pool]").
+#
+# Either way AUTH_DB_REPLICA (a host for postgres, a file for sqlite) adds a 'replica'
+# database for user lookups, profile reads and token checks (see authentication/routers.py).
+# Locally two SQLite files can stand in for primary and replica: `manage.py sync_replica`
+# copies the one into the other.
+SQLITE_OPTIONS = {
+    'timeout': 5,  # busy_timeout, in seconds
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA cache_size=-16000;'  # 16 MB page cache per connection
+        'PRAGMA temp_store=MEMORY'
+    ),
+}
+
+if os.environ.get('AUTH_DB_ENGINE', 'sqlite') == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('AUTH_DB_NAME', 'auth_service'),
+            'USER': os.environ.get('AUTH_DB_USER', 'auth_service'),
+            'PASSWORD': os.environ.get('AUTH_DB_PASSWORD', ''),
+            'HOST': os.environ.get('AUTH_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('AUTH_DB_PORT', '5432'),
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('AUTH_DB_POOL') == '1':
+        # The pool keeps the connections, Django hands them back after every request
+        DATABASES['default'].update(
+            CONN_MAX_AGE=0,
+            OPTIONS={'pool': {'min_size': 2, 'max_size': int(os.environ.get('AUTH_DB_POOL_SIZE', 10))}},
+        )
+    REPLICA_SETTINGS = {'HOST': os.environ.get('AUTH_DB_REPLICA')}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('AUTH_DB_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': 600,
+            'OPTIONS': SQLITE_OPTIONS,
+        }
     }
+    REPLICA_SETTINGS = {'NAME': os.environ.get('AUTH_DB_REPLICA')}
+
+if os.environ.get('AUTH_DB_REPLICA'):
+    # Tests run against the primary's test database for both
+    DATABASES['replica'] = {**DATABASES['default'], **REPLICA_SETTINGS, 'TEST': {'MIRROR': 'default'}}
+
+# User shards (see authentication/sharding.py)
+# AUTH_DB_SHARDS spreads users over 'default' plus one more database per entry (comma-separated
+# files for sqlite, hosts for postgres), by a hash of the username. Set up with
+# `manage.py migrate_shards`. Can't be combined with AUTH_DB_REPLICA, and the shard list
+# can't change once users are in it.
+SHARD_NAMES = [name for name in os.environ.get('AUTH_DB_SHARDS', '').split(',') if name]
+for number, name in enumerate(SHARD_NAMES, start=1):
+    shard_settings = {'HOST': name} if DATABASES['default']['ENGINE'].endswith('postgresql') else {'NAME': name}
+    DATABASES[f'shard{number}'] = {**DATABASES['default'], **shard_settings}
+USER_SHARDS = {
+    'DATABASES': ['default', *(f'shard{number}' for number in range(1, len(SHARD_NAMES) + 1))],
+}
+
+DATABASE_ROUTERS = [
+    'authentication.sharding.ShardRouter',
+    'authentication.routers.PrimaryReplicaRouter',
+]
+
+# Read replica routing (see authentication/routers.py)
+# After a user is written, their reads stay on the primary for READ_YOUR_WRITES seconds -
+# keep it above the replica's worst lag.
+DATABASE_REPLICA = {
+    'ALIAS': 'replica',
+    'READ_YOUR_WRITES': 10,
 }
 
 # Custom User Model
@@ -94,9 +196,10 @@ AUTH_USER_MODEL = 'authentication.User'
 
 # Authentication Backends
 # This enables login with either username OR email
+# (EmailOrUsernameModelBackend is a ModelBackend, so it already covers plain username
+# logins and permissions - a second ModelBackend would just hash every failed login twice)
 AUTHENTICATION_BACKENDS = [
     'authentication.backends.EmailOrUsernameModelBackend',
-    'django.contrib.auth.backends.ModelBackend',  # Keep default as fallback
 ]
 
 
@@ -121,6 +224,18 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing worker pool (see authentication/hashing.py)
+# PBKDF2 is slow on purpose, so hashing and verifying passwords runs in a small process
+# pool instead of on the request thread. MAX_PENDING caps how many hash jobs can be queued
+# or running at once - past that, login/register/change-password get a fast 503 so cheap
+# endpoints like /auth/user/ and /health/ don't queue up behind a login storm.
+# Set WORKERS to 0 to hash inline on the request thread (the MAX_PENDING cap still applies).
+PASSWORD_HASHER_POOL = {
+    'WORKERS': int(os.environ.get('AUTH_HASHER_WORKERS', max(1, (os.cpu_count() or 2) // 2))),
+    'MAX_PENDING': int(os.environ.get('AUTH_HASHER_MAX_PENDING', 16)),
+    'TIMEOUT': 10,  # Seconds to wait for a hash before giving up with a 503
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -144,14 +259,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Builds request.user from the token claims, no User SELECT unless a view needs the row
+        'authentication.authentication.StatelessJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',  # For admin interface
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        # DRF's JSON on orjson when it's installed (same bytes, less CPU), timed for Server-Timing
+        'authentication.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
@@ -162,8 +279,8 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),     # Access tokens expire in 1 hour
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),       # Refresh tokens expire in 1 week
     'ROTATE_REFRESH_TOKENS': True,                      # Generate new refresh token on refresh
-    'BLACKLIST_AFTER_ROTATION': True,                   # Blacklist old refresh tokens
-    'UPDATE_LAST_LOGIN': True,                          # Update last_login field on login
+    'BLACKLIST_AFTER_ROTATION': True,                   # Old refresh tokens stop working (token families, see authentication/families.py)
+    'UPDATE_LAST_LOGIN': True,                          # Update last_login field on login (buffered, see LOGIN_WRITES)
     
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
@@ -172,6 +289,7 @@ SIMPLE_JWT = {
     'ISSUER': None,
     
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'AUTH_TOKEN_CLASSES': ('authentication.tokens.AccessToken',),
     'AUTH_HEADER_NAME': 'HTTP_AUTHORIZATION',
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
@@ -182,6 +300,170 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=60),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
+    
+    # Issue tokens with the username/is_active/token_version claims (see authentication/tokens.py)
+    'TOKEN_OBTAIN_SERIALIZER': 'authentication.serializers.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'authentication.serializers.TokenRefreshSerializer',
+    'TOKEN_VERIFY_SERIALIZER': 'authentication.serializers.TokenVerifySerializer',
+}
+
+# Asymmetric token signing (see authentication/keys.py)
+# Tokens are signed with a private key and carry its key id ("kid"), so other services can
+# verify them locally with the public keys from /auth/.well-known/jwks.json instead of calling
+# /auth/token/verify/. Rotate with `python manage.py rotate_signing_key` - new keys are published
+# PUBLISH_AHEAD before they start signing, old ones stay published until their tokens expire.
+# SIMPLE_JWT's ALGORITHM/SIGNING_KEY above are only used for everything if ALGORITHM here is set
+# to 'HS256', or for tokens issued before the switch until ACCEPT_LEGACY_HS256_UNTIL. Set that
+# (AUTH_JWT_LEGACY_HS256_UNTIL, an ISO datetime) to the switch time plus REFRESH_TOKEN_LIFETIME
+# when migrating, never later - anyone with the HS256 key can forge tokens without a kid, and
+# the SECRET_KEY above is not a secret.
+JWT_KEYS = {
+    'ALGORITHM': os.environ.get('AUTH_JWT_ALGORITHM', 'RS256'),  # RS256 or EdDSA (faster to sign)
+    'KEY_DIR': os.environ.get('AUTH_JWT_KEY_DIR', BASE_DIR / 'keys'),  # Shared by every instance, keep out of git!
+    'PUBLISH_AHEAD': timedelta(hours=2),    # Must be longer than JWKS_MAX_AGE
+    'JWKS_MAX_AGE': 3600,                   # Seconds consumers may cache the JWKS
+    'ACCEPT_LEGACY_HS256_UNTIL': os.environ.get('AUTH_JWT_LEGACY_HS256_UNTIL'),  # Unset: reject tokens without a kid
+    'CREATE_FIRST_KEY': False,              # Create the first key with `rotate_signing_key --now` instead
+}
+
+# Token revocation store (see authentication/revocation.py)
+# Logout revokes tokens by jti (rotated refresh tokens are retired by their token family
+# instead, see authentication/families.py, except ones issued before families). Revocations are
+# written to the RevokedToken table in batches, and every process keeps a Bloom filter of them
+# so checking a token that was never revoked doesn't touch the database at all.
+# A revocation reaches other processes within FLUSH_INTERVAL + SYNC_INTERVAL seconds.
+# Expired rows are left to `manage.py purge_expired` (see PURGE below).
+REVOCATION_STORE = {
+    'CAPACITY': 1_000_000,      # Initial Bloom filter size (grows with the table on rebuilds)
+    'ERROR_RATE': 0.001,        # Share of unrevoked tokens that still need a DB lookup
+    'BATCH_SIZE': 1000,         # Revocations per INSERT batch
+    'FLUSH_INTERVAL': 1.0,      # Seconds between batched writes
+    'SYNC_INTERVAL': 5.0,       # Seconds between pulls of other processes' revocations
+    'SYNC_OVERLAP': 60.0,       # Seconds re-read each sync - flushes that commit late (or replica lag, clock skew)
+    'REBUILD_INTERVAL': 3600.0, # Seconds between filter rebuilds (drops expired jtis, resizes)
+}
+
+# Admin user list (see authentication/changelist.py)
+# Unfiltered lists of EXACT_COUNT_BELOW users or more show the database's row estimate instead of
+# a COUNT(*); filtered and searched lists count up to COUNT_LIMIT. On Postgres, searches of
+# TRIGRAM_MIN_LENGTH characters or more match anywhere in the username/email, shorter ones by prefix.
+ADMIN_CHANGELIST = {
+    'EXACT_COUNT_BELOW': 100_000,
+    'COUNT_LIMIT': 10_000,
+    'TRIGRAM_MIN_LENGTH': 3,
+}
+
+# Admin bulk actions on users (see authentication/bulk_actions.py)
+# Activating/deactivating users in the admin queues a job that a background thread works through
+# CHUNK_SIZE users (one UPDATE) at a time, SLEEP seconds apart, saving its progress after each.
+# A job whose process died is picked up again STALE_AFTER seconds later.
+BULK_ACTIONS = {
+    'CHUNK_SIZE': 1000,         # Users per UPDATE
+    'SLEEP': 0.05,              # Seconds between chunks
+    'POLL_INTERVAL': 5.0,       # Seconds between looks for queued or abandoned jobs
+    'STALE_AFTER': 60.0,        # Seconds without progress before a running job counts as abandoned
+}
+
+# Purging expired rows (manage.py purge_expired, see authentication/purge.py)
+# Revoked tokens, token families and sessions are deleted in BATCH_SIZE batches along their
+# expiry index, with SLEEP seconds in between so the service's own writes never wait long.
+# Run it from cron; an interrupted run resumes from its checkpoint.
+PURGE = {
+    'BATCH_SIZE': 1000,         # Rows per DELETE
+    'SLEEP': 0.05,              # Seconds between batches
+    'MAX_RATE': None,           # Rows per second cap, None for no cap
+}
+
+# Batch token verification (POST /auth/token/verify/batch/, see authentication/introspection.py)
+TOKEN_INTROSPECTION = {
+    'MAX_TOKENS': 100,          # Tokens per request
+}
+
+# What a login writes (see authentication/last_login.py)
+# API clients authenticate with tokens, so /auth/login/ doesn't create a Django session unless
+# CREATE_SESSION is on. last_login updates from every kind of login are kept in memory and
+# written in bulk every FLUSH_INTERVAL seconds instead of one UPDATE per login - the column
+# (and the profile's last_login) can lag by that much.
+LOGIN_WRITES = {
+    'CREATE_SESSION': False,    # Session + cookie on API login (also add the session middleware to the API profile)
+    'FLUSH_INTERVAL': 5.0,      # Max seconds a last_login waits in memory
+    'BATCH_SIZE': 500,          # Users per UPDATE (a full buffer flushes early)
+}
+
+# Authentication audit trail (see authentication/audit.py)
+# Logins, failed logins, registrations, password changes, logouts and token refreshes are
+# kept in memory and inserted into the AuthEvent table in bulk every FLUSH_INTERVAL seconds,
+# so the trail can lag by that much. Past MAX_PENDING waiting events new ones are dropped
+# (counted under component="audit" in /metrics) rather than slowing requests down.
+AUDIT_LOG = {
+    'ENABLED': True,
+    'FLUSH_INTERVAL': 1.0,      # Max seconds an event waits in memory
+    'BATCH_SIZE': 1000,         # Events per INSERT (a full batch flushes early)
+    'MAX_PENDING': 100_000,     # Events kept in memory while the database is behind
+}
+
+# Username/email availability checks (GET /auth/availability/, see authentication/availability.py)
+# Every process keeps a Bloom filter of the taken usernames and emails, so names that are
+# free (most of what signup forms ask about) are answered without a query. Filter hits are
+# confirmed on the LOWER() unique index. Other processes' signups show up within SYNC_INTERVAL.
+# The filter is built by `manage.py rebuild_availability` - schedule it, e.g. hourly from cron;
+# until it has run once, every check is a query. Checks are counted per client IP in CACHE
+# (per process with the default LocMemCache, use a shared cache for a global limit).
+AVAILABILITY = {
+    'CAPACITY': 1_000_000,      # Minimum filter size in keys (2 per user, rebuilds size it for the table)
+    'ERROR_RATE': 0.01,         # Share of free names that still need a DB lookup (~1.2 bytes/key)
+    'BATCH_SIZE': 5000,         # Rows per chunk when reading auth_user
+    'SYNC_INTERVAL': 5.0,       # Seconds between pulls of other processes' new users (and new filters)
+    'SYNC_OVERLAP': 60.0,       # Seconds of signups re-read each sync, for inserts that commit late
+    'MAX_CHECKS': 60,           # Checks per client IP per WINDOW, None for no limit
+    'WINDOW': 60,               # Seconds
+    'CACHE': 'default',         # Alias in CACHES for the per-IP counts
+}
+
+# Request metrics (see authentication/metrics.py)
+# The time spent in each phase of a request (db, hash, session, ...) feeds the Prometheus
+# histograms served at /metrics, to scrapers sending AUTH_TOKEN. SERVER_TIMING also puts a
+# request's own timings in a Server-Timing header - keep it off for public callers, the
+# timings and query counts of a login tell them whether an email is registered.
+# With several worker processes, point MULTIPROCESS_DIR at a directory all of them share
+# (and empty it on deploy) so /metrics reports every worker, not just the one scraped.
+METRICS = {
+    'SERVER_TIMING': False,     # True for every response, 'internal' for INTERNAL_IPS callers only
+    'MULTIPROCESS_DIR': os.environ.get('AUTH_METRICS_DIR'),
+    'WRITE_INTERVAL': 5.0,      # Seconds between dumps in multiprocess mode
+    'AUTH_TOKEN': os.environ.get('AUTH_METRICS_TOKEN'),  # Bearer token scrapers must send
+    'PUBLIC': False,            # Serve /metrics to anyone when AUTH_TOKEN isn't set
+}
+
+# Readiness checks for /health/ready/ (see authentication/health.py)
+# Results are cached per process so frequent probes from many load balancers
+# cost at most one database ping per CACHE_TTL.
+HEALTH_CHECKS = {
+    'CACHE_TTL': 2.0,           # Seconds a readiness result is reused
+    'HASHER_TIMEOUT': 5.0,      # Seconds the hasher pool gets to answer a ping (first one starts it)
+    'LATENCY_WINDOW': 100,      # Check runs kept for the latency stats
+}
+
+# Caches
+# LocMemCache is per process - point this at Redis/Memcached when running several
+# workers so they share the user cache below
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth-service',
+    },
+}
+
+# Per-user object cache (see authentication/cache.py)
+# Token auth, get_user() and profile reads go through a small in-process LRU in front of
+# the shared cache above. Saves invalidate both layers, but other processes' LRUs only
+# notice when their entries expire, so keep LOCAL_TIMEOUT short.
+# Hit/miss counters for sizing show up under component="user_cache" in /metrics.
+USER_CACHE = {
+    'CACHE': 'default',         # Alias in CACHES
+    'TIMEOUT': 300,             # Seconds a user stays in the shared cache
+    'LOCAL_MAX_SIZE': int(os.environ.get('AUTH_USER_CACHE_SIZE', 10000)),
+    'LOCAL_TIMEOUT': 5,         # Seconds a user stays in the in-process LRU
 }
 
 # CORS Configuration for Flutter Desktop App
@@ -219,10 +501,14 @@ X_FRAME_OPTIONS = 'DENY'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # Prints to console for development
 
 # Logging Configuration
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'handlers': {
+# By default (AUTH_LOG_MODE=queue) logging never writes on the request thread: records go onto a
+# bounded queue and a background thread writes them as JSON lines, in batches (see
+# authentication/logs.py). A full queue drops records (counted in /metrics) rather than
+# making requests wait, and only 1% of DEBUG records make it to the console.
+# AUTH_LOG_MODE=sync writes plain text straight from the logging call, like before.
+LOG_MODE = os.environ.get('AUTH_LOG_MODE', 'queue')
+if LOG_MODE == 'sync':
+    LOG_HANDLERS = {
         'file': {
             'level': 'INFO',
             'class': 'logging.FileHandler',
@@ -232,7 +518,30 @@ LOGGING = {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
         },
-    },
+    }
+else:
+    LOG_HANDLERS = {
+        'file': {
+            'level': 'INFO',
+            'class': 'authentication.logs.QueueLogHandler',
+            'filename': BASE_DIR / 'auth_service.log',
+            'queue_size': 10000,    # Records waiting before new ones are dropped
+            'batch_size': 500,      # Records per write()
+        },
+        'console': {
+            'level': 'DEBUG',
+            'class': 'authentication.logs.QueueLogHandler',
+            'stream': 'stderr',
+            'queue_size': 10000,
+            'batch_size': 500,
+            'sampling': {'DEBUG': 0.01},  # Share of records kept, by level
+        },
+    }
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': LOG_HANDLERS,
     'loggers': {
         'django': {
             'handlers': ['file', 'console'],
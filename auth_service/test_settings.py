@@ -0,0 +1,42 @@
+"""
+Settings for `manage.py test` (manage.py picks them for the test command).
+
+Same as the real settings, except:
+
+- No background threads write to the test database behind the tests' backs.
+  The audit trail, last_login buffer, revocation store, availability index
+  and bulk job runner only do their work when called (tests flush them, see
+  authentication/tests/base.py) - and there's nothing left for their atexit
+  flushes once the test database is gone.
+- Logging stays off the console and out of auth_service.log, apart from
+  errors. Tests that expect a log record catch it with assertLogs().
+- Passwords use MD5, hashed inline, so the suite isn't all PBKDF2.
+"""
+
+from auth_service.settings import *  # noqa: F401,F403
+from auth_service.settings import (
+    AUDIT_LOG, AVAILABILITY, BULK_ACTIONS, LOGGING, LOGIN_WRITES, PASSWORD_HASHER_POOL, REVOCATION_STORE,
+)
+
+AUDIT_LOG = {**AUDIT_LOG, 'BACKGROUND': False}
+LOGIN_WRITES = {**LOGIN_WRITES, 'BACKGROUND': False}
+REVOCATION_STORE = {**REVOCATION_STORE, 'BACKGROUND': False}
+AVAILABILITY = {**AVAILABILITY, 'BACKGROUND': False}
+BULK_ACTIONS = {**BULK_ACTIONS, 'BACKGROUND': False}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+PASSWORD_HASHER_POOL = {**PASSWORD_HASHER_POOL, 'WORKERS': 0}
+
+LOGGING = {
+    **LOGGING,
+    'handlers': {
+        'console': {
+            'level': 'ERROR',
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        name: {**logger, 'handlers': ['console']}
+        for name, logger in LOGGING['loggers'].items()
+    },
+}
@@ -5,7 +5,7 @@ Main URL routing for the authentication microservice.
 """
 from django.contrib import admin
 from django.urls import path, include
-from authentication.views import health_check
+from authentication.views import health_check, liveness, metrics
 
 urlpatterns = [
     # Admin interface
@@ -14,9 +14,14 @@ urlpatterns = [
     # Authentication API endpoints
     path('auth/', include('authentication.urls')),
     
-    # Health check endpoint (for monitoring)
+    # Health checks (for monitoring and load balancer probes)
     path('health/', health_check, name='health_check'),
+    path('health/live/', liveness, name='liveness'),
+    path('health/ready/', health_check, name='readiness'),
     
-    # Root endpoint - API info
-    path('', health_check, name='root'),
+    # Prometheus scrape endpoint
+    path('metrics', metrics, name='metrics'),
+    
+    # Root endpoint - stray traffic gets the cheap liveness answer, not the readiness checks
+    path('', liveness, name='root'),
 ]
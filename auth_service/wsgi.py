@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'auth_service.settings')
 
 application = get_wsgi_application()
+
+# Load the username/email availability filter while the worker warms up
+from authentication.availability import availability_index  # noqa: E402
+
+availability_index.start()
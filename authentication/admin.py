@@ -1,5 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils.html import format_html
+
+from .bulk_actions import ACTIONS, FILTER_FIELDS, bulk_jobs
+from .changelist import EstimatedCountPaginator, UserChangeList, search_users, selection_params
+from .models import AuthEvent, BulkJob
 
 User = get_user_model()
 
@@ -10,6 +16,8 @@ class UserAdmin(admin.ModelAdmin):
     Admin interface for the custom User model.
     
     This provides basic user management through the Django admin interface.
+    The user list is built to stay fast with millions of users: estimated
+    counts, keyset paging and indexed search (see changelist.py).
     """
     
     # Fields to display in the user list
@@ -18,14 +26,13 @@ class UserAdmin(admin.ModelAdmin):
         'is_active', 'email_verified', 'date_joined'
     )
     
-    # Fields that can be searched
-    search_fields = ('username', 'email', 'first_name', 'last_name')
+    # Fields that can be searched - by prefix, see get_search_results()
+    search_fields = ('username', 'email')
+    search_help_text = 'Username or email, starting with'
     
-    # Filters for the right sidebar
-    list_filter = (
-        'is_active', 'is_staff', 'is_superuser', 
-        'email_verified', 'date_joined'
-    )
+    # Filters for the right sidebar (is_active, is_staff, is_superuser, email_verified,
+    # date_joined) - "select all" bulk jobs store them, so they're shared with bulk_actions.py
+    list_filter = FILTER_FIELDS
     
     # Fields to display when editing/adding a user
     fields = (
@@ -37,20 +44,111 @@ class UserAdmin(admin.ModelAdmin):
     # Read-only fields
     readonly_fields = ('date_joined', 'last_login')
     
-    # Ordering
+    # Ordering (newest first pages by keyset on auth_user_joined_idx)
     ordering = ('-date_joined',)
     
-    # Enable bulk actions
+    # No exact COUNT(*)s and no OFFSET paging on a big table
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    
+    def get_changelist(self, request, **kwargs):
+        return UserChangeList
+    
+    def get_search_results(self, request, queryset, search_term):
+        return search_users(queryset, search_term), False
+    
+    # Enable bulk actions - they run as background jobs (see bulk_actions.py)
     actions = ['make_active', 'make_inactive']
     
+    def _submit(self, request, queryset, action):
+        """Queue action over the selection and link to its progress."""
+        if request.POST.get('select_across') == '1':
+            filters, search = selection_params(request)
+            selection = {'filters': filters, 'search': search}
+        else:
+            selection = {'ids': list(queryset.values_list('pk', flat=True))}
+        job = bulk_jobs.submit(action, selection, request.user)
+        url = reverse('admin:authentication_bulkjob_change', args=[job.pk])
+        self.message_user(request, format_html(
+            '{} the selected users in the background - <a href="{}">follow job #{}</a>.',
+            ACTIONS[action][1], url, job.pk,
+        ))
+    
     def make_active(self, request, queryset):
         """Bulk action to activate users."""
-        queryset.update(is_active=True)
-        self.message_user(request, f"{queryset.count()} users have been activated.")
+        self._submit(request, queryset, 'activate')
     make_active.short_description = "Mark selected users as active"
     
     def make_inactive(self, request, queryset):
-        """Bulk action to deactivate users."""
-        queryset.update(is_active=False)
-        self.message_user(request, f"{queryset.count()} users have been deactivated.")
+        """Bulk action to deactivate users (and revoke their tokens)."""
+        self._submit(request, queryset, 'deactivate')
     make_inactive.short_description = "Mark selected users as inactive"
+
+
+@admin.register(BulkJob)
+class BulkJobAdmin(admin.ModelAdmin):
+    """
+    Status of the user bulk actions: one row per job, read-only.
+    
+    Progress is saved after every chunk, so reloading shows how far a job got.
+    """
+    
+    list_display = ('__str__', 'status', 'progress_display', 'processed', 'total', 'changed',
+                    'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'action')
+    fields = ('action', 'status', 'progress_display', 'processed', 'total', 'changed', 'cursor',
+              'error', 'created_by', 'created_at', 'updated_at', 'finished_at')
+    readonly_fields = fields
+    actions = ['cancel']
+    
+    @admin.display(description='Progress')
+    def progress_display(self, job):
+        progress = job.progress
+        return '-' if progress is None else f'{progress:.0%}'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_cancel_permission(self, request):
+        # Jobs are never edited by hand, but stopping one is a change
+        return request.user.has_perm('authentication.change_bulkjob')
+    
+    @admin.action(description='Cancel selected jobs', permissions=['cancel'])
+    def cancel(self, request, queryset):
+        """Stop queued and running jobs - a running one after its current chunk."""
+        cancelled = queryset.filter(status__in=[BulkJob.QUEUED, BulkJob.RUNNING]).update(status=BulkJob.CANCELLED)
+        self.message_user(request, f"{cancelled} jobs cancelled.")
+
+
+@admin.register(AuthEvent)
+class AuthEventAdmin(admin.ModelAdmin):
+    """
+    The authentication audit trail, read-only (see audit.py).
+    
+    Newest first off auth_event_created_idx, filter by user id with ?user_id=.
+    Events show up here FLUSH_INTERVAL seconds after they happen.
+    """
+    
+    list_display = ('created_at', 'kind', 'user_id', 'login', 'ip', 'user_agent')
+    list_filter = ('kind',)
+    fields = list_display
+    readonly_fields = fields
+    ordering = ('-created_at',)
+    
+    # Same as the user list: the table only grows
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
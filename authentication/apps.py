@@ -4,3 +4,29 @@ from django.apps import AppConfig
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+
+    def ready(self):
+        # Connects the signals that keep the user cache fresh
+        from . import cache  # noqa: F401
+        # Keeps the username/email availability index up to date
+        from . import availability  # noqa: F401
+        # Registers the check for the admin's middleware profile
+        from . import middleware  # noqa: F401
+
+        # Sharded users: id ranges per shard, email claims freed with their user
+        from django.db.models.signals import post_delete, post_migrate
+        from .sharding import release_email, set_id_range
+        post_migrate.connect(set_id_range, sender=self, dispatch_uid='shard_id_range')
+        post_delete.connect(release_email, sender=self.get_model('User'), dispatch_uid='shard_release_email')
+
+        # last_login goes through the write buffer instead of an UPDATE per login
+        from django.contrib.auth.signals import user_logged_in
+        from .last_login import record_login
+        user_logged_in.disconnect(dispatch_uid='update_last_login')
+        user_logged_in.connect(record_login, dispatch_uid='buffered_last_login')
+
+        # Logins and failed logins go into the audit trail (the views record the rest)
+        from django.contrib.auth.signals import user_login_failed
+        from .audit import record_logged_in, record_login_failed
+        user_logged_in.connect(record_logged_in, dispatch_uid='audit_logged_in')
+        user_login_failed.connect(record_login_failed, dispatch_uid='audit_login_failed')
@@ -0,0 +1,251 @@
+"""
+Native async versions of the hot API views.
+
+DRF views are sync only, so under ASGI every request to them is pushed through a
+sync_to_async thread hop. When settings.ASYNC_API is on (auth_service/asgi.py turns
+it on), urls.py serves login, register, profile, token refresh, logout and the
+availability check from the views in this module instead. They use the async ORM
+(aget/acreate/asave) and await password hashing on the hasher pool, so the event
+loop never blocks on PBKDF2.
+
+Request and response bodies are the same as the DRF views in views.py - the
+serializers are shared, errors come back in DRF's format and tokens are the
+same tokens.py tokens.
+"""
+
+import json
+
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException,
+    AuthenticationFailed,
+    NotAuthenticated,
+    ParseError,
+)
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import audit, families
+from .authentication import StatelessJWTAuthentication
+from .availability import acheck_availability, athrottle, availability_response
+from .cache import user_cache
+from .last_login import alogged_in
+from .metrics import timed
+from .models import AuthEvent
+from .renderers import render_json
+from .serializers import (
+    UserRegistrationSerializer,
+    UserLoginSerializer,
+    serialize_user,
+    UserProfileUpdateSerializer,
+    arefresh_tokens,
+)
+from .tokens import RefreshToken
+
+jwt_authentication = StatelessJWTAuthentication()
+
+
+def api_response(data, status=status.HTTP_200_OK, headers=None):
+    """JSON response rendered like DRF's JSONRenderer, so output matches the DRF views."""
+    with timed('render'):
+        return HttpResponse(render_json(data), status=status, headers=headers, content_type='application/json')
+
+
+async def authenticate_request(request):
+    """
+    Async StatelessJWTAuthentication.authenticate(), minus the DRF request.
+
+    Returns (LazyTokenUser, validated token) - views that need the User row
+    must `await request.user.aload()`.
+    """
+    header = jwt_authentication.get_header(request)
+    raw_token = jwt_authentication.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        raise NotAuthenticated()
+
+    validated_token = jwt_authentication.get_validated_token(raw_token)
+    return await jwt_authentication.aget_user(validated_token), validated_token
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    """
+    Minimal async stand-in for DRF's APIView.
+
+    Parses JSON bodies into request.data, runs JWT authentication when
+    requires_authentication is set and turns DRF exceptions into DRF-style
+    error responses. Subclasses implement async get()/post()/put() handlers.
+    """
+    requires_authentication = False
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method != 'OPTIONS':
+                request.data = self.parse_body(request)
+                if self.requires_authentication:
+                    request.user, request.auth = await authenticate_request(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except TokenError as exc:
+            return self.handle_exception(InvalidToken(exc.args[0]))
+        except APIException as exc:
+            return self.handle_exception(exc)
+
+    def parse_body(self, request):
+        if not request.body:
+            return {}
+        try:
+            data = json.loads(request.body)
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+        # Every handler here reads fields off request.data
+        if not isinstance(data, dict):
+            raise ParseError('JSON parse error - expected an object')
+        return data
+
+    def handle_exception(self, exc):
+        headers = {}
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            headers['WWW-Authenticate'] = jwt_authentication.authenticate_header(None)
+        if getattr(exc, 'wait', None):
+            headers['Retry-After'] = '%d' % exc.wait
+
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+        return api_response(data, status=exc.status_code, headers=headers)
+
+
+class UserRegistrationView(AsyncAPIView):
+    """Async UserRegistrationView - POST /auth/register/"""
+
+    async def post(self, request):
+        serializer = UserRegistrationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = await serializer.acreate()
+        audit.record(AuthEvent.REGISTER, user.pk, request)
+
+        with timed('tokens'):
+            refresh = await RefreshToken.afor_user(user)
+            tokens = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+        with timed('serialize'):
+            user_data = serialize_user(user)
+
+        return api_response({
+            'message': 'User registered successfully',
+            'user': user_data,
+            **tokens,
+        }, status=status.HTTP_201_CREATED)
+
+
+class UserLoginView(AsyncAPIView):
+    """Async UserLoginView - POST /auth/login/"""
+
+    async def post(self, request):
+        serializer = UserLoginSerializer(
+            data=request.data,
+            context={'request': request, 'defer_authentication': True}
+        )
+        serializer.is_valid(raise_exception=True)
+        user = await serializer.aauthenticate_user()
+
+        with timed('tokens'):
+            refresh = await RefreshToken.afor_user(user)
+            tokens = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+        # Buffered last_login, and a session only if LOGIN_WRITES['CREATE_SESSION']
+        with timed('session'):
+            await alogged_in(request, user)
+
+        with timed('serialize'):
+            user_data = serialize_user(user)
+
+        return api_response({
+            'message': 'Login successful',
+            'user': user_data,
+            **tokens,
+        })
+
+
+class UserProfileView(AsyncAPIView):
+    """Async UserProfileView - GET/PUT /auth/user/"""
+    requires_authentication = True
+
+    async def get(self, request):
+        return api_response(serialize_user(await request.user.aload()))
+
+    async def put(self, request):
+        serializer = UserProfileUpdateSerializer(
+            await request.user.aload(),
+            data=request.data,
+            partial=True,
+            context={'defer_unique_checks': True}
+        )
+        serializer.is_valid(raise_exception=True)
+        await serializer.avalidate_unique()
+        user = await serializer.asave()
+
+        return api_response({
+            'message': 'Profile updated successfully',
+            'user': serialize_user(user)
+        })
+
+
+class TokenRefreshView(AsyncAPIView):
+    """
+    Async version of SimpleJWT's TokenRefreshView - POST /auth/token/refresh/
+
+    Mirrors our TokenRefreshSerializer: re-checks the user may still use the
+    token, re-stamps the user claims and rotates the refresh token if configured to.
+    """
+
+    async def post(self, request):
+        raw_token = request.data.get('refresh')
+        if not raw_token:
+            return api_response({'refresh': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        if isinstance(raw_token, (list, dict)):
+            return api_response({'refresh': ['Not a valid string.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        refresh = RefreshToken(raw_token)
+        await refresh.acheck_revoked()
+        user = await user_cache.aget_user(refresh.payload.get(jwt_settings.USER_ID_CLAIM))
+
+        return api_response(await arefresh_tokens(refresh, user, request))
+
+
+class LogoutView(AsyncAPIView):
+    """Async LogoutView - POST /auth/logout/"""
+    requires_authentication = True
+
+    async def post(self, request):
+        try:
+            token = RefreshToken(request.data['refresh'])
+        except (KeyError, TokenError):
+            return api_response({
+                'error': 'Invalid token'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # End the refresh token's session, revoke it and the access token this request came with
+        await families.aend(token)
+        token.revoke()
+        request.auth.revoke()
+        audit.record(AuthEvent.LOGOUT, request.user.pk, request)
+
+        return api_response({
+            'message': 'Logout successful'
+        })
+
+
+@require_safe
+async def availability(request):
+    """GET /auth/availability/ - see views.availability()."""
+    throttled = await athrottle(request)
+    if throttled is not None:
+        return throttled
+    return availability_response(await acheck_availability(request.GET))
@@ -0,0 +1,168 @@
+"""
+Stateless JWT authentication.
+
+SimpleJWT's JWTAuthentication SELECTs the User row on every authenticated
+request, even though most views only need to know who is calling. Our tokens
+carry the user's id, username, active flag and token_version (see tokens.py), so
+StatelessJWTAuthentication hands views a LazyTokenUser built from those claims
+and only loads the row (from the user cache, see cache.py) the first time a
+view touches a real model field (email, first_name, save(), ...).
+
+Revocation still works without the row: every request compares the token's
+token_version claim (the user's token epoch) against the user's current
+token_version and is_active, read from the user cache. Bumping token_version
+(password change, "log out everywhere", deactivation) therefore invalidates
+every outstanding token at once, with no per-token rows and no extra query
+on the hot path.
+"""
+
+from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .cache import user_cache
+from .tokens import IS_ACTIVE_CLAIM, USERNAME_CLAIM, VERSION_CLAIM, is_current
+
+User = get_user_model()
+
+
+def check_token_user(token, user):
+    """Raise AuthenticationFailed unless user may still use token."""
+    if not jwt_settings.USER_AUTHENTICATION_RULE(user):
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    if not is_current(token, user):
+        raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+    return user
+
+
+def check_token_state(token, state):
+    """check_token_user() for the (is_active, token_version) pair the user cache hands out."""
+    if state is None:
+        raise AuthenticationFailed('User not found', code='user_not_found')
+    is_active, token_version = state
+    if not is_active:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    if token.get(VERSION_CLAIM, 0) != token_version:
+        raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+
+
+class LazyTokenUser(SimpleLazyObject):
+    """
+    request.user for token-authenticated requests.
+
+    id/pk, username, is_active and the is_authenticated/is_anonymous flags are
+    answered from the token. Anything else loads the User row (once) and is
+    proxied to it, so views can treat this like a normal User instance.
+    Async code should `await user.aload()` first instead of triggering a sync
+    query from the event loop.
+    """
+
+    def __init__(self, token):
+        self.__dict__['token'] = token
+        super().__init__(self._load)
+
+    def _load(self):
+        user = user_cache.get_user(self.token[jwt_settings.USER_ID_CLAIM])
+        if user is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        return check_token_user(self.token, user)
+
+    async def aload(self):
+        """Load the user (through the user cache) without blocking the event loop."""
+        if self._wrapped is empty:
+            user = await user_cache.aget_user(self.token[jwt_settings.USER_ID_CLAIM])
+            if user is None:
+                raise AuthenticationFailed('User not found', code='user_not_found')
+            self._wrapped = check_token_user(self.token, user)
+        return self._wrapped
+
+    @property
+    def is_loaded(self):
+        return self._wrapped is not empty
+
+    def _claim(self, attr, claim):
+        # The row wins once it's loaded; tokens from before the claims existed load it
+        if self._wrapped is empty:
+            if claim in self.token:
+                return self.token[claim]
+            self._setup()
+        return getattr(self._wrapped, attr)
+
+    @property
+    def id(self):
+        # SimpleJWT stores the id as a string, hand out the same type as User.id
+        return User._meta.pk.to_python(self._claim('id', jwt_settings.USER_ID_CLAIM))
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def username(self):
+        return self._claim('username', USERNAME_CLAIM)
+
+    @property
+    def is_active(self):
+        return self._claim('is_active', IS_ACTIVE_CLAIM)
+
+    def get_username(self):
+        return self.username
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    def __bool__(self):
+        # SimpleLazyObject would load the row just to answer `if request.user`
+        return True
+
+    def __str__(self):
+        if self._wrapped is empty:
+            return f'{self.username} (token)'
+        return str(self._wrapped)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that returns a LazyTokenUser instead of querying the User row.
+
+    The token's jti is checked against the revocation store and its epoch and
+    the active flag against the user cache. Everything else about the user is
+    only checked if and when the row gets loaded.
+    """
+
+    def check_revoked(self, validated_token):
+        # Logout revokes the access token too; nearly always answered by the Bloom filter
+        try:
+            validated_token.check_revoked()
+        except TokenError as exc:
+            raise InvalidToken(exc.args[0])
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        self.check_revoked(validated_token)
+        check_token_state(validated_token, user_cache.get_values(user_id, 'is_active', 'token_version'))
+        return LazyTokenUser(validated_token)
+
+    async def aget_user(self, validated_token):
+        """Async get_user() for the native async views."""
+        user_id = self.get_user_id(validated_token)
+        try:
+            await validated_token.acheck_revoked()
+        except TokenError as exc:
+            raise InvalidToken(exc.args[0])
+        check_token_state(validated_token, await user_cache.aget_values(user_id, 'is_active', 'token_version'))
+        return LazyTokenUser(validated_token)
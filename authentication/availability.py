@@ -0,0 +1,443 @@
+"""
+Username/email availability, answered from memory whenever possible.
+
+Signup forms ask "is this name free?" on every keystroke, and most of the names
+they ask about are free. Every process keeps a Bloom filter of the normalized
+(lowercased) usernames and emails in auth_user:
+
+- A name that misses the filter is certainly not taken (Bloom filters have no
+  false negatives) and is answered without touching the database.
+- A hit is either a taken name or one of the ERROR_RATE false positives, and is
+  settled with a probe on the LOWER() unique index (see models.User), the same
+  one registration runs into.
+
+The filter is built by `manage.py rebuild_availability`, one read of the
+table for the whole deployment, and stored in the AvailabilityFilter table.
+Schedule it (e.g. hourly, like purge_expired): each build is sized for the
+current table and catches renames done outside of save(). Server processes
+load the newest stored filter in a background thread when they start
+(wsgi.py/asgi.py call start(), other processes on their first check) and
+look for a newer one every SYNC_INTERVAL seconds - until one is loaded,
+checks go to the database. Registrations and profile saves in this process
+add their names right away (post_save). Every SYNC_INTERVAL seconds the rows
+other processes inserted since the filter was built or last synced are added
+too: past the highest primary key seen, plus users who joined within
+SYNC_OVERLAP seconds before the last sync, for inserts that commit after rows
+with higher keys. With sharded users all of that covers every shard, and hits
+are settled on the shard the name hashes to (see sharding.py).
+
+So a name registered by another process can look free for up to SYNC_INTERVAL
+seconds. That's fine for a hint in a form - registration itself is still
+decided by the unique constraints.
+
+Answers don't say whether the filter or the database gave them, and each
+client IP gets MAX_CHECKS checks per WINDOW seconds: a free and a taken email
+would otherwise be told apart by timing or by asking for every address on a
+list.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import close_old_connections
+from django.db.models import Q, Value
+from django.db.models.functions import Lower
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from .bloom import BloomFilter
+from .sharding import email_owners, login_db, user_databases
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CAPACITY': 1_000_000,
+    'ERROR_RATE': 0.01,
+    'BATCH_SIZE': 5000,
+    'SYNC_INTERVAL': 5.0,
+    'SYNC_OVERLAP': 60.0,
+    'MAX_CHECKS': 60,
+    'WINDOW': 60,
+    'CACHE': 'default',
+    'BACKGROUND': True,
+}
+
+# Usernames and emails share one filter, so keys carry the field
+FIELDS = {'username': 'u', 'email': 'e'}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'AVAILABILITY', {})}
+
+
+def _key(field, value):
+    return f'{FIELDS[field]}:{value.lower()}'
+
+
+def _keys(username, email):
+    keys = []
+    if username:
+        keys.append(_key('username', username))
+    if email:
+        keys.append(_key('email', email))
+    return keys
+
+
+def _filter_model():
+    from .models import AvailabilityFilter
+    return AvailabilityFilter
+
+
+def _rows(using, cursor, since=None):
+    condition = Q(pk__gt=cursor)
+    if since is not None:
+        condition |= Q(date_joined__gte=since)
+    return (
+        get_user_model().objects.using(using)
+        .filter(condition)
+        .order_by('pk')
+        .values_list('pk', 'username', 'email')
+        .iterator(chunk_size=get_config()['BATCH_SIZE'])
+    )
+
+
+def build_filter():
+    """
+    Read every username and email into a new AvailabilityFilter and delete the older ones.
+
+    What `manage.py rebuild_availability` runs - the only full read of auth_user
+    (on every shard); processes load the result instead.
+    """
+    config = get_config()
+    built_at = timezone.now()
+    databases = user_databases()
+    users = sum(get_user_model().objects.using(using).count() for using in databases)
+    # Two keys per user, with room to grow until the next rebuild
+    bloom = BloomFilter(max(config['CAPACITY'], 4 * users), config['ERROR_RATE'])
+    cursors = {}
+    for using in databases:
+        for pk, username, email in _rows(using, 0):
+            bloom.update(_keys(username, email))
+            cursors[using] = pk
+    AvailabilityFilter = _filter_model()
+    stored = AvailabilityFilter.objects.create(
+        capacity=bloom.capacity, error_rate=bloom.error_rate, count=len(bloom), bits=bytes(bloom.bits),
+        cursors=cursors, built_at=built_at,
+    )
+    AvailabilityFilter.objects.filter(pk__lt=stored.pk).delete()
+    return stored
+
+
+class AvailabilityIndex:
+    """
+    Bloom filter of taken usernames and emails, with a database fallback for hits.
+
+    Started lazily and again after a fork, like the revocation store. Without
+    BACKGROUND nothing loads the filter (unless load() is called) and every
+    check goes to the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._pid = None
+        self._bloom = None
+        self._ready = False
+        self._load_log = None
+        self._cursors = {}
+        self._synced_at = None
+        self._filter_id = None
+        self._built_at = None
+        self._warned = False
+        self.checks = 0
+        self.filter_misses = 0
+        self.db_checks = 0
+        self.db_taken = 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._bloom = None
+            self._ready = False
+            self._load_log = None
+            self._cursors = {}
+            self._synced_at = None
+            self._filter_id = None
+            self._built_at = None
+            self._warned = False
+            self._pid = os.getpid()
+            if get_config()['BACKGROUND']:
+                threading.Thread(target=self._run, name='availability-index', daemon=True).start()
+
+    def start(self):
+        """Start loading the filter now instead of on the first check (the server entry points call this)."""
+        self._ensure_started()
+
+    # Request side
+
+    def add(self, username, email):
+        """Mark username and email taken in this process' filter."""
+        if self._pid != os.getpid():
+            # Not loaded here yet - the load catches up on them from the table
+            return
+        keys = _keys(username, email)
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.update(keys)
+            if self._load_log is not None:
+                self._load_log.extend(keys)
+
+    def _check_memory(self, field, value):
+        """True when the filter says value is certainly free, None when the database has to answer."""
+        self._ensure_started()
+        self.checks += 1
+        if self._ready and _key(field, value) not in self._bloom:
+            self.filter_misses += 1
+            return True
+        self.db_checks += 1
+        return None
+
+    def _taken_query(self, field, value):
+        if field == 'email':
+            return email_owners(value)
+        users = get_user_model().objects.using(login_db(value))
+        return users.alias(lookup=Lower(field)).filter(lookup=Lower(Value(value)))
+
+    def is_available(self, field, value):
+        """Whether a username or email is free."""
+        if self._check_memory(field, value):
+            return True
+        taken = self._taken_query(field, value).exists()
+        self.db_taken += taken
+        return not taken
+
+    async def ais_available(self, field, value):
+        """Async is_available()."""
+        if self._check_memory(field, value):
+            return True
+        taken = await self._taken_query(field, value).aexists()
+        self.db_taken += taken
+        return not taken
+
+    # Background side
+
+    def _run(self):
+        interval = get_config()['SYNC_INTERVAL']
+        while True:
+            self._guarded(self.refresh)
+            time.sleep(interval)
+
+    def _guarded(self, step):
+        try:
+            close_old_connections()
+            step()
+        except Exception:
+            # Checks keep going to the database until a filter is loaded
+            logger.exception('Availability index: %s failed', step.__name__)
+
+    def refresh(self):
+        """Load a newer stored filter if there is one, otherwise sync the current one."""
+        latest = _filter_model().objects.order_by('-pk').values_list('pk', flat=True).first()
+        if latest is None:
+            if not self._warned:
+                logger.warning('Availability index: no filter yet, schedule `manage.py rebuild_availability`')
+                self._warned = True
+        elif latest != self._filter_id:
+            self.load()
+        elif self._ready:
+            self.sync()
+
+    def _catch_up(self, bloom, cursors, synced_at):
+        # Users created since synced_at (give or take SYNC_OVERLAP) into bloom, returns the new synced_at
+        started = timezone.now()
+        since = synced_at - timedelta(seconds=get_config()['SYNC_OVERLAP'])
+        for using in user_databases():
+            for pk, username, email in _rows(using, cursors.get(using, 0), since):
+                keys = _keys(username, email)
+                with self._lock:
+                    bloom.update(keys)
+                cursors[using] = max(cursors.get(using, 0), pk)
+        return started
+
+    def sync(self):
+        """Add users other processes created since the last sync."""
+        self._synced_at = self._catch_up(self._bloom, self._cursors, self._synced_at)
+
+    def load(self):
+        """Swap in the newest stored filter, caught up with the users created since it was built."""
+        self._ensure_started()
+        with self._load_lock:
+            stored = _filter_model().objects.order_by('-pk').first()
+            if stored is None:
+                return False
+            with self._lock:
+                self._load_log = []
+            try:
+                bloom = BloomFilter.from_bits(stored.capacity, stored.error_rate, stored.bits, stored.count)
+                cursors = dict(stored.cursors)
+                synced_at = self._catch_up(bloom, cursors, stored.built_at)
+                with self._lock:
+                    # Names saved while we were reading
+                    bloom.update(self._load_log)
+                    self._bloom = bloom
+                    self._cursors = cursors
+                    self._synced_at = synced_at
+                    self._filter_id = stored.pk
+                    self._built_at = stored.built_at
+                    self._ready = True
+            finally:
+                with self._lock:
+                    self._load_log = None
+        return True
+
+    def stats(self):
+        bloom = self._bloom
+        return {
+            'ready': self._ready,
+            'filter_built_at': self._built_at,
+            'filter_entries': len(bloom) if bloom is not None else 0,
+            'filter_capacity': bloom.capacity if bloom is not None else 0,
+            'filter_bytes': bloom.size_bytes if bloom is not None else 0,
+            'checks': self.checks,
+            'filter_misses': self.filter_misses,
+            'db_checks': self.db_checks,
+            'db_taken': self.db_taken,
+        }
+
+
+availability_index = AvailabilityIndex()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='availability_index_add')
+def add_saved_user(sender, instance, **kwargs):
+    # Also on updates, so a changed email counts as taken right away. The old one
+    # stays in the filter until the next rebuild, which only costs a query.
+    availability_index.add(instance.username, instance.email)
+
+
+# The /auth/availability/ endpoint (views.availability, async_views.availability)
+
+def validate_username(value):
+    User = get_user_model()
+    if len(value) > User._meta.get_field('username').max_length:
+        raise ValidationError('Too long.')
+    User.username_validator(value)
+
+
+VALIDATORS = {
+    'username': validate_username,
+    'email': validate_email,
+}
+
+
+def _requested(params):
+    """(field, value, valid) for each of username/email in the query string."""
+    for field, validate in VALIDATORS.items():
+        value = params.get(field, '').strip()
+        if not value:
+            continue
+        try:
+            validate(value)
+        except ValidationError:
+            yield field, value, False
+        else:
+            yield field, value, True
+
+
+def _answer(value, valid, available=False):
+    return {'value': value, 'valid': valid, 'available': available}
+
+
+def check_availability(params):
+    """{field: answer} for the username and/or email in params (request.GET)."""
+    result = {}
+    for field, value, valid in _requested(params):
+        if valid:
+            result[field] = _answer(value, valid, availability_index.is_available(field, value))
+        else:
+            result[field] = _answer(value, valid)
+    return result
+
+
+async def acheck_availability(params):
+    """Async check_availability()."""
+    result = {}
+    for field, value, valid in _requested(params):
+        if valid:
+            result[field] = _answer(value, valid, await availability_index.ais_available(field, value))
+        else:
+            result[field] = _answer(value, valid)
+    return result
+
+
+def _counter(request):
+    """(cache, key, window) of request's client IP for the current WINDOW."""
+    config = get_config()
+    window = config['WINDOW']
+    # get_ident() is the client IP, behind REST_FRAMEWORK['NUM_PROXIES'] proxies
+    key = f'availability:{BaseThrottle().get_ident(request)}:{int(time.time() // window)}'
+    return caches[config['CACHE']], key, window
+
+
+def _throttled(checks, window):
+    if checks <= get_config()['MAX_CHECKS']:
+        return None
+    exc = Throttled(window - time.time() % window)
+    response = JsonResponse({'detail': exc.detail}, status=exc.status_code)
+    response['Retry-After'] = str(math.ceil(exc.wait))
+    return response
+
+
+def throttle(request):
+    """None while request's client is within MAX_CHECKS per WINDOW seconds, otherwise the 429 to send."""
+    if get_config()['MAX_CHECKS'] is None:
+        return None
+    cache, key, window = _counter(request)
+    cache.add(key, 0, window)
+    try:
+        checks = cache.incr(key)
+    except ValueError:
+        # Expired in between
+        cache.add(key, 1, window)
+        checks = 1
+    return _throttled(checks, window)
+
+
+async def athrottle(request):
+    """Async throttle()."""
+    if get_config()['MAX_CHECKS'] is None:
+        return None
+    cache, key, window = _counter(request)
+    await cache.aadd(key, 0, window)
+    try:
+        checks = await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 1, window)
+        checks = 1
+    return _throttled(checks, window)
+
+
+def availability_response(result):
+    if not result:
+        return JsonResponse({'detail': 'Pass a username and/or email to check.'}, status=400)
+    response = JsonResponse(result)
+    # A cached "free" would outlive the name actually being free
+    patch_cache_control(response, no_store=True)
+    return response
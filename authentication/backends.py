@@ -1,10 +1,78 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
-from django.db.models import Q
+from django.db.models import Value
+from django.db.models.functions import Lower
+
+from .cache import user_cache
+from .metrics import timed
+from .sharding import email_owners, is_sharded, login_db, user_db
 
 User = get_user_model()
 
 
+def lookup_field_for(login):
+    """
+    Pick the column a login identifier should be matched against.
+
+    Anything with an "@" is treated as an email address, everything else as a
+    username. Each choice maps onto exactly one of the LOWER() unique indexes on auth_user.
+    """
+    return 'email' if '@' in login else 'username'
+
+
+def find_user_by_login(login, queryset=None):
+    """
+    Fetch the user for a username or email with a single indexed equality probe.
+
+    Both sides go through LOWER() so the database can serve the comparison from
+    the indexes behind the unique constraints on User.Meta (same case folding as the old
+    __iexact lookups, just without the LIKE scan). Usernames are allowed to
+    contain "@", so an email-shaped login that matches no email gets one more
+    probe against the username index before we give up.
+
+    With sharded users an email is looked up through its claim, which names
+    the user (and so their shard), and a username on the shard it hashes to.
+
+    Raises User.DoesNotExist if nobody matches.
+    """
+    if queryset is None:
+        queryset = User.objects.all()
+
+    field = lookup_field_for(login)
+    if field == 'email' and is_sharded():
+        user_id = email_owners(login).first()
+        if user_id is not None:
+            return queryset.using(user_db(user_id)).get(pk=user_id)
+        field = 'username'
+    queryset = queryset.using(login_db(login))
+    try:
+        return queryset.alias(lookup=Lower(field)).get(lookup=Lower(Value(login)))
+    except User.DoesNotExist:
+        if field == 'username':
+            raise
+    return queryset.alias(lookup=Lower('username')).get(lookup=Lower(Value(login)))
+
+
+async def afind_user_by_login(login, queryset=None):
+    """Async find_user_by_login()."""
+    if queryset is None:
+        queryset = User.objects.all()
+
+    field = lookup_field_for(login)
+    if field == 'email' and is_sharded():
+        user_id = await email_owners(login).afirst()
+        if user_id is not None:
+            return await queryset.using(user_db(user_id)).aget(pk=user_id)
+        field = 'username'
+    queryset = queryset.using(login_db(login))
+    try:
+        return await queryset.alias(lookup=Lower(field)).aget(lookup=Lower(Value(login)))
+    except User.DoesNotExist:
+        if field == 'username':
+            raise
+    return await queryset.alias(lookup=Lower('username')).aget(lookup=Lower(Value(login)))
+
+
 class EmailOrUsernameModelBackend(ModelBackend):
     """
     Custom authentication backend that allows users to login with either:
@@ -22,10 +90,9 @@ class EmailOrUsernameModelBackend(ModelBackend):
             return None
         
         try:
-            # Try to find user by username OR email
-            user = User.objects.get(
-                Q(username__iexact=username) | Q(email__iexact=username)
-            )
+            # Route the login to the username OR the email index (not both at once)
+            with timed('lookup'):
+                user = find_user_by_login(username)
         except User.DoesNotExist:
             # Run the default password hasher once to reduce the timing
             # difference between an existing and a nonexistent user (#20760).
@@ -37,8 +104,26 @@ class EmailOrUsernameModelBackend(ModelBackend):
         
         return None
     
-    def get_user(self, user_id):
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        """Async authenticate() - used by the native async views under ASGI."""
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        
+        if username is None or password is None:
+            return None
+        
         try:
-            return User.objects.get(pk=user_id)
+            with timed('lookup'):
+                user = await afind_user_by_login(username)
         except User.DoesNotExist:
-            return None
\ No newline at end of file
+            await User().aset_password(password)
+            return None
+        else:
+            if await user.acheck_password(password) and self.user_can_authenticate(user):
+                return user
+        
+        return None
+    
+    def get_user(self, user_id):
+        # Runs on every session-authenticated request (admin), so go through the cache
+        return user_cache.get_user(user_id)
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+A plain Bloom filter.
+
+Answers "have I seen this key?" with no false negatives and a tunable rate of
+false positives, in a fixed amount of memory (about 1.8 bytes per key at a 0.1%
+error rate). We use it to skip database lookups for keys that are certainly not
+in a table, e.g. tokens that were never revoked (see revocation.py).
+"""
+
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Bloom filter sized for `capacity` keys at `error_rate` false positives.
+
+    Adding more than `capacity` keys still works, the false positive rate just
+    goes up - rebuild a bigger one when len() gets past capacity.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(1, int(capacity))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    @classmethod
+    def from_bits(cls, capacity, error_rate, bits, count=0):
+        """A filter with the bits of one built elsewhere (same capacity and error_rate), e.g. stored in a table."""
+        bloom = cls(capacity, error_rate)
+        if len(bits) != len(bloom.bits):
+            raise ValueError(f'Expected {len(bloom.bits)} bytes of filter bits, got {len(bits)}')
+        bloom.bits = bytearray(bits)
+        bloom.count = count
+        return bloom
+
+    def _positions(self, key):
+        if isinstance(key, str):
+            key = key.encode()
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        # Double hashing: k positions out of two 64 bit hashes
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        num_bits = self.num_bits
+        return [(h1 + i * h2) % num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def size_bytes(self):
+        return len(self.bits)
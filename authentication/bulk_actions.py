@@ -0,0 +1,251 @@
+"""
+Admin bulk actions on users as chunked background jobs.
+
+The admin's activate/deactivate actions used to run one queryset.update()
+over the whole selection inside the request. Selecting all of two million
+users meant a request that ran for minutes and a write lock held all that
+time. Now the action only saves a BulkJob and returns. A background thread
+works through it:
+
+- Users are taken in primary key order, CHUNK_SIZE at a time. Each chunk is
+  one UPDATE over its id range (the selection's filters still applied, and
+  only rows that actually change), then those users are dropped from the user
+  cache - update() sends no signals.
+- After every chunk the job row gets the last id done (cursor) and the
+  counts. Progress shows on the job's admin page ("Bulk jobs").
+- SLEEP seconds between chunks leave the write lock to everyone else.
+- A job whose row hasn't moved for STALE_AFTER seconds (its process died) is
+  picked up again from its cursor by the next runner that polls. Every
+  process that submitted a job polls every POLL_INTERVAL seconds, and so
+  does `manage.py run_bulk_jobs`.
+- Cancelling a job in the admin stops it after the current chunk.
+
+The selection is stored as plain JSON and turned back into a queryset by
+whichever process runs the job - possibly a newer deploy:
+
+    {"ids": [1, 2, 3]}                          the users ticked on the page
+    {"filters": {"is_active__exact": ["1"]},    "select all N users": the list's
+     "search": "jo"}                            filter parameters and search
+
+Filters may only name plain fields of the user (FILTER_FIELDS), with the same
+lookups as the admin's list filters.
+
+Claiming a job is an UPDATE ... WHERE status = <what we saw>, so two
+processes never run the same job.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.admin.utils import prepare_lookup_value
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.db.models.constants import LOOKUP_SEP
+from django.utils import timezone
+
+from .cache import user_cache
+from .changelist import search_users
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CHUNK_SIZE': 1000,
+    'SLEEP': 0.05,
+    'POLL_INTERVAL': 5.0,
+    'STALE_AFTER': 60.0,
+    'BACKGROUND': True,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'BULK_ACTIONS', {})}
+
+
+def _bulk_job_model():
+    from .models import BulkJob
+    return BulkJob
+
+
+def _activate(users):
+    return users.filter(is_active=False).update(is_active=True)
+
+
+def _deactivate(users):
+    # Bump token_version like User.save() does, so their tokens stop working too
+    return users.filter(is_active=True).update(is_active=False, token_version=F('token_version') + 1)
+
+
+# name: (what it does to a queryset of users - returns the rows changed, description)
+ACTIONS = {
+    'activate': (_activate, 'Activating'),
+    'deactivate': (_deactivate, 'Deactivating'),
+}
+
+
+# What a stored selection may filter on (UserAdmin.list_filter), and how
+FILTER_FIELDS = ('is_active', 'is_staff', 'is_superuser', 'email_verified', 'date_joined')
+FILTER_LOOKUPS = ('exact', 'in', 'isnull', 'gte', 'gt', 'lte', 'lt')
+
+
+def _check_selection(selection):
+    """Raise ValueError unless selection is {'ids': [...]} or {'filters': {...}, 'search': ...} we can run."""
+    if not isinstance(selection, dict):
+        raise ValueError('Bulk job selection must be a dict')
+    if 'ids' in selection:
+        if not all(isinstance(pk, int) for pk in selection['ids']):
+            raise ValueError('Bulk job ids must be integers')
+        return
+    filters = selection.get('filters', {})
+    if not isinstance(filters, dict) or not isinstance(selection.get('search', ''), str):
+        raise ValueError('Bulk job selection must have ids or filters')
+    for param, values in filters.items():
+        field, _, lookup = param.partition(LOOKUP_SEP)
+        if field not in FILTER_FIELDS or (lookup or 'exact') not in FILTER_LOOKUPS:
+            raise ValueError(f'Bulk jobs can\'t filter on {param!r}')
+        if not isinstance(values, list) or not values or not all(isinstance(value, str) for value in values):
+            raise ValueError(f'Bulk job filter {param!r} needs a list of strings')
+
+
+def _selection(job):
+    """The job's users, rebuilt from its stored selection."""
+    selection = job.selection
+    _check_selection(selection)
+    users = get_user_model()._default_manager.all()
+    if 'ids' in selection:
+        return users.filter(pk__in=selection['ids'])
+    for param, values in selection.get('filters', {}).items():
+        # Like the admin's list filters: values of one parameter are ORed, parameters ANDed
+        q = Q()
+        for value in prepare_lookup_value(param, values):
+            q |= Q((param, value))
+        users = users.filter(q)
+    return search_users(users, selection.get('search', ''))
+
+
+class BulkJobRunner:
+    """
+    Runs queued BulkJobs in a background thread, one chunk at a time.
+
+    Started lazily and again after a fork, like the revocation store. Without
+    BACKGROUND, jobs only run when run_pending() is called (run_bulk_jobs, tests).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._wakeup = None
+        self.chunks = 0
+        self.jobs_finished = 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._wakeup = threading.Event()
+            self._pid = os.getpid()
+            if get_config()['BACKGROUND']:
+                threading.Thread(target=self._run, name='bulk-jobs', daemon=True).start()
+
+    def submit(self, action, selection, user=None):
+        """Save a job running action over selection (see above) and wake the runner."""
+        if action not in ACTIONS:
+            raise ValueError(f'Unknown bulk action {action!r}')
+        _check_selection(selection)
+        job = _bulk_job_model().objects.create(
+            action=action,
+            selection=selection,
+            created_by=user if user is not None and user.is_authenticated else None,
+        )
+        self._ensure_started()
+        self._wakeup.set()
+        return job
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(get_config()['POLL_INTERVAL'])
+            self._wakeup.clear()
+            try:
+                close_old_connections()
+                self.run_pending()
+            except Exception:
+                # Keep going - the job keeps its cursor and gets picked up again
+                logger.exception('Bulk jobs: runner failed')
+
+    def _claim(self):
+        """Take the oldest queued (or stale running) job, or None."""
+        BulkJob = _bulk_job_model()
+        stale = timezone.now() - timedelta(seconds=get_config()['STALE_AFTER'])
+        candidates = BulkJob.objects.filter(
+            Q(status=BulkJob.QUEUED) | Q(status=BulkJob.RUNNING, updated_at__lt=stale)
+        ).order_by('created_at')
+        for job in candidates[:10]:
+            # Moving updated_at on is the claim - whoever does it first runs the job
+            claimed = BulkJob.objects.filter(pk=job.pk, status=job.status, updated_at=job.updated_at).update(
+                status=BulkJob.RUNNING, updated_at=timezone.now(),
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+        return None
+
+    def run_pending(self):
+        """Run claimable jobs until there are none left."""
+        while (job := self._claim()) is not None:
+            self.run(job)
+
+    def run(self, job):
+        """Work through a claimed job, chunk by chunk, recording progress as it goes."""
+        BulkJob = _bulk_job_model()
+        config = get_config()
+        apply, _ = ACTIONS[job.action]
+        try:
+            selection = _selection(job)
+            if job.total is None:
+                job.total = selection.count()
+                BulkJob.objects.filter(pk=job.pk).update(total=job.total, updated_at=timezone.now())
+            while True:
+                ids = list(selection.filter(pk__gt=job.cursor).order_by('pk').values_list('pk', flat=True)[:config['CHUNK_SIZE']])
+                if not ids:
+                    break
+                changed = apply(selection.filter(pk__gt=job.cursor, pk__lte=ids[-1]))
+                user_cache.invalidate(*ids)
+                self.chunks += 1
+                job.cursor = ids[-1]
+                job.processed += len(ids)
+                job.changed += changed
+                progress = {'cursor': job.cursor, 'processed': job.processed, 'changed': job.changed,
+                            'updated_at': timezone.now()}
+                if not BulkJob.objects.filter(pk=job.pk, status=BulkJob.RUNNING).update(**progress):
+                    # Cancelled meanwhile: keep the counts right and stop here
+                    BulkJob.objects.filter(pk=job.pk).update(**progress)
+                    logger.info('Bulk jobs: %s stopped after %d users', job, job.processed)
+                    return
+                time.sleep(config['SLEEP'])
+        except Exception as exc:
+            logger.exception('Bulk jobs: %s failed', job)
+            BulkJob.objects.filter(pk=job.pk).update(
+                status=BulkJob.FAILED, error=repr(exc), finished_at=timezone.now(), updated_at=timezone.now(),
+            )
+            return
+        BulkJob.objects.filter(pk=job.pk, status=BulkJob.RUNNING).update(
+            status=BulkJob.DONE, finished_at=timezone.now(), updated_at=timezone.now(),
+        )
+        self.jobs_finished += 1
+        logger.info('Bulk jobs: %s done, %d of %d users changed', job, job.changed, job.processed)
+
+    def stats(self):
+        return {
+            'running': self._pid == os.getpid(),
+            'chunks': self.chunks,
+            'jobs_finished': self.jobs_finished,
+        }
+
+
+bulk_jobs = BulkJobRunner()
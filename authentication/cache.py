@@ -0,0 +1,269 @@
+"""
+Per-user object cache.
+
+Authentication, the backend's get_user() and profile reads all want the same
+User rows over and over. UserCache keeps a compact record of each row (a tuple
+of column values, without the password hash) keyed by user id, in two layers:
+
+    1. a small in-process LRU, so hot users don't even leave the process
+    2. the shared Django cache (settings.USER_CACHE['CACHE']), so workers and
+       processes share what they've loaded
+
+Saves and deletes of a User invalidate both layers through signals. Code that
+bypasses signals (queryset.update(), bulk_update()) must call
+user_cache.invalidate() itself. Other processes' LRUs can't be reached from
+here, which is why local entries only live for LOCAL_TIMEOUT seconds.
+
+Users built from the cache have a deferred password field: reading
+user.password (check_password() etc.) fetches it from the database on demand.
+
+Misses are loaded from the read replica when there is one, except for users
+written in the last few seconds (see routers.py) - invalidate() pins them to
+the primary so nobody re-caches the row the replica hasn't caught up with.
+With sharded users they're loaded from the shard in their id (sharding.py).
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import cached_property
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import router, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .routers import aread_user, pin_to_primary, read_user
+from .sharding import group_by_db, user_db
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'TIMEOUT': 300,
+    'LOCAL_MAX_SIZE': 10000,
+    'LOCAL_TIMEOUT': 5,
+}
+
+# Never copied into the cache - loaded lazily from the database when needed
+EXCLUDED_FIELDS = ('password',)
+
+
+class UserCache:
+    """Two level (local LRU + shared Django cache) cache of User records."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def config(self):
+        return {**DEFAULTS, **getattr(settings, 'USER_CACHE', {})}
+
+    @property
+    def model(self):
+        return get_user_model()
+
+    @cached_property
+    def field_names(self):
+        return [f.attname for f in self.model._meta.concrete_fields if f.attname not in EXCLUDED_FIELDS]
+
+    @cached_property
+    def schema(self):
+        # Part of every key, so a migration never reads records with the old layout
+        return hashlib.md5(','.join(self.field_names).encode()).hexdigest()[:8]
+
+    @property
+    def shared(self):
+        return caches[self.config['CACHE']]
+
+    def key(self, user_id):
+        return f'user:{self.schema}:{user_id}'
+
+    # Records
+
+    def to_record(self, user):
+        return (user._state.db, tuple(getattr(user, name) for name in self.field_names))
+
+    def from_record(self, record):
+        db, values = record
+        return self.model.from_db(db, self.field_names, values)
+
+    def _fetch(self, user_id):
+        users = read_user(self.model, user_id).db_manager(user_db(user_id))
+        return users.filter(pk=user_id).defer(*EXCLUDED_FIELDS).first()
+
+    # Local LRU
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires, record = entry
+            if expires < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            self.local_hits += 1
+            return record
+
+    def _local_set(self, key, record):
+        config = self.config
+        with self._lock:
+            self._local[key] = (time.monotonic() + config['LOCAL_TIMEOUT'], record)
+            self._local.move_to_end(key)
+            while len(self._local) > config['LOCAL_MAX_SIZE']:
+                self._local.popitem(last=False)
+
+    def _get_record(self, user_id):
+        key = self.key(user_id)
+        record = self._local_get(key)
+        if record is None:
+            record = self.shared.get(key)
+            if record is not None:
+                self.shared_hits += 1
+            else:
+                self.misses += 1
+                user = self._fetch(user_id)
+                if user is None:
+                    return None
+                record = self.to_record(user)
+                self.shared.set(key, record, self.config['TIMEOUT'])
+            self._local_set(key, record)
+        return record
+
+    async def _aget_record(self, user_id):
+        key = self.key(user_id)
+        record = self._local_get(key)
+        if record is None:
+            record = await self.shared.aget(key)
+            if record is not None:
+                self.shared_hits += 1
+            else:
+                self.misses += 1
+                users = (await aread_user(self.model, user_id)).db_manager(user_db(user_id))
+                user = await users.filter(pk=user_id).defer(*EXCLUDED_FIELDS).afirst()
+                if user is None:
+                    return None
+                record = self.to_record(user)
+                await self.shared.aset(key, record, self.config['TIMEOUT'])
+            self._local_set(key, record)
+        return record
+
+    def _pick(self, record, names):
+        if record is None:
+            return None
+        values = record[1]
+        return tuple(values[self.field_names.index(name)] for name in names)
+
+    # Public API
+
+    def get_user(self, user_id):
+        """The user with pk user_id, or None if there isn't one."""
+        record = self._get_record(user_id)
+        return self.from_record(record) if record is not None else None
+
+    async def aget_user(self, user_id):
+        """Async get_user()."""
+        record = await self._aget_record(user_id)
+        return self.from_record(record) if record is not None else None
+
+    def get_values(self, user_id, *names):
+        """
+        Just some columns of a user, as a tuple (None if there's no such user).
+
+        Cheaper than get_user() when the caller doesn't need a model instance.
+        """
+        return self._pick(self._get_record(user_id), names)
+
+    async def aget_values(self, user_id, *names):
+        """Async get_values()."""
+        return self._pick(await self._aget_record(user_id), names)
+
+    def get_many_values(self, user_ids, *names):
+        """
+        get_values() for many users at once, as {user_id: tuple or None}.
+
+        Whatever the two cache layers don't have is loaded with a single query.
+        """
+        keys = {self.key(user_id): user_id for user_id in set(user_ids)}
+        records = {}
+        for key, user_id in keys.items():
+            record = self._local_get(key)
+            if record is not None:
+                records[user_id] = record
+
+        missing = [key for key, user_id in keys.items() if user_id not in records]
+        if missing:
+            shared = self.shared.get_many(missing)
+            self.shared_hits += len(shared)
+            for key, record in shared.items():
+                records[keys[key]] = record
+                self._local_set(key, record)
+
+        fetch = [user_id for user_id in keys.values() if user_id not in records]
+        if fetch:
+            self.misses += len(fetch)
+            fetched = {}
+            for using, ids in group_by_db(fetch).items():
+                users = read_user(self.model, *ids).db_manager(using)
+                for user in users.filter(pk__in=ids).defer(*EXCLUDED_FIELDS):
+                    key = self.key(user.pk)
+                    records[user.pk] = fetched[key] = self.to_record(user)
+                    self._local_set(key, fetched[key])
+            self.shared.set_many(fetched, self.config['TIMEOUT'])
+
+        return {user_id: self._pick(records.get(user_id), names) for user_id in keys.values()}
+
+    def invalidate(self, *user_ids):
+        """
+        Drop users from both cache layers, now and again once the current transaction
+        commits, and read them from the primary for a while.
+        """
+        keys = [self.key(user_id) for user_id in user_ids]
+        if not keys:
+            return
+
+        def drop():
+            with self._lock:
+                for key in keys:
+                    self._local.pop(key, None)
+            self.shared.delete_many(keys)
+
+        self.invalidations += len(keys)
+        pin_to_primary(*user_ids)
+        drop()
+        # A concurrent read could re-cache the old row before our transaction commits
+        for using in set(group_by_db(user_ids)):
+            transaction.on_commit(drop, using=using or router.db_for_write(self.model))
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def stats(self):
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            'local_size': len(self._local),
+            'local_max_size': self.config['LOCAL_MAX_SIZE'],
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_rate': round((lookups - self.misses) / lookups, 4) if lookups else None,
+            'invalidations': self.invalidations,
+        }
+
+
+user_cache = UserCache()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='user_cache_post_save')
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL, dispatch_uid='user_cache_post_delete')
+def invalidate_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
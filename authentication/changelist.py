@@ -0,0 +1,184 @@
+"""
+Admin changelist pieces that stay fast on a big auth_user.
+
+Django's changelist runs an exact COUNT(*) (two, with show_full_result_count)
+and pages with OFFSET, which is fine for a thousand users and unusable for
+millions: every page load counts the whole table, and page 5000 reads and
+throws away 500k rows first.
+
+- EstimatedCountPaginator: an unfiltered list shows the table size from the
+  database's statistics (sqlite_stat1 or pg_class.reltuples) instead of
+  counting. A filtered or searched list counts up to COUNT_LIMIT rows and
+  shows "COUNT_LIMIT+" beyond that.
+- UserChangeList: in the default order (newest first) pages are "the next
+  list_per_page users after this one" - WHERE (date_joined, id) < (the last
+  row's) on the auth_user_joined_idx index - instead of OFFSETs, so the last
+  page costs what the first one does. Sorting by a column goes back to
+  numbered pages.
+- search_users(): prefix search on the LOWER(username) / LOWER(email)
+  indexes behind the unique constraints, plus substring search on Postgres
+  through pg_trgm indexes (migration 0010). A plain icontains over four
+  columns scans the whole table for every search.
+"""
+
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ERROR_FLAG, IGNORED_PARAMS, ORDER_VAR, PAGE_VAR, SEARCH_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils.functional import cached_property
+
+DEFAULTS = {
+    'EXACT_COUNT_BELOW': 100_000,
+    'COUNT_LIMIT': 10_000,
+    'TRIGRAM_MIN_LENGTH': 3,
+}
+
+AFTER_VAR = 'after'
+
+# Sorts after every character, so [term, term + _HIGHEST) is every string starting with term
+_HIGHEST = chr(0x10FFFF)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'ADMIN_CHANGELIST', {})}
+
+
+def estimated_count(model, using):
+    """The planner's row count for model's table, None if the database has none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # Each index's stat starts with its row count (kept by ANALYZE / PRAGMA optimize);
+                # the largest is the table's, partial indexes count less
+                cursor.execute('SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s', [table])
+                row = cursor.fetchone()
+                return row[0] if row else None
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+                row = cursor.fetchone()
+                # -1 until the table was first analyzed
+                return row[0] if row and row[0] >= 0 else None
+    except DatabaseError:
+        # e.g. no sqlite_stat1 before the first ANALYZE
+        return None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """A Paginator whose count never scans a big table (see above)."""
+
+    # Set when count is a lower bound or an estimate rather than the exact number
+    capped = False
+    estimated = False
+
+    @cached_property
+    def count(self):
+        config = get_config()
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= config['EXACT_COUNT_BELOW']:
+                self.estimated = True
+                return estimate
+            return queryset.count()
+        limit = config['COUNT_LIMIT']
+        # SELECT COUNT(*) FROM (SELECT ... LIMIT limit + 1)
+        count = queryset.order_by()[:limit + 1].count()
+        if count > limit:
+            self.capped = True
+            return limit
+        return count
+
+
+class UserChangeList(ChangeList):
+    """A changelist that pages by keyset in the default order (see above)."""
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Any other link (a filter, a sort, a search) starts over from the first page
+        if not new_params or AFTER_VAR not in new_params:
+            remove = [*(remove or []), AFTER_VAR]
+        return super().get_query_string(new_params, remove)
+
+    @property
+    def keyset(self):
+        return ORDER_VAR not in self.params
+
+    def _after(self):
+        """The (date_joined, pk) cursor from the query string, or None on the first page."""
+        value = self.params.get(AFTER_VAR)
+        if not value:
+            return None
+        joined, _, pk = value.rpartition(',')
+        try:
+            return datetime.fromisoformat(joined), int(pk)
+        except ValueError:
+            raise IncorrectLookupParameters
+
+    def get_results(self, request):
+        if not self.keyset:
+            return super().get_results(request)
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        queryset = self.queryset
+        after = self._after()
+        if after is not None:
+            joined, pk = after
+            # (date_joined, id) < (joined, pk), written so the index range is date_joined <= joined
+            queryset = queryset.filter(date_joined__lte=joined).exclude(date_joined=joined, pk__gte=pk)
+        rows = list(queryset.order_by('-date_joined', '-pk')[:self.list_per_page + 1])
+
+        self.next_after = None
+        if len(rows) > self.list_per_page:
+            rows = rows[:self.list_per_page]
+            self.next_after = f'{rows[-1].date_joined.isoformat()},{rows[-1].pk}'
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = after is not None or self.next_after is not None
+        self.paginator = paginator
+        self.first_page_url = self.get_query_string(remove=[AFTER_VAR]) if after is not None else None
+        self.next_page_url = self.get_query_string({AFTER_VAR: self.next_after}) if self.next_after else None
+
+
+def selection_params(request):
+    """
+    (list filter parameters, search term) of a user list request, what "select
+    all N users" picked - {param: [values]} like ChangeList.filter_params.
+    """
+    ignored = {*IGNORED_PARAMS, PAGE_VAR, ERROR_FLAG, AFTER_VAR}
+    filters = {key: values for key, values in request.GET.lists() if key not in ignored}
+    return filters, request.GET.get(SEARCH_VAR, '')
+
+
+def search_users(queryset, search_term):
+    """
+    Users whose username or email starts with search_term (ignoring case).
+
+    On Postgres, terms of TRIGRAM_MIN_LENGTH characters or more match anywhere
+    in them instead, on the trigram indexes.
+    """
+    term = search_term.strip().lower()
+    if not term:
+        return queryset
+    queryset = queryset.alias(username_lower=Lower('username'), email_lower=Lower('email'))
+    if connections[queryset.db].vendor == 'postgresql' and len(term) >= get_config()['TRIGRAM_MIN_LENGTH']:
+        return queryset.filter(Q(username_lower__contains=term) | Q(email_lower__contains=term))
+    # A range instead of LIKE 'term%', which SQLite can't run on an expression index
+    return queryset.filter(
+        Q(username_lower__gte=term, username_lower__lt=term + _HIGHEST)
+        | Q(email_lower__gte=term, email_lower__lt=term + _HIGHEST)
+    )
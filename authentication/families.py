@@ -0,0 +1,165 @@
+"""
+Refresh token families: one row per login session instead of one per refresh.
+
+With ROTATE_REFRESH_TOKENS every refresh hands out a new refresh token, and
+revoking the old one by jti (BLACKLIST_AFTER_ROTATION) left a RevokedToken row
+behind per refresh - storage grew with traffic, not with users. Instead every
+login starts a TokenFamily:
+
+    id          the session, in the refresh token's "fam" claim
+    user        whose session it is
+    generation  how often it was refreshed, in the token's "gen" claim
+    expires_at  when the newest refresh token expires
+
+Only the newest refresh token of a family works. A refresh is one UPDATE on
+the primary key, which moves the family on and checks the token in one go:
+
+    UPDATE ... SET generation = generation + 1, expires_at = <new exp>
+     WHERE id = <fam> AND generation = <gen> AND expires_at > now
+
+If that matches nothing, the family is gone (logout) or the token is an older
+generation - a refresh token that was already used once. That's what a leaked
+token looks like when it gets replayed (either the thief or the user now holds
+a stale copy and we can't tell which), so the family is deleted and both
+sides lose the session.
+
+Logout ends the token's family, revoke_tokens() (logout everywhere, password
+changes) all of the user's. Expired families accept nothing and can go any
+time. Refresh tokens from before families (no "fam" claim) are checked by jti
+as before and start a family on their next refresh.
+
+Families live on their user's shard when users are sharded (sharding.py).
+"""
+
+import logging
+from datetime import datetime, timezone
+
+from django.db.models import F
+from django.utils import timezone as django_timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import audit
+from .sharding import user_db
+
+logger = logging.getLogger(__name__)
+
+FAMILY_CLAIM = 'fam'
+GENERATION_CLAIM = 'gen'
+
+
+def _families(user_id):
+    from .models import TokenFamily
+    return TokenFamily.objects.db_manager(user_db(user_id))
+
+
+def _expires_at(token):
+    return datetime.fromtimestamp(token['exp'], tz=timezone.utc)
+
+
+def in_family(token):
+    return FAMILY_CLAIM in token
+
+
+def _start_claims(token, family):
+    token[FAMILY_CLAIM] = family.pk
+    token[GENERATION_CLAIM] = family.generation
+
+
+def start(token, user):
+    """Start a new family (session) with token as its first refresh token."""
+    _start_claims(token, _families(user.pk).create(user_id=user.pk, expires_at=_expires_at(token)))
+
+
+async def astart(token, user):
+    """Async start()."""
+    _start_claims(token, await _families(user.pk).acreate(user_id=user.pk, expires_at=_expires_at(token)))
+
+
+def _newest(token, user):
+    """The UPDATE that moves token's family to the next generation, if token is still its newest."""
+    return _families(user.pk).filter(
+        pk=token[FAMILY_CLAIM],
+        generation=token[GENERATION_CLAIM],
+        expires_at__gt=django_timezone.now(),
+    )
+
+
+def _renew(token):
+    token.set_jti()
+    token.set_exp()
+    token.set_iat()
+
+
+def _not_newest(token, user, ended):
+    if ended:
+        from .models import AuthEvent
+        audit.record(AuthEvent.REFRESH_REUSE, user.pk)
+        logger.warning(
+            'Refresh token reuse: generation %s of family %s (user %s) was already used, family ended',
+            token[GENERATION_CLAIM], token[FAMILY_CLAIM], user.pk,
+        )
+        return TokenError('Token was already used')
+    return TokenError('Token is revoked')
+
+
+def rotate(token, user):
+    """
+    Turn token into the next refresh token of its family.
+
+    Raises TokenError, and ends the family, if token isn't the family's
+    newest. Tokens from before families start one.
+    """
+    if not in_family(token):
+        _renew(token)
+        start(token, user)
+        return
+    newest = _newest(token, user)
+    _renew(token)
+    if not newest.update(generation=F('generation') + 1, expires_at=_expires_at(token)):
+        ended, _ = _families(user.pk).filter(pk=token[FAMILY_CLAIM]).delete()
+        raise _not_newest(token, user, ended)
+    token[GENERATION_CLAIM] += 1
+
+
+async def arotate(token, user):
+    """Async rotate()."""
+    if not in_family(token):
+        _renew(token)
+        await astart(token, user)
+        return
+    newest = _newest(token, user)
+    _renew(token)
+    if not await newest.aupdate(generation=F('generation') + 1, expires_at=_expires_at(token)):
+        ended, _ = await _families(user.pk).filter(pk=token[FAMILY_CLAIM]).adelete()
+        raise _not_newest(token, user, ended)
+    token[GENERATION_CLAIM] += 1
+
+
+def check(token, user):
+    """Without rotation: TokenError unless token's family is still there."""
+    if in_family(token) and not _newest(token, user).exists():
+        raise TokenError('Token is revoked')
+
+
+async def acheck(token, user):
+    """Async check()."""
+    if in_family(token) and not await _newest(token, user).aexists():
+        raise TokenError('Token is revoked')
+
+
+def end(token):
+    """Logout: end the session token belongs to."""
+    if in_family(token):
+        _families(token[jwt_settings.USER_ID_CLAIM]).filter(pk=token[FAMILY_CLAIM]).delete()
+
+
+async def aend(token):
+    """Async end()."""
+    if in_family(token):
+        await _families(token[jwt_settings.USER_ID_CLAIM]).filter(pk=token[FAMILY_CLAIM]).adelete()
+
+
+def end_all(user):
+    """End every session of user."""
+    _families(user.pk).filter(user_id=user.pk).delete()
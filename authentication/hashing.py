@@ -0,0 +1,256 @@
+"""
+Password hashing worker pool.
+
+PBKDF2 is deliberately slow (hundreds of ms of pure CPU per call), and it used to
+run right on the request thread for every login, registration and password change.
+A burst of logins would pin every worker thread while cheap requests like
+/auth/user/ and /health/ queued up behind them.
+
+Hash and verify work now goes to a small, dedicated process pool instead. The
+request thread just waits on the result (without holding the GIL), and the number
+of jobs that can be queued or running at once is capped. Once the cap is hit, new
+hashing requests are shed immediately with a 503 rather than piling up.
+
+Everything in the app should go through make_password()/check_password() here
+(the User model does this for you in set_password/check_password).
+"""
+
+import asyncio
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .metrics import timed
+
+DEFAULTS = {
+    'WORKERS': max(1, (os.cpu_count() or 2) // 2),
+    'MAX_PENDING': 16,
+    'TIMEOUT': 10,
+}
+
+
+class HasherBusy(APIException):
+    """Raised when the hasher pool is saturated - DRF turns this into a 503."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The service is busy, please try again shortly.'
+    default_code = 'hasher_busy'
+    # DRF's exception handler sends this as a Retry-After header
+    wait = 1
+
+
+def _init_worker(password_hashers):
+    """Give spawned workers just enough Django configuration to hash passwords."""
+    if not settings.configured:
+        settings.configure(PASSWORD_HASHERS=password_hashers)
+
+
+def _make_password(password):
+    return hashers.make_password(password)
+
+
+def _verify_password(password, encoded):
+    return hashers.verify_password(password, encoded)
+
+
+def _ping():
+    return True
+
+
+class HasherPool:
+    """
+    Bounded process pool for password hashing.
+
+    The pool and its bookkeeping are created lazily and re-created after a fork,
+    so it is safe to import this module in a preforking server.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._slots = None
+        self._pending = 0
+        self.submitted = 0
+        self.rejected = 0
+
+    @property
+    def config(self):
+        return {**DEFAULTS, **getattr(settings, 'PASSWORD_HASHER_POOL', {})}
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            config = self.config
+            self._slots = threading.BoundedSemaphore(config['MAX_PENDING'])
+            self._pending = 0
+            self._executor = None
+            if config['WORKERS'] > 0:
+                # spawn rather than fork - forking a threaded server process is asking for trouble
+                self._executor = ProcessPoolExecutor(
+                    max_workers=config['WORKERS'],
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(list(settings.PASSWORD_HASHERS),),
+                )
+            self._pid = os.getpid()
+
+    def _reserve_slot(self):
+        self._ensure_started()
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HasherBusy()
+        with self._lock:
+            self._pending += 1
+            self.submitted += 1
+
+    def _release_slot(self, *args):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def run(self, func, *args):
+        """Run func(*args) on the pool, shedding load with HasherBusy when it is full."""
+        with timed('hash'):
+            return self._run(func, *args)
+
+    async def arun(self, func, *args):
+        """Async run(): awaits the pool without blocking the event loop."""
+        with timed('hash'):
+            return await self._arun(func, *args)
+
+    def _run(self, func, *args):
+        self._reserve_slot()
+
+        if self._executor is None:
+            try:
+                return func(*args)
+            finally:
+                self._release_slot()
+
+        try:
+            future = self._executor.submit(func, *args)
+        except BrokenProcessPool:
+            self._release_slot()
+            self.reset()
+            raise HasherBusy()
+        # The slot stays taken until the job actually finishes, even if we stop
+        # waiting for it, so MAX_PENDING really bounds the work queued on the pool.
+        future.add_done_callback(self._release_slot)
+
+        try:
+            return future.result(timeout=self.config['TIMEOUT'])
+        except FutureTimeoutError:
+            raise HasherBusy()
+        except BrokenProcessPool:
+            self.reset()
+            raise HasherBusy()
+
+    async def _arun(self, func, *args):
+        self._reserve_slot()
+
+        if self._executor is None:
+            # Inline mode still has to keep the CPU work off the event loop
+            try:
+                return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+            finally:
+                self._release_slot()
+
+        try:
+            future = self._executor.submit(func, *args)
+        except BrokenProcessPool:
+            self._release_slot()
+            self.reset()
+            raise HasherBusy()
+        future.add_done_callback(self._release_slot)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.config['TIMEOUT'])
+        except asyncio.TimeoutError:
+            raise HasherBusy()
+        except BrokenProcessPool:
+            self.reset()
+            raise HasherBusy()
+
+    def ping(self, timeout):
+        """
+        Round-trip a no-op through a worker process (for the readiness check).
+
+        Doesn't take a slot, so probes never cause a 503 for real traffic.
+        Raises TimeoutError or BrokenProcessPool when the pool isn't answering.
+        """
+        self._ensure_started()
+        if self._executor is None:
+            return True
+        try:
+            return self._executor.submit(_ping).result(timeout=timeout)
+        except BrokenProcessPool:
+            self.reset()
+            raise
+
+    def reset(self):
+        """Throw away the current pool (e.g. after a worker crashed) and start over on next use."""
+        with self._lock:
+            executor, self._executor, self._pid = self._executor, None, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        config = self.config
+        return {
+            'workers': config['WORKERS'],
+            'max_pending': config['MAX_PENDING'],
+            'pending': self._pending,
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+        }
+
+
+pool = HasherPool()
+atexit.register(pool.shutdown)
+
+
+def make_password(password):
+    """Pool-backed django.contrib.auth.hashers.make_password()."""
+    if password is None:
+        # Unusable passwords are just a random string, no need to leave the thread
+        return hashers.make_password(None)
+    return pool.run(_make_password, password)
+
+
+def check_password(password, encoded, setter=None):
+    """Pool-backed django.contrib.auth.hashers.check_password()."""
+    is_correct, must_update = pool.run(_verify_password, password, encoded)
+    if setter and is_correct and must_update:
+        setter(password)
+    return is_correct
+
+
+async def amake_password(password):
+    """Async make_password()."""
+    if password is None:
+        return hashers.make_password(None)
+    return await pool.arun(_make_password, password)
+
+
+async def acheck_password(password, encoded, setter=None):
+    """Async check_password(); setter must be a coroutine function."""
+    is_correct, must_update = await pool.arun(_verify_password, password, encoded)
+    if setter and is_correct and must_update:
+        await setter(password)
+    return is_correct
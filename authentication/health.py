@@ -0,0 +1,156 @@
+"""
+Liveness and readiness checks.
+
+Liveness (/health/live/) only says the process can answer HTTP - it checks
+nothing, so a slow database never gets the pod restarted.
+
+Readiness (/health/ready/, and /health/ for existing monitors) runs real checks:
+
+    database     SELECT 1 on the default database
+    hasher_pool  a no-op round trip through the password hasher pool
+    signing_key  sign and verify a throwaway token with the current key
+
+Several load balancers probing every second would otherwise turn into a
+steady stream of queries, so the result is cached per process for CACHE_TTL
+seconds. Only one thread refreshes it at a time, the others keep answering
+with the previous result meanwhile. Each check keeps its last LATENCY_WINDOW
+durations for the latency stats in the response.
+
+The endpoint is unauthenticated, so a failing check only reports
+{"ok": false, "error": "check failed"} - the exception goes to the log.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection
+
+from .hashing import pool
+from .keys import get_token_backend, keyring, uses_keyring
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CACHE_TTL': 2.0,
+    'HASHER_TIMEOUT': 5.0,
+    'LATENCY_WINDOW': 100,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'HEALTH_CHECKS', {})}
+
+
+def check_database():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    return {'vendor': connection.vendor}
+
+
+def check_hasher_pool():
+    stats = pool.stats()
+    details = {'workers': stats['workers'], 'pending': stats['pending'], 'max_pending': stats['max_pending']}
+    if stats['pending'] >= stats['max_pending']:
+        # Full of real work - that's load, not breakage, and a ping would just queue behind it
+        return {**details, 'busy': True}
+    pool.ping(get_config()['HASHER_TIMEOUT'])
+    return details
+
+
+def check_signing_key():
+    backend = get_token_backend()
+    backend.decode(backend.encode({'probe': True}))
+    if uses_keyring():
+        key = keyring.signing_key()
+        return {'algorithm': key.algorithm, 'kid': key.kid}
+    return {'algorithm': backend.algorithm}
+
+
+CHECKS = {
+    'database': check_database,
+    'hasher_pool': check_hasher_pool,
+    'signing_key': check_signing_key,
+}
+
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+class HealthChecker:
+    """Runs CHECKS at most every CACHE_TTL seconds per process."""
+
+    def __init__(self):
+        self._refresh_lock = threading.Lock()
+        self._result = None
+        self._checked_at = 0.0
+        self._latencies = {}
+        self.runs = 0
+
+    def readiness(self):
+        """(result dict, whether it came from the cache)."""
+        result = self._result
+        if result is not None and time.monotonic() - self._checked_at < get_config()['CACHE_TTL']:
+            return result, True
+        # Somebody else is refreshing: answer with what we have instead of piling up
+        if not self._refresh_lock.acquire(blocking=result is None):
+            return result, True
+        try:
+            if self._result is not result:
+                return self._result, True
+            return self._run(), False
+        finally:
+            self._refresh_lock.release()
+
+    def _run(self):
+        window = get_config()['LATENCY_WINDOW']
+        checks = {}
+        for name, check in CHECKS.items():
+            started = time.perf_counter()
+            try:
+                details = check()
+                outcome = {'ok': True, **details}
+            except Exception:
+                logger.exception('Health check: %s failed', name)
+                outcome = {'ok': False, 'error': 'check failed'}
+            elapsed = time.perf_counter() - started
+            outcome['latency_ms'] = round(elapsed * 1000, 2)
+            samples = self._latencies.get(name)
+            if samples is None or samples.maxlen != window:
+                samples = self._latencies[name] = deque(samples or (), maxlen=window)
+            samples.append(elapsed)
+            checks[name] = outcome
+
+        self.runs += 1
+        self._result = {
+            'ready': all(outcome['ok'] for outcome in checks.values()),
+            'checks': checks,
+            'checked_at': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+        }
+        self._checked_at = time.monotonic()
+        return self._result
+
+    def age(self):
+        return time.monotonic() - self._checked_at
+
+    def latency_stats(self):
+        """p50/p95/max of each check over its last LATENCY_WINDOW runs (milliseconds)."""
+        stats = {}
+        for name, samples in list(self._latencies.items()):
+            ordered = sorted(samples)
+            if ordered:
+                stats[name] = {
+                    'runs': len(ordered),
+                    'p50_ms': round(_percentile(ordered, 50) * 1000, 2),
+                    'p95_ms': round(_percentile(ordered, 95) * 1000, 2),
+                    'max_ms': round(ordered[-1] * 1000, 2),
+                }
+        return stats
+
+
+health = HealthChecker()
@@ -0,0 +1,127 @@
+"""
+Batch token introspection (POST /auth/token/verify/batch/).
+
+Gateways fanning a request out to several services may have dozens of tokens
+to check at once. One /auth/token/verify/ call per token pays a full request
+each, and every one of them may hit the database for its revocation and user
+lookups. introspect() checks a whole batch instead:
+
+1. every distinct token is decoded (signature, expiry, token type) once
+2. all their jtis go to the revocation store together - the Bloom filter
+   answers nearly all of them, the rest are confirmed with one query
+3. all their users' is_active/token_version come from the user cache
+   together - whatever isn't cached is loaded with one query
+
+So a batch costs at most two queries, however many tokens it holds.
+The checks are the same ones StatelessJWTAuthentication runs on every request.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .authentication import User, check_token_state
+from .cache import user_cache
+from .revocation import revocations
+from .tokens import UntypedToken
+
+DEFAULTS = {
+    'MAX_TOKENS': 100,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_INTROSPECTION', {})}
+
+
+def _user_pk(token):
+    """The token's user id as a User pk, or None if it has none (or a malformed one)."""
+    user_id = token.get(jwt_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return None
+    try:
+        return User._meta.pk.to_python(user_id)
+    except ValidationError:
+        return None
+
+
+def _decode(raw_token):
+    try:
+        return UntypedToken(raw_token), None
+    except TokenError as exc:
+        return None, exc.args[0]
+
+
+def introspect(raw_tokens):
+    """
+    Check a list of encoded tokens, returning one result dict per token (same order).
+
+    {
+        "valid": bool,            # would this token authenticate a request right now
+        "error": str,             # why not (only when valid is false)
+        "code": str,              # machine readable error
+        "token_type": "access",
+        "revoked": bool,          # revoked by jti or by the user's token epoch
+        "user_active": bool,      # None if the token has no (known) user
+        "exp": int,               # unix time
+        "expires_in": int,        # seconds
+        "claims": {...},
+    }
+
+    Tokens that don't decode (bad signature, expired, garbage) only get valid,
+    error and code - their claims can't be trusted.
+    """
+    decoded = {raw: _decode(raw) for raw in set(raw_tokens)}
+    tokens = [token for token, error in decoded.values() if token is not None]
+
+    revoked_jtis = revocations.revoked_subset(
+        token[jwt_settings.JTI_CLAIM] for token in tokens if jwt_settings.JTI_CLAIM in token
+    )
+    user_ids = {_user_pk(token) for token in tokens} - {None}
+    states = user_cache.get_many_values(user_ids, 'is_active', 'token_version') if user_ids else {}
+
+    now = int(time.time())
+    results = {}
+    for raw, (token, error) in decoded.items():
+        if token is None:
+            results[raw] = {'valid': False, 'error': error, 'code': 'token_not_valid'}
+            continue
+        results[raw] = _result(token, revoked_jtis, states, now)
+    return [results[raw] for raw in raw_tokens]
+
+
+def _result(token, revoked_jtis, states, now):
+    result = {
+        'valid': True,
+        'token_type': token.get(jwt_settings.TOKEN_TYPE_CLAIM),
+        'revoked': token.get(jwt_settings.JTI_CLAIM) in revoked_jtis,
+        'user_active': None,
+        'exp': token['exp'],
+        'expires_in': max(token['exp'] - now, 0),
+        'claims': token.payload,
+    }
+    if result['revoked']:
+        result.update(valid=False, error='Token is revoked', code='token_not_valid')
+
+    user_id = _user_pk(token)
+    if user_id is None:
+        if result['valid']:
+            result.update(valid=False, error='Token contained no recognizable user identification',
+                          code='token_not_valid')
+        return result
+
+    state = states.get(user_id)
+    if state is not None:
+        result['user_active'] = state[0]
+    try:
+        check_token_state(token, state)
+    except AuthenticationFailed as exc:
+        if exc.detail.code == 'token_revoked':
+            result['revoked'] = True
+        if result['valid']:
+            result.update(valid=False, error=str(exc.detail), code=exc.detail.code)
+    return result
@@ -0,0 +1,409 @@
+"""
+Asymmetric JWT signing keys and the JWKS they're published as.
+
+With HS256 every service that wants to check a token needs our secret, or
+has to call /auth/token/verify/ for every request it gets. Signing with
+RS256/EdDSA instead lets anyone verify tokens locally with the public keys
+from /auth/.well-known/jwks.json, so the auth service drops out of their
+request path.
+
+Keys are JSON files in settings.JWT_KEYS['KEY_DIR'], one per key id (kid):
+
+    {"kid": ..., "alg": "RS256", "created": ..., "not_before": ..., "private_key": "-----BEGIN ..."}
+
+Rotation overlaps on both ends (`manage.py rotate_signing_key`):
+
+1. A new key is published in the JWKS PUBLISH_AHEAD before it signs anything,
+   so consumers caching the JWKS for JWKS_MAX_AGE already know it by then.
+2. From its not_before on, the new key signs all new tokens.
+3. The old key stays published (and accepted) until every token it signed
+   has expired, i.e. for the longest token lifetime after it stopped signing.
+   The next rotation deletes it after that.
+
+The first key is created with `manage.py rotate_signing_key --now` - without
+a key, signing fails with ImproperlyConfigured rather than quietly writing a
+private key wherever KEY_DIR happens to point. With CREATE_FIRST_KEY (throwaway
+setups like the benchmarks) the first process to need a key creates one instead,
+behind a lock file, so all workers end up with the same key.
+
+Tokens carry the key id in their "kid" header. Tokens without one were
+signed with SIMPLE_JWT's HS256 SIGNING_KEY before the switch. They are only
+accepted until ACCEPT_LEGACY_HS256_UNTIL (the switch plus the refresh token
+lifetime, by when every real one has expired), and only if they expire by
+then too - anyone who has the HS256 key can mint tokens without a kid, so
+that window should be as short as possible. Unset (the default), tokens
+without a kid are rejected. Setting ALGORITHM to 'HS256' keeps plain
+SimpleJWT signing.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import cached_property
+
+import jwt
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from jwt import algorithms
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError, TokenBackendExpiredToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.state import token_backend as legacy_backend
+
+DEFAULTS = {
+    'ALGORITHM': 'RS256',
+    'KEY_DIR': None,
+    'RSA_KEY_SIZE': 2048,
+    'PUBLISH_AHEAD': timedelta(hours=2),
+    'JWKS_MAX_AGE': 3600,
+    'ACCEPT_LEGACY_HS256_UNTIL': None,
+    'RELOAD_INTERVAL': 10,
+    'CREATE_FIRST_KEY': False,
+}
+
+ASYMMETRIC_ALGORITHMS = ('RS256', 'RS384', 'RS512', 'EdDSA')
+
+
+def get_config():
+    config = {**DEFAULTS, **getattr(settings, 'JWT_KEYS', {})}
+    if config['KEY_DIR'] is None:
+        config['KEY_DIR'] = settings.BASE_DIR / 'keys'
+    until = config['ACCEPT_LEGACY_HS256_UNTIL']
+    if isinstance(until, str):
+        until = datetime.fromisoformat(until)
+    if until is not None and timezone.is_naive(until):
+        until = timezone.make_aware(until, dt_timezone.utc)
+    config['ACCEPT_LEGACY_HS256_UNTIL'] = until
+    return config
+
+
+def uses_keyring():
+    """Whether tokens are signed with the asymmetric keyring rather than SIMPLE_JWT's HS256 key."""
+    return get_config()['ALGORITHM'] in ASYMMETRIC_ALGORITHMS
+
+
+def max_token_lifetime():
+    return max(jwt_settings.ACCESS_TOKEN_LIFETIME, jwt_settings.REFRESH_TOKEN_LIFETIME)
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def generate_private_key(algorithm, rsa_key_size=2048):
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    if algorithm == 'EdDSA':
+        return ed25519.Ed25519PrivateKey.generate()
+    return rsa.generate_private_key(public_exponent=65537, key_size=rsa_key_size)
+
+
+@dataclass
+class SigningKey:
+    kid: str
+    algorithm: str
+    created: datetime
+    not_before: datetime
+    private_pem: str
+
+    @classmethod
+    def generate(cls, algorithm, not_before, rsa_key_size=2048):
+        from cryptography.hazmat.primitives import serialization
+
+        private_key = generate_private_key(algorithm, rsa_key_size)
+        public_der = private_key.public_key().public_bytes(
+            serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        private_pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ).decode()
+        return cls(
+            kid=_b64(hashlib.sha256(public_der).digest()[:12]),
+            algorithm=algorithm,
+            created=timezone.now(),
+            not_before=not_before,
+            private_pem=private_pem,
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            kid=data['kid'],
+            algorithm=data['alg'],
+            created=datetime.fromisoformat(data['created']),
+            not_before=datetime.fromisoformat(data['not_before']),
+            private_pem=data['private_key'],
+        )
+
+    def to_dict(self):
+        return {
+            'kid': self.kid,
+            'alg': self.algorithm,
+            'created': self.created.isoformat(),
+            'not_before': self.not_before.isoformat(),
+            'private_key': self.private_pem,
+        }
+
+    @cached_property
+    def jws_algorithm(self):
+        return jwt.PyJWS().get_algorithm_by_name(self.algorithm)
+
+    @cached_property
+    def private_key(self):
+        return self.jws_algorithm.prepare_key(self.private_pem)
+
+    @cached_property
+    def public_key(self):
+        return self.private_key.public_key()
+
+    def to_jwk(self):
+        """The public half as a JWK (RFC 7517)."""
+        jwk = self.jws_algorithm.to_jwk(self.public_key, as_dict=True)
+        jwk.update({'kid': self.kid, 'alg': self.algorithm, 'use': 'sig'})
+        return jwk
+
+
+class Keyring:
+    """All keys in KEY_DIR, re-read when the directory changes (checked every RELOAD_INTERVAL seconds)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._jwks = (None, None)
+
+    @property
+    def config(self):
+        return get_config()
+
+    @property
+    def key_dir(self):
+        return os.fspath(self.config['KEY_DIR'])
+
+    # Loading
+
+    def _read(self):
+        keys = []
+        for name in sorted(os.listdir(self.key_dir)):
+            if name.endswith('.json'):
+                with open(os.path.join(self.key_dir, name)) as f:
+                    keys.append(SigningKey.from_dict(json.load(f)))
+        return sorted(keys, key=lambda key: key.not_before)
+
+    def keys(self):
+        """All keys, oldest first."""
+        now = time.monotonic()
+        if self._keys is not None and now - self._checked_at < self.config['RELOAD_INTERVAL']:
+            return self._keys
+        with self._lock:
+            try:
+                mtime = os.stat(self.key_dir).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if self._keys is None or mtime != self._mtime:
+                keys = self._read() if mtime is not None else []
+                if not keys:
+                    keys = self._first_key()
+                self._keys, self._mtime = keys, mtime
+            self._checked_at = now
+            return self._keys
+
+    def reload(self):
+        self._keys = None
+        return self.keys()
+
+    def _first_key(self):
+        if not self.config['CREATE_FIRST_KEY']:
+            raise ImproperlyConfigured(
+                f'No JWT signing key in {self.key_dir} - create one with `python manage.py rotate_signing_key --now`'
+            )
+        os.makedirs(self.key_dir, mode=0o700, exist_ok=True)
+        return self._create_first_key()
+
+    def _create_first_key(self):
+        # Several workers can start at once - only the one holding the lock file generates the key
+        lock_path = os.path.join(self.key_dir, '.first-key.lock')
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            for _ in range(100):
+                time.sleep(0.1)
+                keys = self._read()
+                if keys:
+                    return keys
+            raise ImproperlyConfigured(f'No JWT signing key in {self.key_dir} (delete {lock_path} if it is stale)')
+        try:
+            keys = self._read()
+            if not keys:
+                self.write(self.generate(not_before=timezone.now()))
+                keys = self._read()
+        finally:
+            os.close(fd)
+            os.remove(lock_path)
+        return keys
+
+    # Lookups
+
+    def signing_key(self):
+        """The newest key that is allowed to sign already."""
+        keys = self.keys()
+        now = timezone.now()
+        active = [key for key in keys if key.not_before <= now]
+        return active[-1] if active else keys[0]
+
+    def get(self, kid):
+        for key in self.keys():
+            if key.kid == kid:
+                return key
+        return None
+
+    def jwks(self):
+        """Every key consumers may run into: upcoming, current and not yet expired old ones."""
+        keys = self.keys()
+        cached_for, jwks = self._jwks
+        if cached_for is not keys:
+            jwks = {'keys': [key.to_jwk() for key in keys]}
+            self._jwks = (keys, jwks)
+        return jwks
+
+    # Rotation
+
+    def generate(self, not_before, algorithm=None):
+        config = self.config
+        algorithm = algorithm or config['ALGORITHM']
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            raise ImproperlyConfigured(f'JWT_KEYS: {algorithm} is not an asymmetric algorithm')
+        if not algorithms.has_crypto:
+            raise ImproperlyConfigured(f'The cryptography package is required to sign tokens with {algorithm}')
+        return SigningKey.generate(algorithm, not_before, config['RSA_KEY_SIZE'])
+
+    def write(self, key):
+        os.makedirs(self.key_dir, mode=0o700, exist_ok=True)
+        path = os.path.join(self.key_dir, f'{key.kid}.json')
+        tmp_path = f'{path}.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(key.to_dict(), f, indent=2)
+        # Rename so other processes never read a half written key
+        os.replace(tmp_path, path)
+
+    def rotate(self, algorithm=None, activate_now=False):
+        """
+        Publish a new key that starts signing PUBLISH_AHEAD from now and drop keys nothing can use anymore.
+
+        Returns (new key, list of deleted keys).
+        """
+        now = timezone.now()
+        not_before = now if activate_now else now + self.config['PUBLISH_AHEAD']
+        key = self.generate(not_before, algorithm)
+        self.write(key)
+        return key, self.prune()
+
+    def prune(self):
+        """Delete keys whose successor took over longer ago than any token can live."""
+        keys = self.reload()
+        cutoff = timezone.now() - max_token_lifetime()
+        removed = []
+        for key, successor in zip(keys, keys[1:]):
+            if successor.not_before <= cutoff:
+                os.remove(os.path.join(self.key_dir, f'{key.kid}.json'))
+                removed.append(key)
+        if removed:
+            self.reload()
+        return removed
+
+
+keyring = Keyring()
+
+
+class KeyringTokenBackend(TokenBackend):
+    """
+    SimpleJWT TokenBackend that signs with the keyring's current key.
+
+    The verifying key (and algorithm) is picked by the token's kid header -
+    never by its alg header, so a token can't talk us into a weaker algorithm.
+    """
+
+    def __init__(self):
+        super().__init__(
+            'HS256',
+            jwt_settings.SIGNING_KEY,
+            audience=jwt_settings.AUDIENCE,
+            issuer=jwt_settings.ISSUER,
+            leeway=jwt_settings.LEEWAY,
+            json_encoder=jwt_settings.JSON_ENCODER,
+        )
+
+    def encode(self, payload):
+        key = keyring.signing_key()
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload['aud'] = self.audience
+        if self.issuer is not None:
+            jwt_payload['iss'] = self.issuer
+        return jwt.encode(
+            jwt_payload,
+            key.private_key,
+            algorithm=key.algorithm,
+            headers={'kid': key.kid},
+            json_encoder=self.json_encoder,
+        )
+
+    def decode(self, token, verify=True):
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+        except jwt.InvalidTokenError as e:
+            raise TokenBackendError('Token is invalid') from e
+
+        if kid is None:
+            return self._decode_legacy(token, verify)
+
+        key = keyring.get(kid)
+        if key is None:
+            raise TokenBackendError('Token is invalid')
+
+        try:
+            return jwt.decode(
+                token,
+                key.public_key,
+                algorithms=[key.algorithm],
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.get_leeway(),
+                options={
+                    'verify_aud': self.audience is not None,
+                    'verify_signature': verify,
+                },
+            )
+        except jwt.ExpiredSignatureError as e:
+            raise TokenBackendExpiredToken('Token is expired') from e
+        except jwt.InvalidTokenError as e:
+            raise TokenBackendError('Token is invalid') from e
+
+    def _decode_legacy(self, token, verify):
+        until = get_config()['ACCEPT_LEGACY_HS256_UNTIL']
+        if until is None or timezone.now() >= until:
+            raise TokenBackendError('Token is invalid')
+        payload = legacy_backend.decode(token, verify=verify)
+        # Every token issued before the switch expires by the deadline - a later exp means forged
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)) or exp > until.timestamp():
+            raise TokenBackendError('Token is invalid')
+        return payload
+
+
+keyring_backend = KeyringTokenBackend()
+
+
+def get_token_backend():
+    """The backend our token classes sign and verify with."""
+    return keyring_backend if uses_keyring() else legacy_backend
@@ -0,0 +1,186 @@
+"""
+Buffered last_login updates.
+
+Django's login() (through its update_last_login receiver) and SimpleJWT's
+UPDATE_LAST_LOGIN each run an UPDATE on auth_user for every login. In a login
+burst those writes queue up on SQLite's single writer lock right next to the
+ones that matter. Here logins only note the time in memory:
+
+- The user object handed back to the view gets its new last_login right away,
+  so the login response shows it.
+- A background thread writes everything noted so far every FLUSH_INTERVAL
+  seconds (or as soon as BATCH_SIZE users are waiting) with one bulk UPDATE
+  per batch (and shard), then drops those users from the user cache.
+- Writes never move last_login backwards, in case another process flushed a
+  later login of the same user first.
+- Whatever is still waiting gets flushed at exit.
+
+So the column is at most FLUSH_INTERVAL seconds behind (plus however long the
+database takes), and a hard kill loses at most that much.
+
+AuthenticationConfig.ready() swaps Django's update_last_login receiver for
+record_login below, so logins through login()/alogin() (the admin, session
+mode) are buffered too.
+"""
+
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.auth import alogin, get_user_model, login
+from django.contrib.auth.signals import user_logged_in
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from django.db.models import Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .cache import user_cache
+from .sharding import group_by_db
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CREATE_SESSION': False,
+    'FLUSH_INTERVAL': 5.0,
+    'BATCH_SIZE': 500,
+    'BACKGROUND': True,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'LOGIN_WRITES', {})}
+
+
+class LastLoginBuffer:
+    """
+    last_login times waiting to be written, by user id.
+
+    Started lazily and again after a fork, like the revocation store. Without
+    BACKGROUND the times wait for an explicit flush().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._wakeup = None
+        self._pending = {}
+        self.recorded = 0
+        self.flushed = 0
+        self.flushes = 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pending = {}
+            self._wakeup = threading.Event()
+            self._pid = os.getpid()
+            if get_config()['BACKGROUND']:
+                threading.Thread(target=self._run, name='last-login-writer', daemon=True).start()
+
+    def record(self, user, when=None):
+        """Set user.last_login to now (or when) and queue the write."""
+        when = when or timezone.now()
+        user.last_login = when
+        self._ensure_started()
+        with self._lock:
+            self._pending[user.pk] = when
+            self.recorded += 1
+            flush_now = len(self._pending) >= get_config()['BATCH_SIZE']
+        if flush_now:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(get_config()['FLUSH_INTERVAL'])
+            self._wakeup.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                # Keep going - the times stay pending and get retried
+                logger.exception('Last login buffer: flush failed')
+
+    def flush(self):
+        """Write every pending last_login, one UPDATE per BATCH_SIZE users."""
+        with self._lock:
+            pending = dict(self._pending)
+        if not pending:
+            return
+        User = get_user_model()
+        for using, user_ids in group_by_db(pending).items():
+            users = []
+            for user_id in user_ids:
+                when = pending[user_id]
+                # Coalesce: Greatest() is NULL on SQLite if either side is
+                last_login = Greatest(Coalesce('last_login', Value(when)), Value(when))
+                users.append(User(pk=user_id, last_login=last_login))
+            User.objects.db_manager(using).bulk_update(users, ['last_login'], batch_size=get_config()['BATCH_SIZE'])
+        # bulk_update() sends no post_save
+        user_cache.invalidate(*pending)
+        with self._lock:
+            for user_id, when in pending.items():
+                # A newer login that came in meanwhile stays queued
+                if self._pending.get(user_id) == when:
+                    del self._pending[user_id]
+            self.flushed += len(pending)
+            self.flushes += 1
+
+    def shutdown(self):
+        """Flush whatever is still pending (called at exit)."""
+        if self._pid == os.getpid() and self._pending:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Last login buffer: could not write %d logins at exit', len(self._pending))
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'recorded': self.recorded,
+            'flushed': self.flushed,
+            'flushes': self.flushes,
+        }
+
+
+last_logins = LastLoginBuffer()
+atexit.register(last_logins.shutdown)
+
+
+def record_login(sender, user, **kwargs):
+    """user_logged_in receiver, instead of django.contrib.auth.models.update_last_login."""
+    last_logins.record(user)
+
+
+def _require_session(request):
+    if not hasattr(request, 'session'):
+        raise ImproperlyConfigured(
+            "LOGIN_WRITES['CREATE_SESSION'] needs SessionMiddleware in the API's MIDDLEWARE_PROFILES entry."
+        )
+
+
+def logged_in(request, user):
+    """
+    What the API login views do instead of login(): unless CREATE_SESSION is on,
+    no session is created (token clients never send the cookie back), only
+    user_logged_in is sent - which buffers last_login.
+    """
+    if get_config()['CREATE_SESSION']:
+        _require_session(request)
+        login(request, user)
+    else:
+        user_logged_in.send(sender=user.__class__, request=request, user=user)
+
+
+async def alogged_in(request, user):
+    """Async logged_in()."""
+    if get_config()['CREATE_SESSION']:
+        _require_session(request)
+        await alogin(request, user)
+    else:
+        await user_logged_in.asend(sender=user.__class__, request=request, user=user)
@@ -0,0 +1,218 @@
+"""
+Non-blocking JSON logging.
+
+logging.FileHandler and StreamHandler write (and flush) on the thread that
+logs, under the handler's lock, so under load every request that logs pays
+for a write syscall and waits on every other request doing the same.
+QueueLogHandler only puts the record on a bounded in-memory queue:
+
+- A background thread per handler takes whatever has piled up (up to
+  batch_size records), formats it as JSON lines and writes it with one
+  write() and one flush().
+- The queue is bounded (queue_size). When the writer can't keep up, new
+  records are dropped and counted instead of blocking requests.
+- sampling={'DEBUG': 0.01} keeps only that share of records at a level, for
+  chatty levels. Kept records carry "sample_rate" so counts can be scaled
+  back up. Levels not listed are all kept.
+- Whatever is still queued is written by logging.shutdown() at exit.
+- background=False starts no writer thread: records wait for flush().
+
+Records go onto the queue as they are, formatting happens on the writer
+thread - so don't mutate objects after passing them as log arguments.
+
+Counters (queued, dropped, sampled out, written) are in /metrics.
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import weakref
+from datetime import datetime, timezone
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# What every LogRecord has - anything else came in through extra={...}
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_handlers = weakref.WeakSet()
+
+
+def _dumps(entry):
+    if orjson is not None:
+        return orjson.dumps(entry, default=str).decode()
+    return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, extras, exception."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return _dumps(entry)
+
+
+class QueueLogHandler(logging.Handler):
+    """
+    Queues records for a background writer (see above).
+
+    Writes to filename, or to stream ('stderr' or 'stdout') without one.
+    Started lazily and again after a fork, like the revocation store.
+    """
+
+    def __init__(self, filename=None, stream='stderr', queue_size=10000, batch_size=500,
+                 sampling=None, background=True, level=logging.NOTSET):
+        super().__init__(level)
+        self.filename = os.fspath(filename) if filename is not None else None
+        self.stream_name = stream
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.background = background
+        self.rates = {logging._checkLevel(name): rate for name, rate in (sampling or {}).items()}
+        self.setFormatter(JsonFormatter())
+        self._pid = None
+        self._queue = None
+        self._stream = None
+        self._write_lock = threading.Lock()
+        self.queued = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.written = 0
+        self.writes = 0
+        _handlers.add(self)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self.lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.SimpleQueue() if not self.queue_size else queue.Queue(self.queue_size)
+            self._stream = None
+            self._pid = os.getpid()
+            if self.background:
+                threading.Thread(target=self._run, name=f'log-writer-{self.name or id(self)}', daemon=True).start()
+
+    # Request side
+
+    def handle(self, record):
+        # logging.Handler.handle() holds self.lock around emit() - the queue has its own
+        rv = self.filter(record)
+        if isinstance(rv, logging.LogRecord):  # Filters may swap the record (3.12+)
+            record = rv
+        if rv:
+            self.emit(record)
+        return rv
+
+    def emit(self, record):
+        rate = self.rates.get(record.levelno)
+        if rate is not None and rate < 1.0:
+            if random.random() >= rate:
+                self.sampled_out += 1
+                return
+            record.sample_rate = rate
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.queued += 1
+
+    # Writer side
+
+    def _run(self):
+        records = self._queue
+        while True:
+            batch = [records.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(records.get_nowait())
+            except queue.Empty:
+                pass
+            self._write(batch)
+
+    def _open(self):
+        if self._stream is None:
+            if self.filename is not None:
+                self._stream = open(self.filename, 'a', encoding='utf-8')
+            else:
+                self._stream = sys.stdout if self.stream_name == 'stdout' else sys.stderr
+        return self._stream
+
+    def _write(self, batch):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        with self._write_lock:
+            try:
+                stream = self._open()
+                stream.write('\n'.join(lines) + '\n')
+                stream.flush()
+            except Exception:
+                self.handleError(batch[-1])
+                return
+            self.written += len(lines)
+            self.writes += 1
+
+    def flush(self):
+        """Write out whatever is queued right now, on the calling thread."""
+        if self._pid != os.getpid():
+            return
+        batch = []
+        try:
+            while True:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        if batch:
+            self._write(batch)
+
+    def close(self):
+        # logging.shutdown() at exit: flush(), then close()
+        self.flush()
+        with self._write_lock:
+            if self._stream is not None and self.filename is not None:
+                self._stream.close()
+            self._stream = None
+        super().close()
+
+    def stats(self):
+        return {
+            'queued': self.queued,
+            'waiting': self._queue.qsize() if self._queue is not None else 0,
+            'dropped': self.dropped,
+            'sampled_out': self.sampled_out,
+            'written': self.written,
+            'writes': self.writes,
+        }
+
+
+def stats():
+    """Counters of every QueueLogHandler, by handler name."""
+    return {handler.name or str(id(handler)): handler.stats() for handler in list(_handlers)}
@@ -0,0 +1,27 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from authentication.sharding import user_databases
+
+
+class Command(BaseCommand):
+    """
+    Run migrate on every user shard (see authentication/sharding.py).
+
+    AUTH_DB_SHARDS=shard1.sqlite3,shard2.sqlite3 python manage.py migrate_shards
+
+    Every shard gets the full schema, so there's no need to pick apps. Without
+    sharding this is just migrate.
+    """
+    help = 'Apply migrations to every user shard database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive')
+
+    def handle(self, *args, **options):
+        for using in user_databases():
+            using = using or DEFAULT_DB_ALIAS
+            self.stdout.write(self.style.MIGRATE_HEADING(f'Migrating {using}:'))
+            call_command('migrate', database=using, interactive=options['interactive'],
+                         verbosity=options['verbosity'], stdout=self.stdout)
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.purge import TARGETS, purge
+
+
+class Command(BaseCommand):
+    """
+    Delete expired revoked tokens, token families and sessions in small batches
+    (see authentication/purge.py).
+
+    python manage.py purge_expired                          # everything, once (e.g. from cron)
+    python manage.py purge_expired --max-seconds 300        # at most 5 minutes, resumes next run
+    python manage.py purge_expired --only sessions --sleep 0.5
+    python manage.py purge_expired --interval 3600          # keep running, once an hour
+
+    Safe to run next to the service and to interrupt at any time.
+    """
+    help = 'Delete expired revoked tokens, token families and sessions in throttled batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', nargs='+', choices=list(TARGETS), help='Only purge these tables.')
+        parser.add_argument('--batch-size', type=int, help="Rows per DELETE (default: PURGE['BATCH_SIZE']).")
+        parser.add_argument('--sleep', type=float, help="Seconds between batches (default: PURGE['SLEEP']).")
+        parser.add_argument('--max-rate', type=float, help='Delete at most this many rows per second.')
+        parser.add_argument('--max-seconds', type=float, help='Stop after this long and leave a checkpoint.')
+        parser.add_argument('--restart', action='store_true', help='Ignore checkpoints and start from the oldest row.')
+        parser.add_argument('--interval', type=float, help='Keep purging every INTERVAL seconds until interrupted.')
+
+    def handle(self, *args, **options):
+        while True:
+            results = purge(
+                options['only'],
+                max_seconds=options['max_seconds'],
+                batch_size=options['batch_size'],
+                sleep=options['sleep'],
+                max_rate=options['max_rate'],
+                restart=options['restart'],
+            )
+            for result in results:
+                self.stdout.write(
+                    f"{result['target']} on {result['database']}: {result['deleted']} rows in "
+                    f"{result['batches']} batches, {result['seconds']:.1f}s ({result['rows_per_second']:.0f} rows/s)"
+                    + ('' if result['complete'] else ' - stopped, resumes from the checkpoint')
+                )
+            if not options['interval']:
+                break
+            options['restart'] = False
+            time.sleep(options['interval'])
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.availability import build_filter
+
+
+class Command(BaseCommand):
+    """
+    Build the availability index's filter of taken usernames and emails
+    (see authentication/availability.py). Server processes pick it up within
+    AVAILABILITY['SYNC_INTERVAL'] seconds.
+
+    python manage.py rebuild_availability                   # once (e.g. hourly from cron)
+    python manage.py rebuild_availability --interval 3600   # keep running, once an hour
+    """
+    help = 'Build the Bloom filter of taken usernames/emails that availability checks are answered from.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Keep rebuilding every INTERVAL seconds until interrupted.')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            stored = build_filter()
+            self.stdout.write(
+                f'{stored.count} names in {len(stored.bits) / 2**20:.1f}MB '
+                f'(capacity {stored.capacity}), {time.perf_counter() - started:.1f}s'
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
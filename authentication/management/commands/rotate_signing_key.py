@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.keys import ASYMMETRIC_ALGORITHMS, keyring, uses_keyring
+
+
+class Command(BaseCommand):
+    """
+    Rotate the JWT signing key.
+
+    python manage.py rotate_signing_key              # publish now, start signing after PUBLISH_AHEAD
+    python manage.py rotate_signing_key --now        # start signing right away (key compromised)
+    python manage.py rotate_signing_key --list       # just show the keys
+    """
+    help = 'Publish a new JWT signing key and delete keys no unexpired token can be signed with.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--algorithm', choices=ASYMMETRIC_ALGORITHMS,
+            help='Algorithm for the new key (default: JWT_KEYS["ALGORITHM"]).',
+        )
+        parser.add_argument(
+            '--now', action='store_true',
+            help='Sign with the new key immediately. Consumers with a cached JWKS will reject '
+                 'new tokens until they refetch it.',
+        )
+        parser.add_argument('--list', action='store_true', help='List keys without rotating.')
+
+    def handle(self, *args, **options):
+        if not uses_keyring():
+            raise CommandError('JWT_KEYS["ALGORITHM"] is HS256 - there are no signing keys to rotate.')
+
+        if not options['list']:
+            key, removed = keyring.rotate(algorithm=options['algorithm'], activate_now=options['now'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Published {key.algorithm} key {key.kid}, signing from {key.not_before:%Y-%m-%d %H:%M:%S %Z}'
+            ))
+            for old in removed:
+                self.stdout.write(f'Deleted expired key {old.kid}')
+
+        signing = keyring.signing_key()
+        for key in keyring.reload():
+            marker = ' (signing)' if key.kid == signing.kid else ''
+            self.stdout.write(f'  {key.kid}  {key.algorithm:<6} not before {key.not_before:%Y-%m-%d %H:%M:%S}{marker}')
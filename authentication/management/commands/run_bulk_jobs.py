@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.bulk_actions import bulk_jobs, get_config
+
+
+class Command(BaseCommand):
+    """
+    Run queued admin bulk jobs (see authentication/bulk_actions.py).
+
+    python manage.py run_bulk_jobs            # whatever is queued or abandoned, then exit
+    python manage.py run_bulk_jobs --forever  # a dedicated worker, polling every POLL_INTERVAL seconds
+
+    The web process that queued a job runs it too - this is for picking up
+    jobs whose process went away, or for keeping them off the web servers.
+    """
+    help = 'Run queued and abandoned admin bulk jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forever', action='store_true', help='Keep polling for new jobs until interrupted.')
+
+    def handle(self, *args, **options):
+        while True:
+            finished = bulk_jobs.jobs_finished
+            bulk_jobs.run_pending()
+            if bulk_jobs.jobs_finished > finished:
+                self.stdout.write(f'Finished {bulk_jobs.jobs_finished - finished} jobs')
+            if not options['forever']:
+                break
+            time.sleep(get_config()['POLL_INTERVAL'])
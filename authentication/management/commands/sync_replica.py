@@ -0,0 +1,49 @@
+import sqlite3
+import time
+from contextlib import closing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from authentication.routers import replica_alias
+
+
+class Command(BaseCommand):
+    """
+    Copy the SQLite primary into the SQLite replica - replication for local testing.
+
+    AUTH_DB_REPLICA=replica.sqlite3 python manage.py sync_replica                # once
+    AUTH_DB_REPLICA=replica.sqlite3 python manage.py sync_replica --interval 2   # every 2s, like a lagging replica
+
+    Run the server with the same AUTH_DB_REPLICA. Migrate the primary, then sync
+    before serving, since migrations never run on the replica.
+    """
+    help = 'Copy the SQLite primary database into the SQLite replica (local stand-in for replication).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep copying every INTERVAL seconds until interrupted.',
+        )
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if alias is None:
+            raise CommandError('No replica configured - set AUTH_DB_REPLICA to the replica file.')
+        primary, replica = connections[DEFAULT_DB_ALIAS].settings_dict, connections[alias].settings_dict
+        if primary['ENGINE'] != 'django.db.backends.sqlite3' or replica['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('sync_replica only copies SQLite files - a real replica replicates by itself.')
+
+        while True:
+            started = time.perf_counter()
+            pages = self.copy(primary['NAME'], replica['NAME'])
+            self.stdout.write(f'Copied {pages} pages to {replica["NAME"]} in {time.perf_counter() - started:.3f}s')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, source, target):
+        """Online backup of source into target, returning the page count."""
+        with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target, timeout=30)) as dst:
+            src.backup(dst)
+            return src.execute('PRAGMA page_count').fetchone()[0]
@@ -0,0 +1,360 @@
+"""
+Per-request phase timings and Prometheus histograms.
+
+Code times the interesting parts of a request with `timed()`:
+
+    with timed('session'):
+        login(request, user)
+
+Phases used so far:
+
+    db         every SQL query (all of them, wrapped at the connection)
+    lookup     finding the user for a login (backends.find_user_by_login)
+    hash       waiting for the hasher pool (PBKDF2)
+    session    recording the login (buffered last_login, the session if enabled)
+    tokens     creating and signing JWTs
+    serialize  building the response body from model instances
+    render     turning the response body into JSON
+
+Phases may overlap (lookup is mostly db). ServerTimingMiddleware collects
+whatever ran during a request into the histograms below, which /metrics
+serves in Prometheus' text format, and - only if SERVER_TIMING allows it for
+the caller - into a Server-Timing header, e.g.
+
+    Server-Timing: db;dur=1.9;desc="3 queries", hash;dur=251.3, session;dur=2.2, total;dur=262.0
+
+The header is off by default: per-request timings and query counts tell an
+outsider things like whether the email they tried to log in with exists (an
+unknown email-shaped login takes one more lookup query). /metrics answers
+only scrapers sending AUTH_TOKEN, or everyone with PUBLIC on.
+
+Histograms keep one shard per thread, so observing is a few list increments
+without taking a lock. Shards are summed when /metrics is scraped.
+With several worker processes, set METRICS['MULTIPROCESS_DIR']: every process
+then dumps its histograms there every WRITE_INTERVAL seconds, and /metrics
+merges all the dumps. Files of workers that exited are kept, so counts never go
+backwards - empty the directory on deploy.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DEFAULTS = {
+    'SERVER_TIMING': False,
+    'MULTIPROCESS_DIR': None,
+    'WRITE_INTERVAL': 5.0,
+    'AUTH_TOKEN': None,
+    'PUBLIC': False,
+}
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+# Per-request timings
+
+# {phase: [seconds, calls]} for the request being handled, None outside requests
+_timings = ContextVar('request_timings', default=None)
+
+
+def start_request():
+    """Start collecting timings for a new request; returns the token end_request() needs."""
+    return _timings.set({})
+
+
+def end_request(token):
+    """Stop collecting and return {phase: [seconds, calls]} for the request."""
+    timings = _timings.get()
+    _timings.reset(token)
+    return timings
+
+
+def record(phase, seconds):
+    timings = _timings.get()
+    if timings is not None:
+        entry = timings.get(phase)
+        if entry is None:
+            timings[phase] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to phase (a no-op outside requests)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - started)
+
+
+def time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record('db', time.perf_counter() - started)
+
+
+def instrument_connection(connection):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+@receiver(connection_created, dispatch_uid='metrics_time_queries')
+def instrument_new_connection(sender, connection, **kwargs):
+    instrument_connection(connection)
+
+
+def instrument_connections():
+    # Connections opened before this module was imported never sent connection_created
+    for connection in connections.all(initialized_only=True):
+        instrument_connection(connection)
+
+
+# Histograms
+
+class Histogram:
+    """
+    A Prometheus histogram with labels.
+
+    Each series is [count per bucket..., count above the last bucket, sum],
+    with non-cumulative bucket counts (collect() callers add them up).
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+
+    def _shard(self):
+        try:
+            return self._local.series
+        except AttributeError:
+            series = self._local.series = {}
+            with self._lock:
+                self._shards.append(series)
+            return series
+
+    def observe(self, labels, value):
+        """Record value for the series with these label values (a tuple in labelnames order)."""
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            series = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def collect(self):
+        """{labels: series} summed over all threads."""
+        with self._lock:
+            shards = list(self._shards)
+        return merge_series(dict(shard) for shard in shards)
+
+
+def merge_series(collections):
+    merged = {}
+    for collection in collections:
+        for labels, series in collection.items():
+            total = merged.get(labels)
+            if total is None:
+                merged[labels] = list(series)
+            else:
+                for i, value in enumerate(series):
+                    total[i] += value
+    return merged
+
+
+request_duration = Histogram(
+    'auth_http_request_duration_seconds', 'Time to answer a request.',
+    ('view', 'method', 'status'), LATENCY_BUCKETS,
+)
+phase_duration = Histogram(
+    'auth_request_phase_duration_seconds', 'Time a request spent in one phase (db, hash, session, ...).',
+    ('view', 'phase'), LATENCY_BUCKETS,
+)
+db_queries = Histogram(
+    'auth_http_request_db_queries', 'SQL queries run per request.',
+    ('view',), QUERY_COUNT_BUCKETS,
+)
+
+HISTOGRAMS = (request_duration, phase_duration, db_queries)
+
+
+def observe_request(view, method, status, seconds, timings):
+    request_duration.observe((view, method, str(status)), seconds)
+    for phase, (phase_seconds, calls) in timings.items():
+        phase_duration.observe((view, phase), phase_seconds)
+    db_queries.observe((view,), timings['db'][1] if 'db' in timings else 0)
+    multiprocess.ensure_started()
+
+
+def wants_server_timing(request):
+    """Whether request's response gets a Server-Timing header: SERVER_TIMING True, or 'internal' and an INTERNAL_IPS caller."""
+    mode = get_config()['SERVER_TIMING']
+    if mode == 'internal':
+        return request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+    return bool(mode)
+
+
+def server_timing(timings, total):
+    """The Server-Timing header value for a request's timings (milliseconds)."""
+    parts = []
+    for phase, (seconds, calls) in timings.items():
+        part = f'{phase};dur={seconds * 1000:.1f}'
+        if phase == 'db':
+            part += f';desc="{calls} {"query" if calls == 1 else "queries"}"'
+        parts.append(part)
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+# Multiprocess mode
+
+class MultiprocessStore:
+    """Dumps this process' histograms to MULTIPROCESS_DIR and merges every process' dumps."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+
+    @property
+    def directory(self):
+        return get_config()['MULTIPROCESS_DIR']
+
+    def ensure_started(self):
+        if self._pid == os.getpid() or not self.directory:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='metrics-writer', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(get_config()['WRITE_INTERVAL'])
+            self.write()
+
+    def path(self, pid):
+        return os.path.join(self.directory, f'metrics-{pid}.json')
+
+    def write(self):
+        if self._pid != os.getpid():
+            return
+        data = {
+            histogram.name: [[list(labels), series] for labels, series in histogram.collect().items()]
+            for histogram in HISTOGRAMS
+        }
+        path = self.path(self._pid)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(f'{path}.tmp', path)
+
+    def read_others(self, histogram):
+        """Series of histogram from every other process' last dump."""
+        own = os.path.basename(self.path(os.getpid()))
+        for name in os.listdir(self.directory):
+            if not name.startswith('metrics-') or not name.endswith('.json') or name == own:
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            yield {tuple(labels): series for labels, series in data.get(histogram.name, [])}
+
+
+multiprocess = MultiprocessStore()
+atexit.register(multiprocess.write)
+
+
+# Exposition
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, **extra):
+    pairs = [*zip(names, values), *extra.items()]
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_bound(bound):
+    return repr(float(bound))
+
+
+def collect(histogram):
+    series = histogram.collect()
+    if multiprocess.directory:
+        series = merge_series([series, *multiprocess.read_others(histogram)])
+    return series
+
+
+def _flatten(stats, prefix=''):
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f'{prefix}{name}_')
+        elif isinstance(value, datetime):
+            yield f'{prefix}{name}', value.timestamp()
+        elif isinstance(value, (bool, int, float)):
+            yield f'{prefix}{name}', int(value) if isinstance(value, bool) else value
+
+
+def stats_exposition(components):
+    """
+    {component: stats()} as one gauge family, e.g. auth_component_stat{component="revocations",stat="checks"}.
+
+    These are the scraped process' own numbers, not merged over MULTIPROCESS_DIR.
+    None values (e.g. a hit rate before any lookup) are left out.
+    """
+    name = 'auth_component_stat'
+    lines = [
+        f'# HELP {name} Sizes and counters of the in-process stores and buffers (their stats()).',
+        f'# TYPE {name} gauge',
+    ]
+    for component, stats in components.items():
+        for stat, value in _flatten(stats):
+            lines.append(f'{name}{_labels(("component", "stat"), (component, stat))} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def exposition():
+    """All histograms in Prometheus' text exposition format (version 0.0.4)."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.append(f'# HELP {histogram.name} {histogram.documentation}')
+        lines.append(f'# TYPE {histogram.name} histogram')
+        for labels, series in sorted(collect(histogram).items()):
+            cumulative = 0
+            for bound, count in zip((*histogram.buckets, '+Inf'), series):
+                cumulative += count
+                le = bound if bound == '+Inf' else _format_bound(bound)
+                lines.append(f'{histogram.name}_bucket{_labels(histogram.labelnames, labels, le=le)} {cumulative}')
+            label_text = _labels(histogram.labelnames, labels)
+            lines.append(f'{histogram.name}_sum{label_text} {series[-1]}')
+            lines.append(f'{histogram.name}_count{label_text} {cumulative}')
+    return '\n'.join(lines) + '\n'
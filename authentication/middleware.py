@@ -0,0 +1,200 @@
+"""
+Request middleware for the auth service.
+
+settings.MIDDLEWARE is the full stack the admin needs (sessions, CSRF,
+messages and so on). PrefixMiddleware, partway down it, hands paths listed
+in settings.MIDDLEWARE_PROFILES to a leaner chain of their own instead, so
+the stateless JSON API skips the rest. Probes are answered even earlier, by
+ProbeMiddleware.
+"""
+
+import time
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.urls import NoReverseMatch, resolve, reverse
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+
+@sync_and_async_middleware
+def ServerTimingMiddleware(get_response):
+    """
+    Time every request, feed the /metrics histograms and add a Server-Timing header (if allowed).
+
+    Goes first in MIDDLEWARE so total covers the other middleware too.
+    See metrics.py for the phases.
+    """
+    metrics.instrument_connections()
+
+    def finish(request, response, started, timings):
+        total = time.perf_counter() - started
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match is not None else 'unmatched'
+        metrics.observe_request(view, request.method, response.status_code, total, timings)
+        if metrics.wants_server_timing(request):
+            response['Server-Timing'] = metrics.server_timing(timings, total)
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            started = time.perf_counter()
+            token = metrics.start_request()
+            try:
+                response = await get_response(request)
+            finally:
+                timings = metrics.end_request(token)
+            return finish(request, response, started, timings)
+    else:
+        def middleware(request):
+            started = time.perf_counter()
+            token = metrics.start_request()
+            try:
+                response = get_response(request)
+            finally:
+                timings = metrics.end_request(token)
+            return finish(request, response, started, timings)
+
+    return middleware
+
+
+# Health probes answered without the rest of the stack (URL names, see auth_service/urls.py)
+PROBES = ('root', 'liveness', 'health_check', 'readiness')
+
+
+@sync_and_async_middleware
+def ProbeMiddleware(get_response):
+    """
+    Answer GET/HEAD health probes straight from their views.
+
+    Load balancers hit these every second or so, and they need no CORS, no
+    middleware profile and no URL resolving. resolver_match is still set, so
+    the metrics label them like any other view.
+    """
+    matches = {}
+    for name in PROBES:
+        try:
+            path = reverse(name)
+        except NoReverseMatch:
+            continue
+        matches[path] = resolve(path)
+
+    def probe(request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        match = matches.get(request.path_info)
+        if match is not None:
+            request.resolver_match = match
+        return match
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            match = probe(request)
+            if match is None:
+                return await get_response(request)
+            # The views are sync (readiness queries the database)
+            return await sync_to_async(match.func)(request, *match.args, **match.kwargs)
+    else:
+        def middleware(request):
+            match = probe(request)
+            if match is None:
+                return get_response(request)
+            return match.func(request, *match.args, **match.kwargs)
+
+    return middleware
+
+
+# Middleware profiles
+
+class ProfileHandler(BaseHandler):
+    """One middleware profile, wrapped around the usual URL resolving and view call."""
+
+    def __init__(self, middleware, is_async):
+        self.middleware = list(middleware)
+        self.load_middleware(is_async=is_async)
+
+    def load_middleware(self, is_async=False):
+        """BaseHandler.load_middleware(), for self.middleware instead of settings.MIDDLEWARE."""
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        get_response = self._get_response_async if is_async else self._get_response
+        handler = convert_exception_to_response(get_response)
+        handler_is_async = is_async
+        for middleware_path in reversed(self.middleware):
+            middleware = import_string(middleware_path)
+            middleware_can_sync = getattr(middleware, 'sync_capable', True)
+            middleware_can_async = getattr(middleware, 'async_capable', False)
+            if not middleware_can_sync and not middleware_can_async:
+                raise RuntimeError(
+                    f'Middleware {middleware_path} must have at least one of sync_capable/async_capable set to True.'
+                )
+            elif not handler_is_async and middleware_can_sync:
+                middleware_is_async = False
+            else:
+                middleware_is_async = middleware_can_async
+            try:
+                adapted_handler = self.adapt_method_mode(
+                    middleware_is_async, handler, handler_is_async,
+                    debug=settings.DEBUG, name=f'middleware {middleware_path}',
+                )
+                mw_instance = middleware(adapted_handler)
+            except MiddlewareNotUsed:
+                continue
+            handler = adapted_handler
+            if mw_instance is None:
+                raise ImproperlyConfigured(f'Middleware factory {middleware_path} returned None.')
+
+            if hasattr(mw_instance, 'process_view'):
+                self._view_middleware.insert(0, self.adapt_method_mode(is_async, mw_instance.process_view))
+            if hasattr(mw_instance, 'process_template_response'):
+                self._template_response_middleware.append(
+                    self.adapt_method_mode(is_async, mw_instance.process_template_response)
+                )
+            if hasattr(mw_instance, 'process_exception'):
+                # Always called synchronously, like Django's own
+                self._exception_middleware.append(self.adapt_method_mode(False, mw_instance.process_exception))
+
+            handler = convert_exception_to_response(mw_instance)
+            handler_is_async = middleware_is_async
+
+        self._middleware_chain = self.adapt_method_mode(is_async, handler, handler_is_async)
+
+
+def get_profiles():
+    """[(prefix, middleware list)], longest prefix first."""
+    return sorted(settings.MIDDLEWARE_PROFILES.items(), key=lambda item: len(item[0]), reverse=True)
+
+
+@sync_and_async_middleware
+def PrefixMiddleware(get_response):
+    """
+    Run the middleware of the first MIDDLEWARE_PROFILES prefix request.path_info starts with.
+
+    Every profile is a complete chain down to the view (process_view hooks
+    included, e.g. CSRF), so get_response isn't used for those. Paths no prefix
+    matches carry on down settings.MIDDLEWARE, like any Django request.
+    """
+    is_async = iscoroutinefunction(get_response)
+    chains = [(prefix, ProfileHandler(middleware, is_async)._middleware_chain) for prefix, middleware in get_profiles()]
+
+    def chain_for(path):
+        for prefix, chain in chains:
+            if path.startswith(prefix):
+                return chain
+        return get_response
+
+    if is_async:
+        async def middleware(request):
+            return await chain_for(request.path_info)(request)
+    else:
+        def middleware(request):
+            return chain_for(request.path_info)(request)
+
+    return middleware
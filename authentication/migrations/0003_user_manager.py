@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:12
+
+import authentication.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_lower_login_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', authentication.models.UserManager()),
+            ],
+        ),
+    ]
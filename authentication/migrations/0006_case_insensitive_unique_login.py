@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:56
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_for_duplicates(apps, schema_editor):
+    """Fail with a readable list instead of an IntegrityError if existing users clash by case."""
+    User = apps.get_model('authentication', 'User')
+    clashes = []
+    for field in ('username', 'email'):
+        duplicates = (
+            User.objects.using(schema_editor.connection.alias)
+            .values(lowered=Lower(field))
+            .annotate(count=Count('pk'))
+            .filter(count__gt=1)
+            .values_list('lowered', flat=True)
+        )
+        clashes += [f'{field} {value!r}' for value in duplicates[:20]]
+    if clashes:
+        raise RuntimeError(
+            'Usernames/emails must be unique regardless of case before this migration, '
+            'rename or merge these users first: ' + ', '.join(clashes)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('authentication', '0005_revoked_token'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_for_duplicates, migrations.RunPython.noop),
+        # The unique constraints' indexes take over the login lookups, so add them first
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('username'), name='auth_user_username_lower_uniq', violation_error_message='A user with this username already exists.'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='auth_user_email_lower_uniq', violation_error_message='A user with this email already exists.'),
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='auth_user_username_lower_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='auth_user_email_lower_idx',
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0006_case_insensitive_unique_login'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.CharField(max_length=254, unique=True)),
+                ('user_id', models.BigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Email claim',
+                'verbose_name_plural': 'Email claims',
+                'db_table': 'auth_user_email_claim',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0011_bulk_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('login', 'Login'), ('login_failed', 'Failed login'), ('register', 'Registration'), ('password_change', 'Password change'), ('logout', 'Logout'), ('logout_all', 'Logout everywhere'), ('refresh', 'Token refresh'), ('refresh_reuse', 'Refresh token reuse')], max_length=20)),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('login', models.CharField(blank=True, max_length=254)),
+                ('ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('user_agent', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Auth event',
+                'verbose_name_plural': 'Auth events',
+                'indexes': [models.Index(fields=['user_id', '-created_at'], name='auth_event_user_idx'), models.Index(fields=['-created_at'], name='auth_event_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0012_auth_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityFilter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('capacity', models.BigIntegerField()),
+                ('error_rate', models.FloatField()),
+                ('count', models.BigIntegerField()),
+                ('bits', models.BinaryField()),
+                ('cursors', models.JSONField(default=dict)),
+                ('built_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Availability filter',
+                'verbose_name_plural': 'Availability filters',
+            },
+        ),
+    ]
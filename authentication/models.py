@@ -1,7 +1,38 @@
-from django.contrib.auth.models import AbstractUser
+from django.conf import settings
+from django.contrib.auth.models import AbstractUser, UserManager as DjangoUserManager
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.core.validators import EmailValidator
 
+from . import families, hashing
+from .cache import user_cache
+from .sharding import claimed_email
+
+
+class UserManager(DjangoUserManager):
+    """
+    Default user manager, except passwords are hashed on the hasher pool.
+
+    Django's create_user() calls make_password() directly, so we route it through
+    User.set_password() instead (see hashing.py).
+    """
+
+    def _create_user_object(self, username, email, password, **extra_fields):
+        user = super()._create_user_object(username, email, None, **extra_fields)
+        user.set_password(password)
+        return user
+
+    async def acreate_user(self, username, email=None, password=None, **extra_fields):
+        """Async create_user() that awaits the hasher pool instead of blocking the event loop."""
+        extra_fields.setdefault('is_staff', False)
+        extra_fields.setdefault('is_superuser', False)
+        user = super()._create_user_object(username, email, None, **extra_fields)
+        await user.aset_password(password)
+        await user.asave(using=self._db)
+        return user
+
+
 
 class User(AbstractUser):
     """
@@ -43,6 +74,14 @@ class User(AbstractUser):
     # Email verification (for future implementation)
     email_verified = models.BooleanField(default=False)
     
+    # The user's token epoch. Stamped into every JWT (see tokens.py) and compared on
+    # every authenticated request and refresh, so bumping it invalidates all tokens
+    # issued before the bump. Goes up when the password changes, the account gets
+    # deactivated or the user logs out everywhere (revoke_tokens()).
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+    
+    objects = UserManager()
+
     # Keep the default username field as the primary identifier
     # But we'll create a custom authentication backend to allow email login
     USERNAME_FIELD = 'username'  # This is what Django uses for login by default
@@ -52,10 +91,73 @@ class User(AbstractUser):
         db_table = 'auth_user'  # Keep same table name for consistency
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        # Usernames and emails are unique regardless of case. Registration relies on
+        # these instead of checking first (one INSERT, no race, see serializers.py),
+        # and their indexes turn every case-insensitive login lookup, which compares
+        # LOWER(column) against LOWER(input), into a single index probe (see backends.py).
+        constraints = [
+            models.UniqueConstraint(
+                Lower('username'),
+                name='auth_user_username_lower_uniq',
+                violation_error_message="A user with this username already exists.",
+            ),
+            models.UniqueConstraint(
+                Lower('email'),
+                name='auth_user_email_lower_uniq',
+                violation_error_message="A user with this email already exists.",
+            ),
+        ]
+        # The admin's user list (see changelist.py): newest first, the active filter, and the
+        # handful of staff. Ties on date_joined are broken by id, which keyset paging relies on.
+        indexes = [
+            models.Index(fields=['-date_joined', '-id'], name='auth_user_joined_idx'),
+            models.Index(fields=['is_active', '-date_joined', '-id'], name='auth_user_active_joined_idx'),
+            models.Index(fields=['-date_joined'], name='auth_user_staff_joined_idx', condition=models.Q(is_staff=True)),
+        ]
     
     def __str__(self):
         return f"{self.username} ({self.email})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded is_active so save() can tell when it flips off,
+        # and the email so a sharded save() can move its claim (see sharding.py)
+        instance._loaded_is_active = instance.__dict__.get('is_active')
+        instance._loaded_email = instance.__dict__.get('email')
+        return instance
+    
+    def tokens_need_revoking(self):
+        """Whether unsaved changes should invalidate this user's existing tokens."""
+        if self._state.adding:
+            return False
+        # set_password() leaves the raw password in _password until the next save
+        if self._password is not None:
+            return True
+        return getattr(self, '_loaded_is_active', None) is True and not self.is_active
+    
+    def revoke_tokens(self):
+        """Invalidate every access and refresh token issued to this user so far."""
+        # One atomic UPDATE, so concurrent revocations can't lose a bump
+        # (on the database this user was written to, whatever the router thinks of "User")
+        users = type(self)._default_manager.db_manager(hints={'instance': self})
+        users.filter(pk=self.pk).update(token_version=F('token_version') + 1)
+        self.refresh_from_db(fields=['token_version'])
+        user_cache.invalidate(self.pk)
+        # Their refresh tokens are dead now, no need to keep the sessions around
+        families.end_all(self)
+    
+    def save(self, *args, **kwargs):
+        if self.tokens_need_revoking():
+            self.token_version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'token_version'}
+        with claimed_email(self, kwargs.get('update_fields')):
+            super().save(*args, **kwargs)
+        self._loaded_is_active = self.is_active
+        self._loaded_email = self.__dict__.get('email')
+    
     def get_full_name(self):
         """Return the first_name plus the last_name, with a space in between."""
         full_name = f'{self.first_name} {self.last_name}'
@@ -65,7 +167,246 @@ class User(AbstractUser):
         """Return the short name for the user (first name)."""
         return self.first_name
     
+    def set_password(self, raw_password):
+        """Hash the password on the hasher pool instead of the request thread."""
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """
+        Verify the password on the hasher pool.
+
+        Same behaviour as Django's version, including upgrading the stored hash
+        when the hasher settings changed.
+        """
+        def setter(raw_password):
+            self.set_password(raw_password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            self.save(update_fields=['password'])
+
+        return hashing.check_password(raw_password, self.password, setter)
+
+    async def aset_password(self, raw_password):
+        """Async set_password()."""
+        self.password = await hashing.amake_password(raw_password)
+        self._password = raw_password
+
+    async def acheck_password(self, raw_password):
+        """Async check_password()."""
+        async def setter(raw_password):
+            await self.aset_password(raw_password)
+            self._password = None
+            await self.asave(update_fields=['password'])
+
+        return await hashing.acheck_password(raw_password, self.password, setter)
+
     @property
     def is_email_verified(self):
         """Check if user's email is verified."""
         return self.email_verified
+
+
+class RevokedToken(models.Model):
+    """
+    A revoked access or refresh token, by jti.
+    
+    Written in batches by the revocation store (see revocation.py), which keeps a
+    Bloom filter of these in memory so checking a token that was never revoked
+    doesn't touch this table. Rows are only needed until the token would have
+    expired anyway, after that `manage.py purge_expired` deletes them.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)  # Syncs re-read the last SYNC_OVERLAP seconds
+    
+    class Meta:
+        verbose_name = 'Revoked token'
+        verbose_name_plural = 'Revoked tokens'
+    
+    def __str__(self):
+        return self.jti
+
+
+class EmailClaim(models.Model):
+    """
+    Who has an email address, when users are sharded.
+
+    Lives on the shard the email hashes to, not necessarily the user's, so the
+    unique constraint on email holds across all shards (see sharding.py).
+    Unused without sharding - auth_user's own constraint does the job then.
+    """
+    email = models.CharField(max_length=254, unique=True)  # lowercased
+    user_id = models.BigIntegerField()
+
+    class Meta:
+        db_table = 'auth_user_email_claim'  # Shows up in IntegrityErrors as auth_user_email_claim.email
+        verbose_name = 'Email claim'
+        verbose_name_plural = 'Email claims'
+
+    def __str__(self):
+        return self.email
+
+
+class TokenFamily(models.Model):
+    """
+    One login session: the chain of refresh tokens rotated out of one login.
+    
+    Only the newest refresh token of a family can be used, and a refresh just
+    moves generation on (see families.py). So this table grows with sessions,
+    not with refreshes.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='token_families')
+    generation = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        verbose_name = 'Token family'
+        verbose_name_plural = 'Token families'
+    
+    def __str__(self):
+        return f'{self.pk} (generation {self.generation})'
+
+
+class PurgeCheckpoint(models.Model):
+    """
+    How far the last purge of one table on one database got (see purge.py).
+
+    position is the expiry value the purge had reached, None once a pass
+    finished. deleted counts rows over all runs.
+    """
+    name = models.CharField(max_length=100, unique=True)  # "<target>:<database>"
+    position = models.DateTimeField(null=True, blank=True)
+    deleted = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Purge checkpoint'
+        verbose_name_plural = 'Purge checkpoints'
+    
+    def __str__(self):
+        return self.name
+
+
+class AvailabilityFilter(models.Model):
+    """
+    The availability index's Bloom filter of taken usernames and emails (see availability.py).
+
+    Built by `manage.py rebuild_availability`, so the table is read once per
+    rebuild instead of once per server process. cursors is the highest user id
+    read on each user database, built_at when the reading started - processes
+    that load the filter pick up everything after that themselves.
+    """
+    capacity = models.BigIntegerField()
+    error_rate = models.FloatField()
+    count = models.BigIntegerField()
+    bits = models.BinaryField()
+    cursors = models.JSONField(default=dict)
+    built_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Availability filter'
+        verbose_name_plural = 'Availability filters'
+    
+    def __str__(self):
+        return f'{self.count} names, built {self.built_at:%Y-%m-%d %H:%M:%S}'
+
+
+class BulkJob(models.Model):
+    """
+    An admin bulk action on users, run in chunks in the background (see bulk_actions.py).
+    
+    selection is which users (ids, or the list's filters and search - JSON, see
+    bulk_actions.py), cursor the last user id done - a job that stopped halfway
+    carries on from there.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+    
+    action = models.CharField(max_length=50)
+    selection = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    total = models.BigIntegerField(null=True, blank=True)  # Users selected, counted when the job starts
+    processed = models.BigIntegerField(default=0)
+    changed = models.BigIntegerField(default=0)
+    cursor = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Bulk job'
+        verbose_name_plural = 'Bulk jobs'
+    
+    def __str__(self):
+        return f'{self.action} #{self.pk}'
+    
+    @property
+    def progress(self):
+        """Share of the selection done, None until it's counted."""
+        if self.status == self.DONE:
+            return 1.0
+        if not self.total:
+            return None
+        return min(self.processed / self.total, 1.0)
+
+
+class AuthEvent(models.Model):
+    """
+    One entry of the authentication audit trail - append-only (see audit.py).
+    
+    Written in batches by the audit buffer, on the user's shard. user_id is a
+    plain column, not a foreign key, so events outlive their user and writing
+    them never touches auth_user.
+    """
+    LOGIN = 'login'
+    LOGIN_FAILED = 'login_failed'
+    REGISTER = 'register'
+    PASSWORD_CHANGE = 'password_change'
+    LOGOUT = 'logout'
+    LOGOUT_ALL = 'logout_all'
+    REFRESH = 'refresh'
+    REFRESH_REUSE = 'refresh_reuse'
+    KIND_CHOICES = [
+        (LOGIN, 'Login'),
+        (LOGIN_FAILED, 'Failed login'),
+        (REGISTER, 'Registration'),
+        (PASSWORD_CHANGE, 'Password change'),
+        (LOGOUT, 'Logout'),
+        (LOGOUT_ALL, 'Logout everywhere'),
+        (REFRESH, 'Token refresh'),
+        (REFRESH_REUSE, 'Refresh token reuse'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    login = models.CharField(max_length=254, blank=True)  # What a failed login tried
+    ip = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField()  # When it happened, not when it was written
+    
+    class Meta:
+        verbose_name = 'Auth event'
+        verbose_name_plural = 'Auth events'
+        indexes = [
+            # A user's events in a time range, and everyone's
+            models.Index(fields=['user_id', '-created_at'], name='auth_event_user_idx'),
+            models.Index(fields=['-created_at'], name='auth_event_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.kind} ({self.user_id or self.login})'
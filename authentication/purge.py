@@ -0,0 +1,143 @@
+"""
+Deleting expired rows: revoked tokens, token families and sessions.
+
+Nothing needs these rows once they've expired, but nothing removed them
+either, so the tables only grew. purge() deletes them the way a busy database can live with:
+
+- In batches of BATCH_SIZE, walking the expiry index: each batch reads the
+  next BATCH_SIZE primary keys in expiry order and deletes exactly those, so
+  no statement scans the table and every write lock is held for one small
+  DELETE only.
+- SLEEP seconds between batches (plus whatever it takes to stay under
+  MAX_RATE rows per second) so other writers get the lock in between.
+- The expiry value reached is saved in a PurgeCheckpoint row after every
+  batch. An interrupted run (Ctrl-C, a deploy, --max-seconds) carries on
+  from there instead of walking dead index entries again, which on Postgres
+  stay in the index until vacuum. A pass that reaches the end clears it.
+
+Token families are purged on every user shard (see sharding.py), everything
+else lives on 'default'. Run it from cron or a scheduler with
+`manage.py purge_expired`.
+"""
+
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .sharding import user_databases
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 1000,
+    'SLEEP': 0.05,
+    'MAX_RATE': None,
+}
+
+# name: (model, expiry field, whether it lives on every user shard)
+TARGETS = {
+    'revoked_tokens': ('authentication.RevokedToken', 'expires_at', False),
+    'token_families': ('authentication.TokenFamily', 'expires_at', True),
+    'sessions': ('sessions.Session', 'expire_date', False),
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'PURGE', {})}
+
+
+def _databases(sharded):
+    if not sharded:
+        return [DEFAULT_DB_ALIAS]
+    return [using or DEFAULT_DB_ALIAS for using in user_databases()]
+
+
+def _checkpoint(name, using):
+    from .models import PurgeCheckpoint
+    checkpoint, _ = PurgeCheckpoint.objects.using(DEFAULT_DB_ALIAS).get_or_create(name=f'{name}:{using}')
+    return checkpoint
+
+
+def purge_table(name, using=DEFAULT_DB_ALIAS, batch_size=None, sleep=None, max_rate=None,
+                deadline=None, restart=False):
+    """
+    Delete one target's expired rows on one database, in batches.
+
+    Stops early at deadline (a time.monotonic() value), leaving the checkpoint
+    for the next run. Returns what it did, rows per second included.
+    """
+    config = get_config()
+    batch_size = batch_size or config['BATCH_SIZE']
+    sleep = config['SLEEP'] if sleep is None else sleep
+    max_rate = config['MAX_RATE'] if max_rate is None else max_rate
+
+    label, field, _ = TARGETS[name]
+    model = apps.get_model(label)
+    checkpoint = _checkpoint(name, using)
+    if restart:
+        checkpoint.position = None
+
+    expired = model._default_manager.using(using).filter(**{f'{field}__lte': timezone.now()}).order_by(field)
+    deleted = batches = 0
+    complete = False
+    started = time.monotonic()
+    while True:
+        batch = expired
+        if checkpoint.position is not None:
+            batch = batch.filter(**{f'{field}__gte': checkpoint.position})
+        rows = list(batch.values_list('pk', field)[:batch_size])
+        if not rows:
+            complete = True
+            break
+        # Expiry order keeps us on the index; the DELETE itself is by primary key
+        count, _ = model._default_manager.using(using).filter(pk__in=[pk for pk, _ in rows]).delete()
+        deleted += count
+        batches += 1
+        checkpoint.position = rows[-1][1]
+        checkpoint.deleted += count
+        checkpoint.save(update_fields=['position', 'deleted', 'updated_at'])
+
+        pause = sleep
+        if max_rate:
+            pause = max(pause, deleted / max_rate - (time.monotonic() - started))
+        if deadline is not None and time.monotonic() + pause >= deadline:
+            break
+        time.sleep(pause)
+
+    if complete:
+        checkpoint.position = None
+        checkpoint.save(update_fields=['position', 'updated_at'])
+    seconds = time.monotonic() - started
+    result = {
+        'target': name,
+        'database': using,
+        'deleted': deleted,
+        'batches': batches,
+        'seconds': seconds,
+        'rows_per_second': deleted / seconds if seconds else 0.0,
+        'complete': complete,
+    }
+    logger.info(
+        'Purged %s expired %s on %s in %.1fs (%.0f rows/s)%s',
+        deleted, name, using, seconds, result['rows_per_second'], '' if complete else ', stopped at checkpoint',
+    )
+    return result
+
+
+def purge(names=None, max_seconds=None, **options):
+    """
+    purge_table() every target in names (default: all) on each of its
+    databases, sharing one max_seconds budget. Returns the per-table results.
+    """
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    results = []
+    for name in names or TARGETS:
+        for using in _databases(TARGETS[name][2]):
+            if deadline is not None and time.monotonic() >= deadline:
+                return results
+            results.append(purge_table(name, using, deadline=deadline, **options))
+    return results
@@ -0,0 +1,57 @@
+"""
+JSON rendering for API responses.
+
+JSONRenderer is DRF's, timed as the request's render phase (see metrics.py).
+FastJSONRenderer produces the same bytes with orjson (in requirements.txt),
+several times faster, and falls back to DRF's encoder where orjson isn't
+installed. The async views render through render_json() so they
+answer exactly like the DRF views.
+"""
+
+from rest_framework import renderers
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .metrics import timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Datetimes go through DRF's encoder so they come out in its format
+ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+_default = JSONEncoder().default
+
+
+def render_json(data):
+    """data as compact UTF-8 JSON, byte for byte what DRF's JSONRenderer writes."""
+    if orjson is None or not api_settings.COMPACT_JSON or not api_settings.UNICODE_JSON:
+        return renderers.JSONRenderer().render(data)
+    ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+    # DRF escapes these two for JavaScript's sake, orjson doesn't
+    if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+        ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return ret
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """DRF's JSONRenderer, timed as the request's render phase (see metrics.py)."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer on orjson, when it's installed."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Indented output (browsable API, "; indent=4") is for humans, DRF can do that
+        if orjson is None or self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        with timed('render'):
+            return render_json(data)
@@ -0,0 +1,322 @@
+"""
+Token revocation store, keyed by jti.
+
+Replaces SimpleJWT's blacklist app (which was never installed here, so
+rotation and logout didn't actually revoke anything). The blacklist would
+have cost an INSERT per refresh and a JOIN against an ever-growing
+OutstandingToken table on every check. Instead:
+
+- Revoked jtis live in the RevokedToken table, written in batches by a
+  background thread (every FLUSH_INTERVAL seconds or BATCH_SIZE revocations).
+- Every process keeps a Bloom filter of all unexpired revoked jtis. A token
+  that was never revoked (i.e. nearly all of them) misses the filter and is
+  answered from memory. Only filter hits (revoked tokens plus ERROR_RATE false
+  positives) are confirmed with a primary-key-sized lookup on the jti index,
+  so checks cost the same no matter how big the table gets.
+- The filter is warmed up from the table when a process first uses the
+  store. Until that finishes, checks go straight to the database.
+- Every SYNC_INTERVAL seconds each process pulls the rows other processes
+  added since its last sync: everything past the highest primary key it has
+  seen, plus everything revoked within SYNC_OVERLAP seconds before its last
+  sync. Primary keys are handed out before commit, so a flush that commits
+  late can land below rows already synced - the overlap picks those up.
+- Every REBUILD_INTERVAL seconds the filter is rebuilt from the unexpired
+  rows, sized for their current count, so expired jtis drop out of it.
+  Deleting expired rows is left to `manage.py purge_expired` (purge.py).
+
+A revocation made in one process reaches the others within FLUSH_INTERVAL +
+SYNC_INTERVAL seconds, as long as flushes commit (and replicas catch up, and
+server clocks agree) within SYNC_OVERLAP. Local revocations are visible
+immediately.
+
+With a read replica (see routers.py) checks, syncs and rebuilds read from the
+replica, so other processes also wait for the replica to catch up. This
+process keeps its own flushed revocations in memory for READ_YOUR_WRITES
+seconds, until the replica has them.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone as django_timezone
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .bloom import BloomFilter
+from .routers import get_config as get_replica_config
+from .routers import read_replica, replica_alias
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CAPACITY': 1_000_000,
+    'ERROR_RATE': 0.001,
+    'BATCH_SIZE': 1000,
+    'FLUSH_INTERVAL': 1.0,
+    'SYNC_INTERVAL': 5.0,
+    'SYNC_OVERLAP': 60.0,
+    'REBUILD_INTERVAL': 3600.0,
+    'BACKGROUND': True,
+}
+
+
+def _revoked_token_model():
+    from .models import RevokedToken
+    return RevokedToken
+
+
+def _expiry(exp):
+    """A token's exp claim (unix time) as an aware datetime."""
+    return datetime.fromtimestamp(exp, tz=timezone.utc)
+
+
+class RevocationStore:
+    """
+    Bloom-filter-fronted revocation set with batched persistence.
+
+    Like the hasher pool, the filter and the background thread are created
+    lazily and again after a fork, so importing this in a preforking server is fine.
+    Without BACKGROUND there's no thread and no filter: revocations wait for
+    flush() and every check that memory can't answer goes to the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._pid = None
+        self._wakeup = None
+        self._thread = None
+        self._bloom = None
+        self._ready = False
+        self._pending = {}
+        self._flushed = {}
+        self._rebuild_log = None
+        self._cursor = 0
+        self._synced_at = None
+        self.checks = 0
+        self.filter_misses = 0
+        self.db_checks = 0
+        self.revoked = 0
+
+    @property
+    def config(self):
+        return {**DEFAULTS, **getattr(settings, 'REVOCATION_STORE', {})}
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._bloom = None
+            self._ready = False
+            self._pending = {}
+            self._flushed = {}
+            self._rebuild_log = None
+            self._cursor = 0
+            self._synced_at = None
+            self._wakeup = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='revocation-store', daemon=True)
+            self._pid = os.getpid()
+            if self.config['BACKGROUND']:
+                self._thread.start()
+
+    # Request side
+
+    def revoke(self, jti, expires_at):
+        """Revoke jti until expires_at. Never blocks on the database."""
+        self._ensure_started()
+        with self._lock:
+            self._pending[jti] = expires_at
+            if self._bloom is not None:
+                self._bloom.add(jti)
+            if self._rebuild_log is not None:
+                self._rebuild_log.append(jti)
+            self.revoked += 1
+            flush_now = len(self._pending) >= self.config['BATCH_SIZE']
+        if flush_now:
+            self._wakeup.set()
+
+    def revoke_token(self, token):
+        """Revoke a SimpleJWT token until it expires."""
+        self.revoke(token[jwt_settings.JTI_CLAIM], _expiry(token['exp']))
+
+    def _check_memory(self, jti):
+        """True/False when memory can answer for jti, None when the database has to."""
+        self._ensure_started()
+        self.checks += 1
+        if jti in self._pending or jti in self._flushed:
+            return True
+        if self._ready and jti not in self._bloom:
+            self.filter_misses += 1
+            return False
+        self.db_checks += 1
+        return None
+
+    def is_revoked(self, jti):
+        revoked = self._check_memory(jti)
+        if revoked is None:
+            revoked = read_replica(_revoked_token_model()).filter(jti=jti).exists()
+        return revoked
+
+    async def ais_revoked(self, jti):
+        """Async is_revoked()."""
+        revoked = self._check_memory(jti)
+        if revoked is None:
+            revoked = await read_replica(_revoked_token_model()).filter(jti=jti).aexists()
+        return revoked
+
+    def revoked_subset(self, jtis):
+        """
+        The jtis in jtis that are revoked.
+
+        Like is_revoked() for each of them, except that everything memory can't
+        answer is looked up with one query.
+        """
+        revoked, unsure = set(), []
+        for jti in set(jtis):
+            answer = self._check_memory(jti)
+            if answer is None:
+                unsure.append(jti)
+            elif answer:
+                revoked.add(jti)
+        if unsure:
+            revoked.update(
+                read_replica(_revoked_token_model()).filter(jti__in=unsure).values_list('jti', flat=True)
+            )
+        return revoked
+
+    # Background side
+
+    def _run(self):
+        config = self.config
+        now = time.monotonic()
+        next_sync = now + config['SYNC_INTERVAL']
+        next_rebuild = now + config['REBUILD_INTERVAL']
+
+        self._guarded(self.rebuild)
+        while True:
+            self._wakeup.wait(config['FLUSH_INTERVAL'])
+            self._wakeup.clear()
+            self._guarded(self.flush)
+
+            now = time.monotonic()
+            if now >= next_rebuild:
+                self._guarded(self.rebuild)
+                next_rebuild = now + config['REBUILD_INTERVAL']
+                next_sync = now + config['SYNC_INTERVAL']
+            elif now >= next_sync:
+                # Keep retrying the warm-up if it failed (e.g. table not migrated yet)
+                self._guarded(self.sync if self._ready else self.rebuild)
+                next_sync = now + config['SYNC_INTERVAL']
+
+    def _guarded(self, step):
+        try:
+            close_old_connections()
+            step()
+        except Exception:
+            # Keep going - pending revocations stay queued and get retried
+            logger.exception('Revocation store: %s failed', step.__name__)
+
+    def flush(self):
+        """Write pending revocations to the database in one batch."""
+        now = time.monotonic()
+        with self._lock:
+            pending = dict(self._pending)
+            for jti in [jti for jti, until in self._flushed.items() if until < now]:
+                del self._flushed[jti]
+        if not pending:
+            return
+        RevokedToken = _revoked_token_model()
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti=jti, expires_at=expires_at) for jti, expires_at in pending.items()],
+            batch_size=self.config['BATCH_SIZE'],
+            ignore_conflicts=True,
+        )
+        # Only forget them once they're in the table, so checks never miss them in between -
+        # and, with a replica, once the replica should have them too
+        keep_until = time.monotonic() + get_replica_config()['READ_YOUR_WRITES'] if replica_alias() else None
+        with self._lock:
+            for jti in pending:
+                self._pending.pop(jti, None)
+                if keep_until is not None:
+                    self._flushed[jti] = keep_until
+
+    def sync(self):
+        """Add revocations other processes persisted since the last sync to the filter."""
+        started = django_timezone.now()
+        since = self._synced_at - timedelta(seconds=self.config['SYNC_OVERLAP'])
+        rows = (
+            read_replica(_revoked_token_model())
+            .filter(Q(pk__gt=self._cursor) | Q(revoked_at__gte=since), expires_at__gt=started)
+            .order_by('pk')
+            .values_list('pk', 'jti')
+        )
+        for pk, jti in rows.iterator(chunk_size=self.config['BATCH_SIZE']):
+            with self._lock:
+                self._bloom.add(jti)
+            self._cursor = max(self._cursor, pk)
+        self._synced_at = started
+
+    def rebuild(self):
+        """Build a fresh filter from the unexpired rows and swap it in."""
+        self._ensure_started()
+        with self._rebuild_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        config = self.config
+        started = django_timezone.now()
+        queryset = read_replica(_revoked_token_model()).filter(expires_at__gt=started)
+        with self._lock:
+            self._rebuild_log = []
+        try:
+            bloom = BloomFilter(max(config['CAPACITY'], 2 * queryset.count()), config['ERROR_RATE'])
+            cursor = self._cursor
+            for pk, jti in queryset.order_by('pk').values_list('pk', 'jti').iterator(chunk_size=config['BATCH_SIZE']):
+                bloom.add(jti)
+                cursor = max(cursor, pk)
+            with self._lock:
+                # Revocations that came in while we were reading the table
+                bloom.update(self._rebuild_log)
+                bloom.update(self._pending)
+                self._bloom = bloom
+                self._cursor = cursor
+                self._synced_at = started
+                self._ready = True
+        finally:
+            with self._lock:
+                self._rebuild_log = None
+
+    def shutdown(self):
+        """Flush whatever is still pending (called at exit)."""
+        if self._pid == os.getpid() and self._pending:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Revocation store: could not flush %d revocations at exit', len(self._pending))
+
+    def stats(self):
+        bloom = self._bloom
+        return {
+            'ready': self._ready,
+            'filter_entries': len(bloom) if bloom is not None else 0,
+            'filter_capacity': bloom.capacity if bloom is not None else 0,
+            'filter_bytes': bloom.size_bytes if bloom is not None else 0,
+            'pending': len(self._pending),
+            'flushed_in_memory': len(self._flushed),
+            'revoked': self.revoked,
+            'checks': self.checks,
+            'filter_misses': self.filter_misses,
+            'db_checks': self.db_checks,
+        }
+
+
+revocations = RevocationStore()
+atexit.register(revocations.shutdown)
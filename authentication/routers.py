@@ -0,0 +1,119 @@
+"""
+Primary/replica database routing.
+
+With a 'replica' database configured (see DATABASES in settings.py), reads
+that can live with a little replication lag go to the replica:
+
+- user_cache loads (the backend's get_user(), StatelessJWTAuthentication,
+  profile reads, introspection)
+- revocation checks and the revocation store's background reads
+
+Everything else - all writes, logins, registration, the admin - stays on the
+primary. Reads opt in with read_replica(Model) instead of the router guessing
+from the model, so a new query never lands on the replica by accident.
+
+Read-your-writes: whenever a user is written, user_cache.invalidate() calls
+pin_to_primary(), and that user's reads go to the primary for the next
+READ_YOUR_WRITES seconds - long enough for the replica to catch up. The pins
+live in the shared Django cache, so with a shared cache backend they hold
+across processes too. READ_YOUR_WRITES has to stay above the replica's lag.
+
+Without a replica nothing changes: the router has no opinion and all reads
+go to 'default'.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+DEFAULTS = {
+    'ALIAS': 'replica',
+    'READ_YOUR_WRITES': 10,
+    'CACHE': 'default',
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'DATABASE_REPLICA', {})}
+
+
+def replica_alias():
+    """The replica's DATABASES alias, or None if there's no replica."""
+    alias = get_config()['ALIAS']
+    return alias if alias in settings.DATABASES else None
+
+
+def read_replica(model):
+    """model's default manager, reading from the replica if there is one."""
+    return model._default_manager.db_manager(hints={'replica': True})
+
+
+# Read-your-writes
+
+def _pin_key(user_id):
+    return f'primary:{user_id}'
+
+
+def pin_to_primary(*user_ids):
+    """Read these users from the primary for the next READ_YOUR_WRITES seconds."""
+    if not user_ids or replica_alias() is None:
+        return
+    config = get_config()
+    caches[config['CACHE']].set_many({_pin_key(user_id): True for user_id in user_ids}, config['READ_YOUR_WRITES'])
+
+
+def is_pinned(*user_ids):
+    """Whether any of these users was written in the last READ_YOUR_WRITES seconds."""
+    if replica_alias() is None:
+        return False
+    return bool(caches[get_config()['CACHE']].get_many([_pin_key(user_id) for user_id in user_ids]))
+
+
+async def ais_pinned(*user_ids):
+    """Async is_pinned()."""
+    if replica_alias() is None:
+        return False
+    return bool(await caches[get_config()['CACHE']].aget_many([_pin_key(user_id) for user_id in user_ids]))
+
+
+def read_user(model, *user_ids):
+    """read_replica(model), or the primary if one of user_ids was just written."""
+    return model._default_manager if is_pinned(*user_ids) else read_replica(model)
+
+
+async def aread_user(model, *user_ids):
+    """Async read_user()."""
+    return model._default_manager if await ais_pinned(*user_ids) else read_replica(model)
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes and ordinary reads on 'default', read_replica() reads on the replica.
+
+    Migrations only run on the primary - the replica gets the schema through
+    replication (or manage.py sync_replica for the SQLite stand-in).
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if alias is None:
+            return None
+        # Explicit, so rows loaded from the replica don't drag related reads there
+        # (Django would otherwise read from wherever hints['instance'] came from)
+        return alias if hints.get('replica') else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS if replica_alias() is not None else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same data on both sides
+        alias = replica_alias()
+        if alias is not None and {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, alias}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        alias = replica_alias()
+        if alias is not None and db == alias:
+            return False
+        return None
@@ -1,11 +1,79 @@
-from rest_framework import serializers
-from django.contrib.auth import get_user_model, authenticate
+import re
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from functools import cache
+from inspect import isfunction
+from operator import attrgetter, methodcaller
+
+from asgiref.sync import sync_to_async
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import empty
+from rest_framework.settings import api_settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from django.conf import settings
+from django.contrib.auth import get_user_model, authenticate, aauthenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+
+from . import audit, families
+from .authentication import check_token_state
+from .cache import user_cache
+from .introspection import get_config as get_introspection_config, introspect
+from .last_login import last_logins
+from .models import AuthEvent
+from .sharding import email_owners, login_db
+from .tokens import RefreshToken, UntypedToken, is_current
 
 User = get_user_model()
 
+UNIQUE_ERRORS = {
+    'username': "A user with this username already exists.",
+    'email': "A user with this email already exists.",
+}
+
+# Names the unique constraints on auth_user show up as in IntegrityError messages:
+# auth_user_username_lower_uniq / auth_user_email_key (constraints) or auth_user.username (SQLite columns)
+UNIQUE_VIOLATION = re.compile(r'auth_user[._](username|email)')
+# How each database starts a unique violation (SQLite, PostgreSQL, MySQL) - a NOT NULL or
+# CHECK failure on the same columns names them too
+UNIQUE_MESSAGE = re.compile(r'UNIQUE constraint failed|duplicate key value|Duplicate entry', re.IGNORECASE)
+
+
+def unique_violation_error(exc):
+    """The field-level ValidationError for an IntegrityError from a unique username/email, or None."""
+    message = str(exc).splitlines()[0] if str(exc) else ''
+    # MySQL puts the duplicate value before the key name, so the last match is the constraint
+    fields = UNIQUE_VIOLATION.findall(message)
+    if not fields or not UNIQUE_MESSAGE.search(message):
+        return None
+    return serializers.ValidationError({fields[-1]: [UNIQUE_ERRORS[fields[-1]]]})
+
+
+@contextmanager
+def unique_violations_as_errors(using=None):
+    """
+    Turn IntegrityErrors from the username/email unique constraints into field errors.
+
+    using is where the write goes, when the router can't tell from the model alone (user shards).
+    """
+    connection = transaction.get_connection(using or router.db_for_write(User))
+    # Inside a transaction (ATOMIC_REQUESTS) the failed INSERT must only roll back to a savepoint
+    savepoint = transaction.atomic(using=connection.alias) if connection.in_atomic_block else nullcontext()
+    try:
+        with savepoint:
+            yield
+    except IntegrityError as exc:
+        error = unique_violation_error(exc)
+        if error is None:
+            raise
+        raise error from exc
+
+
 """
 Serializers in django are basically what I'm using to convert Django model objects to json and vise versa so 
 our frameworks on the front end can understand them. If you have a specific object/json structure you want to
@@ -17,7 +85,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     to the Django USER model so the database can store it and the Django app can use it natively.
     
     Handles creating new users with username, email, and password.
-    Validates that username and email are unique.
+    Username and email uniqueness (ignoring case) is enforced by the database, see create().
     """
     password = serializers.CharField(
         write_only=True, 
@@ -38,23 +106,19 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'first_name': {'required': False},
             'last_name': {'required': False},
+            # Uniqueness is left to the case-insensitive unique constraints on auth_user
+            # (see create()), so drop the UniqueValidators ModelSerializer would add
+            'username': {'validators': [User.username_validator]},
+            'email': {'validators': []},
         }
     
-    def validate_username(self, value):
-        """Check if username is already taken."""
-        if User.objects.filter(username__iexact=value).exists():
-            raise serializers.ValidationError("A user with this username already exists.")
-        return value
-    
     def validate_email(self, value):
-        """Check if email is valid and not already taken."""
+        """Check if email is valid."""
         try:
             validate_email(value)
         except ValidationError:
             raise serializers.ValidationError("Enter a valid email address.")
         
-        if User.objects.filter(email__iexact=value).exists():
-            raise serializers.ValidationError("A user with this email already exists.")
         # Store emails in lowercase because they are case-insensitive by default and phones are finnicky with case
         return value.lower()  
     
@@ -77,9 +141,34 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return attrs
     
     def create(self, validated_data):
-        """Create and return a new user."""
+        """
+        Create and return a new user.
+        
+        Taken usernames/emails aren't checked up front - that would be a query each
+        and still racy. The INSERT just runs into the unique constraints, and the
+        IntegrityError becomes the usual field error.
+        """
+        password = validated_data.pop('password')
+        with unique_violations_as_errors(login_db(validated_data['username'])):
+            user = User.objects.create_user(password=password, **validated_data)
+        return user
+    
+    async def acreate(self):
+        """
+        Async create() - hashes on the hasher pool, then INSERTs like create(), under
+        the same savepoint (on the async ORM's thread, where the connection lives).
+        """
+        validated_data = dict(self.validated_data)
         password = validated_data.pop('password')
-        user = User.objects.create_user(password=password, **validated_data)
+        user = User.objects._create_user_object(validated_data.pop('username'), validated_data.pop('email'), None,
+                                                **validated_data)
+        await user.aset_password(password)
+        self.instance = await sync_to_async(self._insert)(user)
+        return self.instance
+
+    def _insert(self, user):
+        with unique_violations_as_errors(login_db(user.username)):
+            user.save()
         return user
 
 
@@ -103,6 +192,10 @@ class UserLoginSerializer(serializers.Serializer):
         password = attrs.get('password')
         
         if login and password:
+            # The async views authenticate afterwards with aauthenticate_user()
+            if self.context.get('defer_authentication'):
+                return attrs
+            
             # Try to authenticate with our custom backend that supports email/username
             user = authenticate(
                 request=self.context.get('request'),
@@ -110,32 +203,119 @@ class UserLoginSerializer(serializers.Serializer):
                 password=password
             )
             
-            if not user:
-                raise serializers.ValidationError(
-                    'Unable to login with provided credentials.',
-                    code='authorization'
-                )
-            
-            if not user.is_active:
-                raise serializers.ValidationError(
-                    'User account is disabled.',
-                    code='authorization'
-                )
-            
-            attrs['user'] = user
+            attrs['user'] = self.check_user(user)
             return attrs
         else:
             raise serializers.ValidationError(
                 'Must include "login" and "password".',
                 code='authorization'
             )
+    
+    async def aauthenticate_user(self):
+        """Async authentication for serializers created with defer_authentication."""
+        user = await aauthenticate(
+            request=self.context.get('request'),
+            username=self.validated_data['login'],
+            password=self.validated_data['password']
+        )
+        try:
+            self.validated_data['user'] = self.check_user(user)
+        except serializers.ValidationError as exc:
+            # Same error shape as when check_user() fails inside validate()
+            raise serializers.ValidationError(serializers.as_serializer_error(exc))
+        return self.validated_data['user']
+    
+    def check_user(self, user):
+        """Raise the usual login errors unless user is an active, authenticated user."""
+        if not user:
+            raise serializers.ValidationError(
+                'Unable to login with provided credentials.',
+                code='authorization'
+            )
+        
+        if not user.is_active:
+            raise serializers.ValidationError(
+                'User account is disabled.',
+                code='authorization'
+            )
+        
+        return user
+
+
+# Fields whose to_representation() is just a type conversion
+PLAIN_FIELDS = {
+    serializers.CharField: str,
+    serializers.EmailField: str,
+    serializers.IntegerField: int,
+    serializers.BooleanField: bool,
+}
+
+
+def _is_plain_datetime(field):
+    """An ISO 8601 DateTimeField in the current timezone, which represent() formats itself."""
+    return (
+        type(field) is serializers.DateTimeField
+        and getattr(field, 'format', empty) in (empty, ISO_8601)
+        and api_settings.DATETIME_FORMAT == ISO_8601
+        and not hasattr(field, 'timezone')
+        and settings.USE_TZ
+    )
+
+
+@cache
+def compiled_representation(serializer_class):
+    """
+    A function returning serializer_class's output for an instance, computed the cheap way.
+    
+    ModelSerializer rebuilds its fields from the model for every new serializer
+    (get_fields() plus a deepcopy of the declared ones) and then goes through
+    get_attribute()/to_representation() for each of them. Here the fields are built
+    once per class: model columns and methods are read directly, plain str/int/bool
+    fields skip to_representation(), and aware datetimes are formatted like DRF
+    does with the active timezone looked up once instead of per field.
+    Only for output-only use of serializers that don't depend on their context.
+    """
+    template = serializer_class()
+    model = template.Meta.model
+    concrete = {field.attname for field in model._meta.concrete_fields}
+    steps = []
+    for field in template._readable_fields:
+        attrs = field.source_attrs
+        if len(attrs) == 1 and attrs[0] in concrete:
+            get = attrgetter(attrs[0])
+        elif len(attrs) == 1 and isfunction(getattr(model, attrs[0], None)):
+            # A model method like get_full_name - DRF would inspect its signature every call
+            get = methodcaller(attrs[0])
+        else:
+            get = field.get_attribute
+        convert = PLAIN_FIELDS.get(type(field), field.to_representation)
+        steps.append((field.field_name, get, convert, _is_plain_datetime(field)))
+    has_datetimes = any(is_datetime for *_, is_datetime in steps)
+    
+    def represent(instance):
+        tz = timezone.get_current_timezone() if has_datetimes else None
+        data = {}
+        for name, get, convert, is_datetime in steps:
+            value = get(instance)
+            if value is None:
+                data[name] = None
+            elif is_datetime and isinstance(value, datetime) and value.tzinfo is not None:
+                value = value.astimezone(tz).isoformat()
+                data[name] = value[:-6] + 'Z' if value.endswith('+00:00') else value
+            else:
+                data[name] = convert(value)
+        return data
+    
+    return represent
 
 
 class UserSerializer(serializers.ModelSerializer):
     """
     Serializer for user data.
     
-    Used to return user information after login or for profile views.
+    Used to return user information after login or for profile views. Output
+    only, so it's rendered by compiled_representation() - same JSON as the
+    ModelSerializer machinery at a fraction of the CPU.
     """
     full_name = serializers.CharField(source='get_full_name', read_only=True)
     
@@ -150,6 +330,14 @@ class UserSerializer(serializers.ModelSerializer):
             'id', 'is_active', 'email_verified', 
             'date_joined', 'last_login'
         )
+    
+    def to_representation(self, instance):
+        return compiled_representation(type(self))(instance)
+
+
+def serialize_user(user):
+    """UserSerializer(user).data, without creating the serializer."""
+    return compiled_representation(UserSerializer)(user)
 
 
 class UserProfileUpdateSerializer(serializers.ModelSerializer):
@@ -163,6 +351,10 @@ class UserProfileUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('first_name', 'last_name', 'email')
+        extra_kwargs = {
+            # validate_email() already checks uniqueness case-insensitively
+            'email': {'validators': []},
+        }
     
     def validate_email(self, value):
         """Check if email is valid and not already taken by another user."""
@@ -172,11 +364,33 @@ class UserProfileUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Enter a valid email address.")
         
         # Check if email is taken by another user (not the current user)
-        if User.objects.filter(email__iexact=value).exclude(id=self.instance.id).exists():
-            raise serializers.ValidationError("A user with this email already exists.")
+        if not self.context.get('defer_unique_checks') and email_owners(value, exclude=self.instance.id).exists():
+            raise serializers.ValidationError(UNIQUE_ERRORS['email'])
         
         return value.lower()
 
+    def update(self, instance, validated_data):
+        """validate_email() can race another change to the same email - the constraint settles it."""
+        with unique_violations_as_errors(instance._state.db):
+            return super().update(instance, validated_data)
+
+    async def avalidate_unique(self):
+        """Async email uniqueness check, for serializers created with defer_unique_checks."""
+        email = self.validated_data.get('email')
+        if email and await email_owners(email, exclude=self.instance.id).aexists():
+            raise serializers.ValidationError({'email': [UNIQUE_ERRORS['email']]})
+    
+    async def asave(self):
+        """
+        Async save() - update() on the async ORM's thread.
+
+        A concurrent change to the same email gets past avalidate_unique() and runs
+        into the unique constraint; that comes back as the field error, like acreate().
+        The savepoint and the UPDATE have to share that thread's connection.
+        """
+        self.instance = await sync_to_async(self.update)(self.instance, dict(self.validated_data))
+        return self.instance
+
 
 class ChangePasswordSerializer(serializers.Serializer):
     """
@@ -229,4 +443,131 @@ class ChangePasswordSerializer(serializers.Serializer):
         user = self.context['request'].user
         user.set_password(password)
         user.save()
-        return user
\ No newline at end of file
+        return user
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    """
+    SimpleJWT's /auth/token/ serializer, issuing our tokens (with the user claims).
+    
+    UPDATE_LAST_LOGIN goes through the last_login write buffer instead of
+    SimpleJWT's UPDATE per login. No user_logged_in here (SimpleJWT doesn't
+    send it), so the audit trail gets the login directly.
+    """
+    token_class = RefreshToken
+    
+    def validate(self, attrs):
+        # TokenObtainSerializer.validate() authenticates and sets self.user
+        data = jwt_serializers.TokenObtainSerializer.validate(self, attrs)
+        refresh = self.get_token(self.user)
+        data['refresh'] = str(refresh)
+        data['access'] = str(refresh.access_token)
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            last_logins.record(self.user)
+        audit.record(AuthEvent.LOGIN, self.user.pk, self.context.get('request'))
+        return data
+
+
+class TokenVerifySerializer(jwt_serializers.TokenVerifySerializer):
+    """SimpleJWT's /auth/token/verify/ serializer, for our signing keys and revocation store."""
+
+    def validate(self, attrs):
+        """
+        A token only verifies if it would still authenticate: not revoked by jti, nor
+        by a token_version bump (logout-all, password change), and its user still active.
+        """
+        token = UntypedToken(attrs['token'])
+        token.check_revoked()
+        user_id = token.get(jwt_settings.USER_ID_CLAIM)
+        state = user_cache.get_values(user_id, 'is_active', 'token_version') if user_id is not None else None
+        check_token_state(token, state)
+        return {}
+
+
+class TokenBatchVerifySerializer(serializers.Serializer):
+    """
+    Up to TOKEN_INTROSPECTION['MAX_TOKENS'] tokens to verify in one go (see introspection.py).
+    
+    Validation only checks the list itself - bad tokens don't fail the batch,
+    they get valid: false in their result.
+    """
+    tokens = serializers.ListField(
+        child=serializers.CharField(trim_whitespace=True),
+        allow_empty=False,
+        help_text="Encoded access/refresh tokens"
+    )
+    
+    def validate_tokens(self, value):
+        max_tokens = get_introspection_config()['MAX_TOKENS']
+        if len(value) > max_tokens:
+            raise serializers.ValidationError(f"Send at most {max_tokens} tokens per request.")
+        return value
+    
+    def get_results(self):
+        return introspect(self.validated_data['tokens'])
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """
+    SimpleJWT's refresh serializer, plus our token checks.
+
+    The user comes from the user cache, so a refresh usually costs just the
+    token family's UPDATE (see families.py). This is where revoked or reused
+    refresh tokens get turned away and where the user claims are brought up to
+    date for the new access (and rotated refresh) token.
+    """
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        refresh.check_revoked()
+        user = user_cache.get_user(refresh.payload.get(jwt_settings.USER_ID_CLAIM))
+        return refresh_tokens(refresh, user, self.context.get('request'))
+
+
+def _check_refresh_user(refresh, user):
+    if user is None or not jwt_settings.USER_AUTHENTICATION_RULE(user) or not is_current(refresh, user):
+        raise AuthenticationFailed(
+            'No active account found for the given token.',
+            code='no_active_account'
+        )
+
+    refresh.set_user_claims(user)
+    if jwt_settings.ROTATE_REFRESH_TOKENS and jwt_settings.BLACKLIST_AFTER_ROTATION and not families.in_family(refresh):
+        # Tokens from before families can only be retired by jti.
+        # Queued for a batched write, doesn't wait on the database
+        refresh.revoke()
+
+
+def _refreshed(refresh):
+    data = {'access': str(refresh.access_token)}
+    if jwt_settings.ROTATE_REFRESH_TOKENS:
+        data['refresh'] = str(refresh)
+    return data
+
+
+def refresh_tokens(refresh, user, request=None):
+    """
+    Issue a new access token (and rotated refresh token) from a validated refresh token.
+
+    The caller does the user lookup and the revocation check. Raises TokenError
+    when the token's family has ended or the token was already used.
+    """
+    _check_refresh_user(refresh, user)
+    if jwt_settings.ROTATE_REFRESH_TOKENS:
+        families.rotate(refresh, user)
+    else:
+        families.check(refresh, user)
+    audit.record(AuthEvent.REFRESH, user.pk, request)
+    return _refreshed(refresh)
+
+
+async def arefresh_tokens(refresh, user, request=None):
+    """Async refresh_tokens()."""
+    _check_refresh_user(refresh, user)
+    if jwt_settings.ROTATE_REFRESH_TOKENS:
+        await families.arotate(refresh, user)
+    else:
+        await families.acheck(refresh, user)
+    audit.record(AuthEvent.REFRESH, user.pk, request)
+    return _refreshed(refresh)
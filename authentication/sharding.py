@@ -0,0 +1,270 @@
+"""
+Hash-sharded user storage.
+
+With more than one database in USER_SHARDS['DATABASES'], users are spread
+across those databases:
+
+- A user lives on the shard picked by a stable hash of their lowercased
+  username, the one login identifier that never changes. ShardRouter sends
+  a new user's INSERT there (login_db()).
+- Every shard hands out user ids from its own range - shard i starts at
+  i << ID_SHIFT (set up after each migrate, see set_id_range()). The shard
+  is part of the id, so get_user(), token checks and everything else that
+  only has a user id goes straight to the right database (user_db()).
+- A username always hashes to the same shard and is unique there, so it's
+  unique everywhere. Emails can't be placed like that (they change, and the
+  user lives by their username), so every email also gets an EmailClaim row
+  on the shard the email hashes to, unique there. Registering with, or
+  changing to, an email someone else claimed fails with the same field
+  error as a taken username. Logging in by email reads the claim, then the
+  user.
+- The first shard must be 'default', which also keeps everything that isn't
+  a user (revoked tokens, sessions, signing keys, the admin's log). Every
+  shard gets the full schema: run `manage.py migrate_shards`.
+
+A user and their claim live on different databases, so they can't be written
+in one transaction. When the second write fails the first one is undone.
+
+Limitations: the admin (and groups/permissions) only sees users on 'default',
+and changing the list of shards strands existing users on the wrong one -
+resharding means moving rows, which nothing here does.
+
+With one database (the default) none of this does anything.
+"""
+
+import hashlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.checks import Error, register
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
+
+DEFAULTS = {
+    'DATABASES': [],
+    # 2**40 ids per shard, and room for 8192 shards below 2**53 (JavaScript's integer limit)
+    'ID_SHIFT': 40,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'USER_SHARDS', {})}
+
+
+def _email_claim_model():
+    from .models import EmailClaim
+    return EmailClaim
+
+
+def user_databases():
+    """The shards, or [None] (= route as usual) when users aren't sharded."""
+    databases = get_config()['DATABASES']
+    return list(databases) if len(databases) > 1 else [None]
+
+
+def is_sharded():
+    return len(get_config()['DATABASES']) > 1
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.lower().encode(), digest_size=8).digest(), 'big')
+
+
+def login_db(value):
+    """The shard a username (or an email's claim) hashes to, None when not sharded."""
+    databases = get_config()['DATABASES']
+    if len(databases) < 2:
+        return None
+    return databases[_hash(value) % len(databases)]
+
+
+def user_db(user_id):
+    """The shard user_id was handed out by, None when not sharded."""
+    config = get_config()
+    databases = config['DATABASES']
+    if len(databases) < 2:
+        return None
+    try:
+        index = int(user_id) >> config['ID_SHIFT']
+    except (TypeError, ValueError):
+        index = 0
+    # An id from no shard finds nobody, wherever we look
+    return databases[index] if index < len(databases) else databases[0]
+
+
+def group_by_db(user_ids):
+    """{shard (or None when not sharded): [user ids on it]}"""
+    groups = {}
+    for user_id in user_ids:
+        groups.setdefault(user_db(user_id), []).append(user_id)
+    return groups
+
+
+# Emails
+
+def email_owners(email, exclude=None):
+    """
+    Ids of the users with this email (ignoring case), except exclude, as a
+    values_list() queryset: the claim when sharded, auth_user's LOWER(email) index when not.
+    """
+    if is_sharded():
+        owners = _email_claim_model().objects.using(login_db(email)).filter(email=email.lower())
+        owners = owners.exclude(user_id=exclude) if exclude is not None else owners
+        return owners.values_list('user_id', flat=True)
+    owners = get_user_model().objects.alias(lookup=Lower('email')).filter(lookup=Lower(Value(email)))
+    owners = owners.exclude(pk=exclude) if exclude is not None else owners
+    return owners.values_list('pk', flat=True)
+
+
+def _claim(email, user_id):
+    using = login_db(email)
+    # A savepoint when in a transaction - claimed_email() still has to clean up after a taken email
+    with transaction.atomic(using=using):
+        _email_claim_model()(email=email.lower(), user_id=user_id).save(using=using, force_insert=True)
+
+
+def _release(email, user_id):
+    _email_claim_model().objects.using(login_db(email)).filter(email=email.lower(), user_id=user_id).delete()
+
+
+@contextmanager
+def claimed_email(user, update_fields=None):
+    """
+    Wraps User.save(): claims a new user's email after the INSERT and a changed
+    email before the UPDATE, and gives up the old one afterwards.
+
+    A taken email raises the claim's IntegrityError (auth_user_email_claim.email),
+    which serializers.py turns into the usual email error.
+    """
+    email = user.__dict__.get('email')
+    loaded = getattr(user, '_loaded_email', None)
+    skip = update_fields is not None and 'email' not in update_fields
+    if not is_sharded() or skip or not email:
+        yield
+        return
+
+    if user._state.adding:
+        yield
+        try:
+            _claim(email, user.pk)
+        except IntegrityError:
+            type(user)._default_manager.db_manager(user._state.db).filter(pk=user.pk).delete()
+            raise
+    elif loaded is None or email.lower() != loaded.lower():
+        _claim(email, user.pk)
+        try:
+            yield
+        except BaseException:
+            _release(email, user.pk)
+            raise
+        if loaded:
+            _release(loaded, user.pk)
+    else:
+        yield
+
+
+def release_email(sender, instance, **kwargs):
+    """post_delete receiver for users: frees the email's claim."""
+    email = instance.__dict__.get('email')
+    if is_sharded() and email:
+        _release(email, instance.pk)
+
+
+# Ids
+
+# Backends set_id_range() knows how to move the user id sequence on
+ID_RANGE_VENDORS = ('sqlite', 'postgresql')
+
+
+def set_id_range(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    post_migrate receiver: start the shard's user ids at index << ID_SHIFT.
+
+    Only moves the sequence forward, so running migrate again is harmless.
+    Backends not in ID_RANGE_VENDORS are left alone - check_shards() reports them.
+    """
+    config = get_config()
+    if not is_sharded() or using not in config['DATABASES']:
+        return
+    start = config['DATABASES'].index(using) << config['ID_SHIFT']
+    if not start:
+        return
+    User = get_user_model()
+    table, column = User._meta.db_table, User._meta.pk.column
+    connection = connections[using]
+    if connection.vendor not in ID_RANGE_VENDORS:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s', [start, table])
+            if not cursor.rowcount:
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, start])
+        elif connection.vendor == 'postgresql':
+            quote = connection.ops.quote_name
+            cursor.execute(
+                f'SELECT setval(pg_get_serial_sequence(%s, %s), '
+                f'GREATEST(%s, (SELECT COALESCE(MAX({quote(column)}), 0) FROM {quote(table)})))',
+                [table, column, start],
+            )
+
+
+class ShardRouter:
+    """
+    Users and email claims on their shard, when sharding is on.
+
+    Only decides what it can tell from the instance - reads by id or login go
+    through user_db()/login_db() explicitly. Everything else is left to the
+    next router.
+    """
+
+    def _db_for(self, model, instance=None, **hints):
+        if instance is None or not is_sharded():
+            return None
+        if model is _email_claim_model() and isinstance(instance, model):
+            return login_db(instance.email)
+        if model is not get_user_model():
+            return None
+        if instance._state.db:
+            return instance._state.db
+        if isinstance(instance, model):
+            return user_db(instance.pk) if instance.pk is not None else login_db(instance.username)
+        return None
+
+    db_for_read = _db_for
+    db_for_write = _db_for
+
+
+@register()
+def check_shards(app_configs, **kwargs):
+    databases = get_config()['DATABASES']
+    if len(databases) < 2:
+        return []
+    errors = []
+    if databases[0] != DEFAULT_DB_ALIAS:
+        errors.append(Error(
+            "USER_SHARDS['DATABASES'] has to start with 'default'.",
+            hint='Everything that is not a user stays on the first shard.',
+            id='authentication.E004',
+        ))
+    for alias in databases:
+        if alias not in settings.DATABASES:
+            errors.append(Error(
+                f"USER_SHARDS lists {alias!r}, which is not in DATABASES.",
+                id='authentication.E005',
+            ))
+        elif connections[alias].vendor not in ID_RANGE_VENDORS:
+            errors.append(Error(
+                f"User shard {alias!r} is on {connections[alias].vendor}, which can't be given its own user id range.",
+                hint=f"Sharding supports {' and '.join(ID_RANGE_VENDORS)}.",
+                id='authentication.E007',
+            ))
+    from .routers import replica_alias
+    if replica_alias() is not None:
+        errors.append(Error(
+            'A read replica and user shards cannot be combined.',
+            hint='Unset AUTH_DB_REPLICA or AUTH_DB_SHARDS.',
+            id='authentication.E006',
+        ))
+    return errors
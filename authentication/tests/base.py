@@ -0,0 +1,76 @@
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from ..audit import audit_log
+from ..cache import user_cache
+from ..last_login import last_logins
+from ..models import TokenFamily, User
+from ..revocation import revocations
+from ..sharding import login_db, user_db
+
+PASSWORD = 'redemption!42'
+
+# One throwaway signing key for the whole run, never one in the working tree
+KEY_DIR = tempfile.TemporaryDirectory(prefix='auth-test-keys-')
+
+
+@override_settings(JWT_KEYS={**settings.JWT_KEYS, 'KEY_DIR': KEY_DIR.name, 'CREATE_FIRST_KEY': True})
+class APITestCase(TestCase):
+    """
+    Client helpers, and a clean slate: no users cached from an earlier test (ids
+    come around again after rollbacks) and nothing left in the write buffers.
+
+    The buffers have no writer threads under test_settings - whatever a test
+    left in them is written before its transaction is rolled back.
+
+    Every user shard is in play when AUTH_DB_SHARDS is set, see test_sharding.py.
+    """
+    databases = set(settings.USER_SHARDS['DATABASES'])
+
+    def setUp(self):
+        user_cache.clear()
+        cache.clear()
+        self.addCleanup(self.flush_buffers)
+
+    def flush_buffers(self):
+        revocations.flush()
+        audit_log.flush()
+        last_logins.flush()
+        user_cache.clear()
+
+    def register(self, username, email, password=PASSWORD):
+        return self.client.post('/auth/register/', {
+            'username': username,
+            'email': email,
+            'password': password,
+            'password_confirm': password,
+        }, content_type='application/json')
+
+    def login(self, login, password=PASSWORD):
+        response = self.client.post('/auth/login/', {'login': login, 'password': password},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def refresh(self, refresh):
+        return self.client.post('/auth/token/refresh/', {'refresh': refresh}, content_type='application/json')
+
+    def profile(self, access):
+        return self.client.get('/auth/user/', headers={'Authorization': f'Bearer {access}'})
+
+    def post(self, url, access, data=None):
+        return self.client.post(url, data or {}, content_type='application/json',
+                                headers={'Authorization': f'Bearer {access}'})
+
+    def put(self, url, access, data):
+        return self.client.put(url, data, content_type='application/json',
+                               headers={'Authorization': f'Bearer {access}'})
+
+    def user(self, username):
+        return User.objects.using(login_db(username)).get(username=username)
+
+    def families(self, user):
+        return TokenFamily.objects.using(user_db(user.pk)).filter(user_id=user.pk)
@@ -0,0 +1,91 @@
+from django.test import override_settings
+from django.urls import path
+
+from .. import async_views
+from ..models import User
+from .base import PASSWORD, APITestCase
+
+# What authentication/urls.py serves with ASYNC_API on
+urlpatterns = [
+    path('auth/register/', async_views.UserRegistrationView.as_view()),
+    path('auth/login/', async_views.UserLoginView.as_view()),
+    path('auth/logout/', async_views.LogoutView.as_view()),
+    path('auth/user/', async_views.UserProfileView.as_view()),
+    path('auth/token/refresh/', async_views.TokenRefreshView.as_view()),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncViewTests(APITestCase):
+    """The async views answer like the DRF ones, through the async client."""
+
+    def setUp(self):
+        super().setUp()
+        self.jojo = User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+
+    async def apost(self, url, data, access=None):
+        headers = {'Authorization': f'Bearer {access}'} if access else {}
+        return await self.async_client.post(url, data, content_type='application/json', headers=headers)
+
+    async def alogin(self, login='jojo'):
+        response = await self.apost('/auth/login/', {'login': login, 'password': PASSWORD})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    async def aprofile(self, access):
+        return await self.async_client.get('/auth/user/', headers={'Authorization': f'Bearer {access}'})
+
+    async def test_register(self):
+        response = await self.apost('/auth/register/', {
+            'username': 'mojo', 'email': 'mojo@example.com',
+            'password': PASSWORD, 'password_confirm': PASSWORD,
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        body = response.json()
+        self.assertEqual(body['user']['username'], 'mojo')
+        self.assertEqual((await self.aprofile(body['access'])).json()['email'], 'mojo@example.com')
+
+    async def test_register_errors_come_back_like_drf(self):
+        response = await self.apost('/auth/register/', {'username': 'mojo', 'email': 'nope'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'email', 'password', 'password_confirm'})
+
+    async def test_login_by_email_and_wrong_password(self):
+        self.assertEqual((await self.alogin('JOJO@example.com'))['user']['username'], 'jojo')
+        response = await self.apost('/auth/login/', {'login': 'jojo', 'password': 'not it'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_profile(self):
+        access = (await self.alogin())['access']
+        response = await self.async_client.put('/auth/user/', {'first_name': 'Jo'}, content_type='application/json',
+                                               headers={'Authorization': f'Bearer {access}'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((await self.aprofile(access)).json()['first_name'], 'Jo')
+
+    async def test_unauthenticated(self):
+        response = await self.async_client.get('/auth/user/')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response.headers)
+        self.assertEqual((await self.aprofile('garbage')).status_code, 401)
+
+    async def test_refresh_and_logout(self):
+        tokens = await self.alogin()
+        response = await self.apost('/auth/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200, response.content)
+        rotated = response.json()
+
+        response = await self.apost('/auth/logout/', {'refresh': rotated['refresh']}, rotated['access'])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((await self.apost('/auth/token/refresh/', {'refresh': rotated['refresh']})).status_code, 401)
+        self.assertEqual((await self.aprofile(rotated['access'])).status_code, 401)
+
+    async def test_bad_json(self):
+        response = await self.async_client.post('/auth/login/', '{nope', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()['detail'].startswith('JSON parse error'))
+
+    def test_same_bytes_as_the_drf_views(self):
+        access = self.login('jojo')['access']
+        async_profile = self.profile(access).content
+        with self.settings(ROOT_URLCONF='auth_service.urls'):
+            self.assertEqual(self.profile(access).content, async_profile)
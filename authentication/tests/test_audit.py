@@ -0,0 +1,87 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+
+from ..audit import audit_log, events_for, record
+from ..models import AuthEvent, User
+from .base import PASSWORD, APITestCase
+
+
+class AuditTrailTests(APITestCase):
+    """Auth events are buffered on the request path and written in bulk."""
+
+    def kinds(self, user):
+        audit_log.flush()
+        return [event.kind for event in events_for(user.pk)][::-1]
+
+    def test_every_kind_of_event(self):
+        self.register('jojo', 'jojo@example.com')
+        jojo = self.user('jojo')
+        tokens = self.login('jojo')
+        tokens = self.refresh(tokens['refresh']).json()
+        self.post('/auth/logout/', tokens['access'], {'refresh': tokens['refresh']})
+        tokens = self.login('jojo')
+        self.post('/auth/change-password/', tokens['access'], {
+            'current_password': PASSWORD,
+            'new_password': 'weewoo12345!',
+            'new_password_confirm': 'weewoo12345!',
+        })
+        self.post('/auth/logout/all/', self.login('jojo', 'weewoo12345!')['access'])
+
+        self.assertEqual(self.kinds(jojo), [
+            AuthEvent.REGISTER, AuthEvent.LOGIN, AuthEvent.REFRESH, AuthEvent.LOGOUT,
+            AuthEvent.LOGIN, AuthEvent.PASSWORD_CHANGE, AuthEvent.LOGIN, AuthEvent.LOGOUT_ALL,
+        ])
+
+    def test_requests_only_buffer(self):
+        User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+        pending = audit_log.stats()['pending']
+        self.login('jojo')
+        self.assertEqual(audit_log.stats()['pending'], pending + 1)
+        self.assertFalse(AuthEvent.objects.exists())
+
+    def test_failed_logins(self):
+        response = self.client.post('/auth/login/', {'login': 'Nobody@example.com', 'password': 'nope'},
+                                    content_type='application/json', headers={'User-Agent': 'curl/8'})
+        self.assertEqual(response.status_code, 400)
+        audit_log.flush()
+        event = AuthEvent.objects.get()
+        self.assertEqual((event.kind, event.user_id, event.login, event.ip, event.user_agent),
+                         (AuthEvent.LOGIN_FAILED, None, 'Nobody@example.com', '127.0.0.1', 'curl/8'))
+
+    def test_events_by_time_range(self):
+        jojo = User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+        now = timezone.now()
+        times = [now - timedelta(days=2), now - timedelta(days=1), now]
+        with mock.patch('django.utils.timezone.now', side_effect=times):
+            for kind in (AuthEvent.LOGIN, AuthEvent.REFRESH, AuthEvent.LOGOUT):
+                record(kind, jojo.pk)
+        audit_log.flush()
+        self.assertEqual([event.kind for event in events_for(jojo.pk, since=now - timedelta(hours=36), until=now)],
+                         [AuthEvent.REFRESH])
+        self.assertEqual(len(events_for(jojo.pk, since=now - timedelta(hours=36))), 2)
+
+    @override_settings(AUDIT_LOG={'MAX_PENDING': 2, 'BACKGROUND': False})
+    def test_a_full_buffer_drops(self):
+        audit_log.flush()
+        dropped = audit_log.stats()['dropped']
+        for _ in range(3):
+            record(AuthEvent.LOGIN, 1)
+        self.assertEqual(audit_log.stats()['pending'], 2)
+        self.assertEqual(audit_log.stats()['dropped'] - dropped, 1)
+
+    @override_settings(AUDIT_LOG={'ENABLED': False})
+    def test_disabled(self):
+        record(AuthEvent.LOGIN, 1)
+        self.assertEqual(audit_log.stats()['pending'], 0)
+
+    def test_failed_writes_are_retried(self):
+        record(AuthEvent.LOGIN, 1)
+        with mock.patch('authentication.audit._insert', side_effect=RuntimeError('locked')):
+            with self.assertRaises(RuntimeError):
+                audit_log.flush()
+        self.assertEqual(audit_log.stats()['pending'], 1)
+        audit_log.flush()
+        self.assertEqual([event.kind for event in events_for(1)], [AuthEvent.LOGIN])
@@ -0,0 +1,76 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from ..authentication import LazyTokenUser, StatelessJWTAuthentication
+from ..cache import user_cache
+from ..models import User
+from ..sharding import user_db
+from ..tokens import AccessToken, USERNAME_CLAIM
+from .base import PASSWORD, APITestCase
+
+
+class StatelessAuthenticationTests(APITestCase):
+    """Access tokens are enough to know who's calling - the User row is only read when a view needs it."""
+
+    def setUp(self):
+        super().setUp()
+        self.jojo = User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+
+    def authenticate(self, access):
+        request = RequestFactory().get('/auth/user/', headers={'Authorization': f'Bearer {access}'})
+        return StatelessJWTAuthentication().authenticate(request)
+
+    def user_queries(self):
+        return CaptureQueriesContext(connections[user_db(self.jojo.pk) or DEFAULT_DB_ALIAS])
+
+    def assertNoUserSelect(self, queries):
+        self.assertFalse([query for query in queries.captured_queries if 'auth_user' in query['sql']])
+
+    def test_identity_comes_from_the_claims(self):
+        access = str(AccessToken.for_user(self.jojo))
+        user_cache.get_values(self.jojo.pk, 'is_active', 'token_version')
+        with self.user_queries() as queries:
+            user, _ = self.authenticate(access)
+            self.assertEqual((user.pk, user.username, user.is_active), (self.jojo.pk, 'jojo', True))
+            self.assertTrue(user.is_authenticated)
+            self.assertTrue(user)
+        self.assertIsInstance(user, LazyTokenUser)
+        self.assertFalse(user.is_loaded)
+        self.assertNoUserSelect(queries)
+
+    def test_model_fields_load_the_row(self):
+        user, _ = self.authenticate(str(AccessToken.for_user(self.jojo)))
+        self.assertEqual(user.email, 'jojo@example.com')
+        self.assertTrue(user.is_loaded)
+        self.assertTrue(user.check_password(PASSWORD))
+
+    def test_tokens_without_the_claims(self):
+        token = AccessToken.for_user(self.jojo)
+        del token[USERNAME_CLAIM]
+        user, _ = self.authenticate(str(token))
+        self.assertEqual(user.username, 'jojo')
+        self.assertTrue(user.is_loaded)
+
+    def test_deactivated_and_deleted_users(self):
+        access = str(AccessToken.for_user(self.jojo))
+        self.jojo.is_active = False
+        self.jojo.save()
+        with self.assertRaisesMessage(AuthenticationFailed, 'User is inactive'):
+            self.authenticate(access)
+
+        self.jojo.delete()
+        with self.assertRaisesMessage(AuthenticationFailed, 'User not found'):
+            self.authenticate(access)
+
+    def test_revoked_access_token(self):
+        token = AccessToken.for_user(self.jojo)
+        token.revoke()
+        with self.assertRaises(InvalidToken):
+            self.authenticate(str(token))
+
+    def test_profile_reads_through_the_token_user(self):
+        access = self.login('jojo')['access']
+        self.assertEqual(self.profile(access).json()['email'], 'jojo@example.com')
@@ -0,0 +1,82 @@
+import os
+
+from django.core.management import call_command
+from django.test import AsyncRequestFactory, override_settings
+
+from ..async_views import availability
+from ..availability import availability_index, build_filter
+from ..models import AvailabilityFilter, User
+from .base import PASSWORD, APITestCase
+
+
+class AvailabilityTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+        # Forget this test's filter, the next test starts without one
+        self.addCleanup(setattr, availability_index, '_pid', None)
+
+    def check(self, **params):
+        response = self.client.get('/auth/availability/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_answers(self):
+        self.assertEqual(self.check(username='JoJo', email='mojo@example.com'), {
+            'username': {'value': 'JoJo', 'valid': True, 'available': False},
+            'email': {'value': 'mojo@example.com', 'valid': True, 'available': True},
+        })
+        self.assertEqual(self.check(email='not an email')['email']['valid'], False)
+        self.assertEqual(self.client.get('/auth/availability/').status_code, 400)
+
+    def test_free_names_are_answered_from_the_filter(self):
+        build_filter()
+        self.assertTrue(availability_index.load())
+        with self.assertNumQueries(0):
+            self.assertTrue(availability_index.is_available('username', 'mojo'))
+        self.assertFalse(availability_index.is_available('email', 'JOJO@example.com'))
+        # Same answer whichever way it was reached
+        self.assertEqual(self.check(username='mojo')['username'], {'value': 'mojo', 'valid': True, 'available': True})
+
+    def test_load_catches_up_with_users_created_after_the_build(self):
+        build_filter()
+        User.objects.create_user('mojo', 'mojo@example.com', PASSWORD)
+        availability_index.load()
+        self.assertFalse(availability_index.is_available('username', 'mojo'))
+
+    def test_refresh_loads_newer_filters_only(self):
+        availability_index.start()
+        self.assertEqual(availability_index.stats()['ready'], False)
+        with self.assertLogs('authentication.availability', 'WARNING'):
+            availability_index.refresh()
+
+        first = build_filter()
+        availability_index.refresh()
+        self.assertEqual(availability_index.stats()['filter_built_at'], first.built_at)
+        second = build_filter()
+        availability_index.refresh()
+        self.assertEqual(availability_index.stats()['filter_built_at'], second.built_at)
+
+    def test_rebuild_command_keeps_the_newest_filter(self):
+        call_command('rebuild_availability', stdout=open(os.devnull, 'w'))
+        call_command('rebuild_availability', stdout=open(os.devnull, 'w'))
+        [stored] = AvailabilityFilter.objects.all()
+        self.assertEqual(stored.count, 2)
+
+    @override_settings(AVAILABILITY={'MAX_CHECKS': 2, 'WINDOW': 60})
+    def test_checks_are_rate_limited(self):
+        self.check(username='a')
+        self.check(username='b')
+        response = self.client.get('/auth/availability/', {'username': 'c'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # Per client IP
+        response = self.client.get('/auth/availability/', {'username': 'c'}, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(AVAILABILITY={'MAX_CHECKS': 1, 'WINDOW': 60})
+    async def test_checks_are_rate_limited_async(self):
+        factory = AsyncRequestFactory()
+        self.assertEqual((await availability(factory.get('/auth/availability/', {'username': 'a'}))).status_code, 200)
+        self.assertEqual((await availability(factory.get('/auth/availability/', {'username': 'b'}))).status_code, 429)
@@ -0,0 +1,52 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+from ..backends import EmailOrUsernameModelBackend, find_user_by_login
+from ..models import User
+from ..sharding import login_db
+from .base import PASSWORD, APITestCase
+
+
+class LoginLookupTests(APITestCase):
+    """Logins are matched case-insensitively, one LOWER() equality per index."""
+
+    def setUp(self):
+        super().setUp()
+        self.jojo = User.objects.create_user('JoJo', 'Jojo@Example.com', PASSWORD)
+
+    def authenticate(self, login, password=PASSWORD):
+        return EmailOrUsernameModelBackend().authenticate(None, username=login, password=password)
+
+    def test_username_or_email_in_any_case(self):
+        for login in ('jojo', 'JOJO', 'jojo@example.com', 'JOJO@EXAMPLE.COM'):
+            with self.subTest(login=login):
+                self.assertEqual(self.authenticate(login), self.jojo)
+
+    def test_wrong_password_or_nobody(self):
+        self.assertIsNone(self.authenticate('jojo', 'not it'))
+        self.assertIsNone(self.authenticate('nobody'))
+        self.assertIsNone(self.authenticate('nobody@example.com'))
+
+    def test_inactive_users_cannot_log_in(self):
+        self.jojo.is_active = False
+        self.jojo.save()
+        self.assertIsNone(self.authenticate('jojo'))
+
+    def test_usernames_with_an_at_sign(self):
+        mojo = User.objects.create_user('mojo@home', 'mojo@example.com', PASSWORD)
+        self.assertEqual(find_user_by_login('MOJO@home'), mojo)
+
+    def test_username_is_one_indexed_probe(self):
+        with CaptureQueriesContext(connections[login_db('jojo') or DEFAULT_DB_ALIAS]) as queries:
+            find_user_by_login('JOJO')
+        [query] = queries.captured_queries
+        sql = query['sql'].upper()
+        self.assertIn('LOWER("AUTH_USER"."USERNAME") = (LOWER(', sql)
+        self.assertNotIn('EMAIL', sql.split('WHERE')[1])
+        self.assertNotIn('LIKE', sql)
+
+    def test_email_lookup_leaves_usernames_alone(self):
+        with CaptureQueriesContext(connections[login_db('jojo@example.com') or DEFAULT_DB_ALIAS]) as queries:
+            find_user_by_login('jojo@example.com')
+        self.assertNotIn('LIKE', ' '.join(query['sql'].upper() for query in queries.captured_queries))
+        self.assertNotIn('USERNAME") = (LOWER(', queries.captured_queries[-1]['sql'].upper())
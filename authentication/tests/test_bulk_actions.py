@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.test import override_settings
+from django.utils import timezone
+
+from ..bulk_actions import bulk_jobs
+from ..models import BulkJob, User
+from ..sharding import is_sharded
+from .base import PASSWORD, APITestCase
+
+
+@override_settings(BULK_ACTIONS={'CHUNK_SIZE': 2, 'SLEEP': 0, 'BACKGROUND': False})
+class BulkActionTests(APITestCase):
+    """Admin bulk actions queue a job and return - the runner does the work in chunks."""
+
+    def setUp(self):
+        super().setUp()
+        if is_sharded():
+            self.skipTest("The admin only lists the default database's users")
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', PASSWORD)
+        self.users = [User.objects.create_user(name, f'{name}@example.com', PASSWORD)
+                      for name in ('jojo', 'mojo', 'kojo', 'bojo', 'dojo')]
+        self.client.force_login(self.admin)
+
+    def action(self, action, users=(), query='', **data):
+        return self.client.post(f'/admin/authentication/user/{query}', {
+            'action': action,
+            ACTION_CHECKBOX_NAME: [user.pk for user in users],
+            **data,
+        })
+
+    def active(self):
+        return sorted(User.objects.filter(is_active=True).values_list('username', flat=True))
+
+    def test_deactivate_the_ticked_users(self):
+        access = self.login('jojo')['access']
+        response = self.action('make_inactive', self.users[:3])
+        self.assertEqual(response.status_code, 302)
+        job = BulkJob.objects.get()
+        self.assertEqual(job.status, BulkJob.QUEUED)
+        self.assertEqual(sorted(job.selection['ids']), [user.pk for user in self.users[:3]])
+        self.assertEqual(len(self.active()), 6)
+
+        bulk_jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.total, job.processed, job.changed), (BulkJob.DONE, 3, 3, 3))
+        self.assertEqual(job.cursor, self.users[2].pk)
+        self.assertEqual(self.active(), ['admin', 'bojo', 'dojo'])
+        # Deactivation bumps token_version, and the cache was told
+        self.assertEqual(self.profile(access).status_code, 401)
+
+    def test_select_all_keeps_the_filters(self):
+        User.objects.filter(username__in=['jojo', 'mojo']).update(is_active=False)
+        chunks = bulk_jobs.stats()['chunks']
+        self.action('make_active', [self.users[0]], query='?q=mo&is_active__exact=0', select_across='1')
+        self.assertEqual(BulkJob.objects.get().selection, {'filters': {'is_active__exact': ['0']}, 'search': 'mo'})
+
+        bulk_jobs.run_pending()
+        self.assertEqual(self.active(), ['admin', 'bojo', 'dojo', 'kojo', 'mojo'])
+        self.assertEqual(bulk_jobs.stats()['chunks'] - chunks, 1)
+
+    def test_chunks(self):
+        chunks = bulk_jobs.stats()['chunks']
+        job = bulk_jobs.submit('deactivate', {'filters': {'is_superuser__exact': ['0']}})
+        bulk_jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.total, job.processed, job.changed, job.progress), (5, 5, 5, 1))
+        self.assertEqual(bulk_jobs.stats()['chunks'] - chunks, 3)
+
+    def test_cancelled_jobs_dont_run(self):
+        job = bulk_jobs.submit('deactivate', {'ids': [self.users[0].pk]})
+        BulkJob.objects.filter(pk=job.pk).update(status=BulkJob.CANCELLED)
+        bulk_jobs.run_pending()
+        self.assertEqual(len(self.active()), 6)
+
+    def test_stale_jobs_are_picked_up_from_their_cursor(self):
+        job = bulk_jobs.submit('deactivate', {'ids': [user.pk for user in self.users]})
+        BulkJob.objects.filter(pk=job.pk).update(
+            status=BulkJob.RUNNING, cursor=self.users[1].pk, processed=2,
+            updated_at=timezone.now() - timedelta(minutes=5),
+        )
+        bulk_jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.changed), (BulkJob.DONE, 5, 3))
+        self.assertEqual(self.active(), ['admin', 'jojo', 'mojo'])
+
+    def test_bad_selections(self):
+        for selection in ([1, 2], {'ids': ['1']}, {'filters': {'password__startswith': ['x']}},
+                          {'filters': {'is_active': '1'}}):
+            with self.subTest(selection=selection), self.assertRaises(ValueError):
+                bulk_jobs.submit('deactivate', selection)
+        with self.assertRaises(ValueError):
+            bulk_jobs.submit('delete', {'ids': [1]})
+
+    def test_failed_jobs(self):
+        job = bulk_jobs.submit('deactivate', {'ids': [self.users[0].pk]})
+        BulkJob.objects.filter(pk=job.pk).update(selection={'filters': {'password': ['x']}})
+        with self.assertLogs('authentication.bulk_actions', 'ERROR'):
+            bulk_jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, BulkJob.FAILED)
+        self.assertIn('password', job.error)
@@ -0,0 +1,77 @@
+from django.test import override_settings
+
+from ..cache import UserCache, user_cache
+from ..last_login import last_logins
+from ..models import User
+from .base import PASSWORD, APITestCase
+
+
+class UserCacheTests(APITestCase):
+    """Cached user records, and the writes that have to drop them."""
+
+    def setUp(self):
+        super().setUp()
+        self.jojo = User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+
+    def counters(self):
+        stats = user_cache.stats()
+        return stats['local_hits'], stats['shared_hits'], stats['misses']
+
+    def delta(self, before):
+        return tuple(after - then for after, then in zip(self.counters(), before))
+
+    def test_local_then_shared_then_database(self):
+        before = self.counters()
+        with self.assertNumQueries(1, using=self.jojo._state.db):
+            self.assertEqual(user_cache.get_user(self.jojo.pk), self.jojo)
+        with self.assertNumQueries(0, using=self.jojo._state.db):
+            self.assertEqual(user_cache.get_values(self.jojo.pk, 'username', 'is_active'), ('jojo', True))
+            user_cache.clear()
+            self.assertEqual(user_cache.get_user(self.jojo.pk).email, 'jojo@example.com')
+        self.assertEqual(self.delta(before), (1, 1, 1))
+
+    def test_unknown_users(self):
+        self.assertIsNone(user_cache.get_user(self.jojo.pk + 1000))
+        self.assertIsNone(user_cache.get_values(self.jojo.pk + 1000, 'username'))
+
+    def test_password_hash_stays_out_of_the_cache(self):
+        user = user_cache.get_user(self.jojo.pk)
+        self.assertNotIn('password', user.__dict__)
+        self.assertTrue(user.check_password(PASSWORD))
+
+    @override_settings(USER_CACHE={'LOCAL_MAX_SIZE': 2})
+    def test_local_lru_is_bounded(self):
+        cache = UserCache()
+        users = [self.jojo] + [User.objects.create_user(name, f'{name}@example.com', PASSWORD) for name in ('mojo', 'kojo')]
+        for user in users:
+            cache.get_user(user.pk)
+        cache.get_user(users[1].pk)
+        self.assertEqual(cache.stats()['local_size'], 2)
+        self.assertEqual(list(cache._local), [cache.key(users[2].pk), cache.key(users[1].pk)])
+
+    def test_saves_invalidate(self):
+        user_cache.get_user(self.jojo.pk)
+        access = self.login('jojo')['access']
+        self.put('/auth/user/', access, {'first_name': 'Jo'})
+        self.assertEqual(user_cache.get_user(self.jojo.pk).first_name, 'Jo')
+
+        self.jojo.refresh_from_db()
+        self.jojo.set_password('weewoo12345!')
+        self.jojo.save()
+        self.assertEqual(user_cache.get_values(self.jojo.pk, 'token_version'), (1,))
+
+        self.jojo.delete()
+        self.assertIsNone(user_cache.get_user(self.jojo.pk))
+
+    def test_last_login_flush_invalidates(self):
+        self.assertIsNone(user_cache.get_user(self.jojo.pk).last_login)
+        self.login('jojo')
+        last_logins.flush()
+        self.assertIsNotNone(user_cache.get_user(self.jojo.pk).last_login)
+
+    def test_get_many_values(self):
+        mojo = User.objects.create_user('mojo', 'mojo@example.com', PASSWORD)
+        user_cache.get_user(self.jojo.pk)
+        self.assertEqual(user_cache.get_many_values([self.jojo.pk, mojo.pk, mojo.pk + 1000], 'username'), {
+            self.jojo.pk: ('jojo',), mojo.pk: ('mojo',), mojo.pk + 1000: None,
+        })
@@ -0,0 +1,72 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib import admin
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..changelist import EstimatedCountPaginator, search_users
+from ..models import User
+from ..sharding import is_sharded
+from .base import PASSWORD, APITestCase
+
+
+class ChangelistTests(APITestCase):
+    """The user list: prefix search, counts that don't scan, keyset pages."""
+
+    def setUp(self):
+        super().setUp()
+        if is_sharded():
+            self.skipTest("The admin only lists the default database's users")
+        now = timezone.now()
+        self.users = [
+            User.objects.create_user(name, f'{name}@example.com', PASSWORD, date_joined=now - timedelta(days=days))
+            for days, name in enumerate(['jojo', 'JoAnne', 'mojo', 'kojo', 'bojo'])
+        ]
+
+    def search(self, term):
+        return sorted(search_users(User.objects.all(), term).values_list('username', flat=True))
+
+    def test_search_by_prefix(self):
+        self.assertEqual(self.search('jo'), ['JoAnne', 'jojo'])
+        self.assertEqual(self.search('JOJO@'), ['jojo'])
+        self.assertEqual(self.search('  '), sorted(user.username for user in self.users))
+        # Substrings need the trigram indexes, i.e. Postgres
+        self.assertEqual(self.search('ojo'), [])
+
+    def test_unfiltered_count_is_estimated(self):
+        with mock.patch('authentication.changelist.estimated_count', return_value=5_000_000):
+            paginator = EstimatedCountPaginator(User.objects.order_by('pk'), 2)
+            self.assertEqual(paginator.count, 5_000_000)
+        self.assertTrue(paginator.estimated)
+
+        with mock.patch('authentication.changelist.estimated_count', return_value=None):
+            self.assertEqual(EstimatedCountPaginator(User.objects.order_by('pk'), 2).count, 5)
+
+    @override_settings(ADMIN_CHANGELIST={'COUNT_LIMIT': 2})
+    def test_filtered_count_is_capped(self):
+        paginator = EstimatedCountPaginator(User.objects.filter(is_active=True).order_by('pk'), 2)
+        self.assertEqual(paginator.count, 2)
+        self.assertTrue(paginator.capped)
+        self.assertEqual(EstimatedCountPaginator(User.objects.filter(username='jojo').order_by('pk'), 2).count, 1)
+
+    def test_keyset_pages(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', PASSWORD,
+                                                              date_joined=timezone.now() - timedelta(days=10)))
+        self.enterContext(mock.patch.object(admin.site._registry[User], 'list_per_page', 2))
+
+        pages, query = [], ''
+        with CaptureQueriesContext(connection) as queries:
+            while query is not None:
+                response = self.client.get(f'/admin/authentication/user/{query}')
+                self.assertEqual(response.status_code, 200)
+                changelist = response.context['cl']
+                pages.append([user.username for user in changelist.result_list])
+                query = changelist.next_page_url
+        self.assertEqual(pages, [['jojo', 'JoAnne'], ['mojo', 'kojo'], ['bojo', 'admin']])
+        self.assertFalse([query for query in queries.captured_queries if 'OFFSET' in query['sql']])
+
+        response = self.client.get('/admin/authentication/user/?after=nonsense')
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,46 @@
+from ..models import User
+from ..tokens import RefreshToken
+from .base import PASSWORD, APITestCase
+
+
+class TokenFamilyTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.jojo = User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+
+    def test_refresh_rotates_within_the_family(self):
+        first = self.login('jojo')['refresh']
+        response = self.refresh(first)
+        self.assertEqual(response.status_code, 200, response.content)
+        second = response.json()['refresh']
+
+        self.assertEqual(RefreshToken(first)['fam'], RefreshToken(second)['fam'])
+        self.assertEqual(RefreshToken(second)['gen'], RefreshToken(first)['gen'] + 1)
+        self.assertEqual(self.refresh(second).status_code, 200)
+        self.assertEqual(self.families(self.jojo).count(), 1)
+
+    def test_reused_refresh_token_ends_the_family(self):
+        first = self.login('jojo')['refresh']
+        second = self.refresh(first).json()['refresh']
+
+        with self.assertLogs('authentication.families', 'WARNING'):
+            self.assertEqual(self.refresh(first).status_code, 401)
+        # Whoever held the newer token loses the session too
+        self.assertEqual(self.refresh(second).status_code, 401)
+        self.assertFalse(self.families(self.jojo).exists())
+
+    def test_reuse_only_ends_that_family(self):
+        stolen = self.login('jojo')['refresh']
+        self.refresh(stolen)
+        other = self.login('jojo')['refresh']
+
+        with self.assertLogs('authentication.families', 'WARNING'):
+            self.refresh(stolen)
+        self.assertEqual(self.refresh(other).status_code, 200)
+
+    def test_logout_ends_the_family(self):
+        tokens = self.login('jojo')
+        response = self.post('/auth/logout/', tokens['access'], {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
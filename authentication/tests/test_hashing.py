@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.test import override_settings
+
+from .. import hashing
+from ..hashing import HasherBusy, HasherPool
+from ..models import User
+from .base import PASSWORD, APITestCase
+
+
+@override_settings(PASSWORD_HASHER_POOL={'WORKERS': 0, 'MAX_PENDING': 2})
+class HasherPoolTests(APITestCase):
+    """A full hasher pool sheds hashing requests with a 503, everything else carries on."""
+
+    def setUp(self):
+        super().setUp()
+        self.jojo = User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+        self.pool = self.enterContext(mock.patch.object(hashing, 'pool', HasherPool()))
+
+    def saturate(self):
+        for _ in range(self.pool.config['MAX_PENDING']):
+            self.pool._reserve_slot()
+        self.addCleanup(self.drain)
+
+    def drain(self):
+        while self.pool._pending:
+            self.pool._release_slot()
+
+    def test_hash_and_verify(self):
+        encoded = hashing.make_password(PASSWORD)
+        self.assertTrue(hashing.check_password(PASSWORD, encoded))
+        self.assertFalse(hashing.check_password('not it', encoded))
+        self.assertEqual(self.pool.stats()['pending'], 0)
+        self.assertEqual(self.pool.stats()['submitted'], 3)
+
+    async def test_async_hash_and_verify(self):
+        encoded = await hashing.amake_password(PASSWORD)
+        self.assertTrue(await hashing.acheck_password(PASSWORD, encoded))
+        self.assertEqual(self.pool.stats()['pending'], 0)
+
+    def test_full_pool_is_shed(self):
+        self.saturate()
+        with self.assertRaises(HasherBusy):
+            hashing.make_password(PASSWORD)
+        self.assertEqual(self.pool.stats()['rejected'], 1)
+
+    def test_logins_get_a_503_while_cheap_requests_go_through(self):
+        access = self.login('jojo')['access']
+        self.saturate()
+
+        with self.assertLogs('django.request', 'ERROR'):
+            response = self.client.post('/auth/login/', {'login': 'jojo', 'password': PASSWORD},
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers['Retry-After'], '1')
+            self.assertEqual(self.register('mojo', 'mojo@example.com').status_code, 503)
+
+        self.assertEqual(self.profile(access).status_code, 200)
+        self.assertEqual(self.client.get('/health/live/').status_code, 200)
+
+    def test_slots_come_back(self):
+        self.saturate()
+        self.drain()
+        self.assertEqual(self.login('jojo')['user']['username'], 'jojo')
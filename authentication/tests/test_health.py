@@ -0,0 +1,52 @@
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS
+from django.test import override_settings
+
+from .. import health as health_checks
+from ..health import HealthChecker
+from .base import APITestCase
+
+
+@override_settings(HEALTH_CHECKS={'CACHE_TTL': 60})
+class HealthCheckTests(APITestCase):
+    """Liveness checks nothing, readiness checks for real - once per CACHE_TTL."""
+
+    def setUp(self):
+        super().setUp()
+        self.health = self.enterContext(mock.patch('authentication.views.health', HealthChecker()))
+
+    def test_liveness(self):
+        for url in ('/health/live/', '/'):
+            with self.subTest(url=url), self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertEqual(response.json(), {'status': 'alive'})
+            self.assertNotIn('sessionid', response.cookies)
+            self.assertIn('no-store', response.headers['Cache-Control'])
+
+    def test_readiness(self):
+        response = self.client.get('/health/ready/')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['status'], body['database'], body['cached']), ('healthy', 'connected', False))
+        self.assertEqual(set(body['checks']), {'database', 'hasher_pool', 'signing_key'})
+        self.assertTrue(all(check['ok'] for check in body['checks'].values()))
+        self.assertEqual(body['latency']['database']['runs'], 1)
+
+    def test_probes_are_answered_from_the_cache(self):
+        self.client.get('/health/')
+        with self.assertNumQueries(0, using=DEFAULT_DB_ALIAS):
+            body = self.client.get('/health/ready/').json()
+        self.assertTrue(body['cached'])
+        self.assertEqual(self.health.runs, 1)
+
+    def test_failing_check(self):
+        broken = {**health_checks.CHECKS, 'database': mock.Mock(side_effect=RuntimeError('down'))}
+        with mock.patch.object(health_checks, 'CHECKS', broken), self.assertLogs(level='ERROR') as logs:
+            response = self.client.get('/health/ready/')
+        self.assertEqual({record.name for record in logs.records}, {'authentication.health', 'django.request'})
+        self.assertEqual(response.status_code, 503)
+        body = response.json()
+        self.assertEqual((body['status'], body['database']), ('unhealthy', 'unavailable'))
+        self.assertEqual(body['checks']['database']['error'], 'check failed')
+        self.assertNotIn('down', response.content.decode())
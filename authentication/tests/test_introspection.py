@@ -0,0 +1,72 @@
+from contextlib import ExitStack
+
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..models import User
+from ..sharding import group_by_db
+from .base import PASSWORD, APITestCase
+
+
+class BatchVerifyTests(APITestCase):
+    """/auth/token/verify/batch/ - one result per token, one query for revocations and one for users."""
+
+    def setUp(self):
+        super().setUp()
+        self.jojo = User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+        self.mojo = User.objects.create_user('mojo', 'mojo@example.com', PASSWORD)
+
+    def verify(self, tokens):
+        return self.client.post('/auth/token/verify/batch/', {'tokens': tokens}, content_type='application/json')
+
+    def results(self, tokens):
+        response = self.verify(tokens)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['results']
+
+    def test_results_come_back_in_order(self):
+        jojo, mojo = self.login('jojo'), self.login('mojo')
+        results = self.results([jojo['access'], 'garbage', mojo['refresh'], jojo['access']])
+
+        self.assertEqual([result['valid'] for result in results], [True, False, True, True])
+        self.assertEqual(results[0], results[3])
+        self.assertEqual(results[0]['claims']['username'], 'jojo')
+        self.assertEqual(results[0]['token_type'], 'access')
+        self.assertIs(results[0]['user_active'], True)
+        self.assertIs(results[0]['revoked'], False)
+        self.assertGreater(results[0]['expires_in'], 0)
+        self.assertEqual(results[1], {'valid': False, 'error': results[1]['error'], 'code': 'token_not_valid'})
+        self.assertEqual(results[2]['token_type'], 'refresh')
+
+    def test_revoked_and_inactive(self):
+        jojo, mojo = self.login('jojo'), self.login('mojo')
+        self.post('/auth/logout/', jojo['access'], {'refresh': jojo['refresh']})
+        self.mojo.is_active = False
+        self.mojo.save()
+
+        revoked, inactive = self.results([jojo['access'], mojo['access']])
+        self.assertEqual((revoked['valid'], revoked['revoked']), (False, True))
+        self.assertEqual((inactive['valid'], inactive['user_active'], inactive['code']), (False, False, 'user_inactive'))
+
+    def test_logout_all_revokes_by_epoch(self):
+        tokens = self.login('jojo')
+        self.post('/auth/logout/all/', tokens['access'])
+        [result] = self.results([tokens['refresh']])
+        self.assertEqual((result['valid'], result['revoked'], result['code']), (False, True, 'token_revoked'))
+
+    def test_a_batch_costs_two_queries(self):
+        # Sharded users take one query per shard
+        tokens = [self.login(name)[kind] for name in ('jojo', 'mojo') for kind in ('access', 'refresh')]
+        self.flush_buffers()
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in self.databases]
+            self.assertTrue(all(result['valid'] for result in self.results(tokens * 5)))
+        shards = len(group_by_db([self.jojo.pk, self.mojo.pk]))
+        self.assertLessEqual(sum(len(queries) for queries in captured), 1 + shards)
+
+    @override_settings(TOKEN_INTROSPECTION={'MAX_TOKENS': 2})
+    def test_batch_size_is_limited(self):
+        self.assertEqual(self.verify(['a', 'b', 'c']).status_code, 400)
+        self.assertEqual(self.verify([]).status_code, 400)
+        self.assertEqual(self.verify('a').status_code, 400)
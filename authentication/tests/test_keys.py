@@ -0,0 +1,107 @@
+import os
+import tempfile
+from datetime import timedelta
+
+import jwt
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.state import token_backend as legacy_backend
+
+from ..keys import keyring
+from ..models import User
+from .base import PASSWORD, APITestCase
+
+
+class SigningKeyTests(APITestCase):
+    """Signing with a keyring of its own, in a directory that starts out empty."""
+
+    def setUp(self):
+        super().setUp()
+        self.key_dir = self.enterContext(tempfile.TemporaryDirectory())
+        # Runs after override_settings is undone, so the next test finds the suite's key again
+        self.addCleanup(keyring.reload)
+        self.enterContext(override_settings(JWT_KEYS={
+            **settings.JWT_KEYS, 'KEY_DIR': self.key_dir, 'CREATE_FIRST_KEY': False,
+        }))
+        User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+
+    def rotate(self, *args):
+        call_command('rotate_signing_key', *args, stdout=open(os.devnull, 'w'))
+        return keyring.reload()
+
+    def jwks(self):
+        response = self.client.get('/auth/.well-known/jwks.json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['keys']
+
+    def test_no_key_is_an_error(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'rotate_signing_key --now'):
+            keyring.reload()
+        self.assertEqual(os.listdir(self.key_dir), [])
+
+    def test_tokens_verify_with_the_published_key(self):
+        [key] = self.rotate('--now')
+        access = self.login('jojo')['access']
+        self.assertEqual(jwt.get_unverified_header(access)['kid'], key.kid)
+
+        [jwk] = self.jwks()
+        public_key = jwt.PyJWK(jwk).key
+        self.assertEqual(jwt.decode(access, public_key, algorithms=[jwk['alg']])['username'], 'jojo')
+
+    def test_rotation_publishes_ahead(self):
+        [old] = self.rotate('--now')
+        before = self.login('jojo')['access']
+        ahead = self.rotate()[-1]
+
+        # Consumers learn the new key now, but it doesn't sign before PUBLISH_AHEAD is up
+        self.assertEqual([jwk['kid'] for jwk in self.jwks()], [old.kid, ahead.kid])
+        self.assertEqual(jwt.get_unverified_header(self.login('jojo')['access'])['kid'], old.kid)
+        self.assertEqual(self.profile(before).status_code, 200)
+
+    def test_keys_are_pruned_once_their_tokens_expired(self):
+        now = timezone.now()
+        oldest, old = keyring.generate(now - timedelta(days=60)), keyring.generate(now - timedelta(days=30))
+        keyring.write(oldest)
+        keyring.write(old)
+        # old took over from oldest long enough ago, but old's own tokens may still be around
+        self.assertEqual([key.kid for key in self.rotate('--now')][:1], [old.kid])
+
+    def test_tokens_without_kid_are_rejected(self):
+        self.rotate('--now')
+        payload = jwt.decode(self.login('jojo')['access'], options={'verify_signature': False})
+        self.assertEqual(self.profile(legacy_backend.encode(payload)).status_code, 401)
+
+
+class TokenVerifyTests(APITestCase):
+    """/auth/token/verify/ turns down whatever authentication would turn down."""
+
+    def setUp(self):
+        super().setUp()
+        self.jojo = User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+
+    def verify(self, token):
+        return self.client.post('/auth/token/verify/', {'token': token}, content_type='application/json')
+
+    def test_current_tokens_verify(self):
+        tokens = self.login('jojo')
+        self.assertEqual(self.verify(tokens['access']).status_code, 200)
+        self.assertEqual(self.verify(tokens['refresh']).status_code, 200)
+
+    def test_logout_all(self):
+        tokens = self.login('jojo')
+        self.assertEqual(self.post('/auth/logout/all/', tokens['access']).status_code, 200)
+        self.assertEqual(self.verify(tokens['access']).status_code, 401)
+        self.assertEqual(self.verify(tokens['refresh']).status_code, 401)
+
+    def test_deactivated_user(self):
+        access = self.login('jojo')['access']
+        self.jojo.is_active = False
+        self.jojo.save()
+        self.assertEqual(self.verify(access).status_code, 401)
+
+    def test_forged_signature(self):
+        access = self.login('jojo')['access']
+        self.assertEqual(self.verify(access[:-4] + 'AAAA').status_code, 401)
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.contrib.sessions.models import Session
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..last_login import last_logins
+from ..models import User
+from .base import PASSWORD, APITestCase
+
+
+class LastLoginTests(APITestCase):
+    """Logins write no session and no last_login UPDATE - the buffer writes them later, in bulk."""
+
+    def setUp(self):
+        super().setUp()
+        self.jojo = User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+        self.mojo = User.objects.create_user('mojo', 'mojo@example.com', PASSWORD)
+
+    def test_login_writes_nothing_to_auth_user(self):
+        with CaptureQueriesContext(connections[self.jojo._state.db]) as queries:
+            response = self.client.post('/auth/login/', {'login': 'jojo', 'password': PASSWORD},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE "auth_user"')]
+        self.assertEqual(updates, [])
+        self.assertIsNotNone(response.json()['user']['last_login'])
+        self.assertNotIn('sessionid', response.cookies)
+        self.assertFalse(Session.objects.exists())
+        self.assertIsNone(self.user('jojo').last_login)
+
+    def test_flush_writes_every_pending_login(self):
+        self.login('jojo')
+        self.login('mojo')
+        self.assertEqual(last_logins.stats()['pending'], 2)
+        last_logins.flush()
+        self.assertEqual(last_logins.stats()['pending'], 0)
+        self.assertIsNotNone(self.user('jojo').last_login)
+        self.assertIsNotNone(self.user('mojo').last_login)
+
+    def test_last_login_never_moves_backwards(self):
+        later = timezone.now()
+        User.objects.using(self.jojo._state.db).filter(pk=self.jojo.pk).update(last_login=later)
+        last_logins.record(self.jojo, later - timedelta(minutes=5))
+        last_logins.flush()
+        self.assertEqual(self.user('jojo').last_login, later)
+
+    def test_newest_login_wins(self):
+        first = timezone.now() - timedelta(minutes=5)
+        last_logins.record(self.jojo, first)
+        last_logins.record(self.jojo, first + timedelta(minutes=1))
+        last_logins.flush()
+        self.assertEqual(self.user('jojo').last_login, first + timedelta(minutes=1))
+
+    def test_session_logins_are_buffered_too(self):
+        self.assertTrue(self.client.login(username='jojo', password=PASSWORD))
+        self.assertIsNone(self.user('jojo').last_login)
+        last_logins.flush()
+        self.assertIsNotNone(self.user('jojo').last_login)
@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .. import logs
+from ..logs import QueueLogHandler
+
+
+class QueueLogHandlerTests(SimpleTestCase):
+    """Records are only queued on the logging thread; flush() writes them as JSON lines."""
+
+    def setUp(self):
+        self.filename = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'test.log')
+        self.logger = logging.getLogger('authentication.tests.logs')
+        self.logger.propagate = False
+        self.addCleanup(setattr, self.logger, 'propagate', True)
+
+    def handler(self, **options):
+        handler = QueueLogHandler(self.filename, background=False, **options)
+        handler.name = self.id()
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        self.addCleanup(handler.close)
+        return handler
+
+    def lines(self):
+        with open(self.filename, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_json_lines(self):
+        handler = self.handler()
+        self.logger.warning('Hello %s', 'jojo', extra={'user_id': 42})
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            self.logger.exception('Oops')
+        self.assertFalse(os.path.exists(self.filename))
+
+        handler.flush()
+        hello, oops = self.lines()
+        self.assertEqual(
+            {key: hello[key] for key in ('level', 'logger', 'message', 'user_id')},
+            {'level': 'WARNING', 'logger': 'authentication.tests.logs', 'message': 'Hello jojo', 'user_id': 42},
+        )
+        self.assertIn('ZeroDivisionError', oops['exc_info'])
+        self.assertEqual(handler.stats(), {
+            'queued': 2, 'waiting': 0, 'dropped': 0, 'sampled_out': 0, 'written': 2, 'writes': 1,
+        })
+
+    def test_a_full_queue_drops(self):
+        handler = self.handler(queue_size=2)
+        for number in range(5):
+            self.logger.warning('Record %d', number)
+        handler.flush()
+        self.assertEqual([line['message'] for line in self.lines()], ['Record 0', 'Record 1'])
+        self.assertEqual((handler.stats()['queued'], handler.stats()['dropped']), (2, 3))
+
+    def test_sampling(self):
+        handler = self.handler(sampling={'INFO': 0.25})
+        self.logger.setLevel(logging.INFO)
+        self.addCleanup(self.logger.setLevel, logging.NOTSET)
+        with mock.patch('random.random', side_effect=[0.1, 0.5, 0.9]):
+            for number in range(3):
+                self.logger.info('Info %d', number)
+        self.logger.warning('Always kept')
+        handler.flush()
+        self.assertEqual([(line['message'], line.get('sample_rate')) for line in self.lines()],
+                         [('Info 0', 0.25), ('Always kept', None)])
+        self.assertEqual(handler.stats()['sampled_out'], 2)
+
+    def test_close_writes_what_is_left(self):
+        handler = self.handler()
+        self.logger.error('Last words')
+        handler.close()
+        self.assertEqual(self.lines()[0]['message'], 'Last words')
+
+    def test_stats_by_handler_name(self):
+        handler = self.handler()
+        self.logger.warning('Counted')
+        self.assertEqual(logs.stats()[self.id()], handler.stats())
+        self.assertEqual(handler.stats()['waiting'], 1)
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.test import override_settings
+
+from ..models import User
+from .base import PASSWORD, APITestCase
+
+
+@override_settings(METRICS={**settings.METRICS, 'AUTH_TOKEN': 's3cret', 'MULTIPROCESS_DIR': None})
+class MetricsTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+
+    def scrape(self, token='s3cret'):
+        return self.client.get('/metrics', headers={'Authorization': f'Bearer {token}'})
+
+    def test_scrapers_need_the_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.scrape('guess').status_code, 401)
+        with override_settings(METRICS={**settings.METRICS, 'AUTH_TOKEN': None}):
+            self.assertEqual(self.scrape().status_code, 403)
+
+    def test_requests_and_phases_are_observed(self):
+        self.login('jojo')
+        body = self.scrape().content.decode()
+        self.assertIn('auth_http_request_duration_seconds_count{view="login",method="POST",status="200"}', body)
+        self.assertIn('auth_request_phase_duration_seconds_count{view="login",phase="hash"}', body)
+        self.assertIn('auth_http_request_db_queries_bucket{view="login",le=', body)
+
+    def test_component_stats_are_gauges(self):
+        self.login('jojo')
+        body = self.scrape().content.decode()
+        self.assertIn('# TYPE auth_component_stat gauge', body)
+        self.assertIn('auth_component_stat{component="audit",stat="recorded"}', body)
+        self.assertIn('auth_component_stat{component="revocations",stat="ready"}', body)
+
+    def test_status_does_not_publish_them(self):
+        response = self.client.get('/auth/status/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'status', 'version', 'endpoints'})
+
+    def test_server_timing_is_off_by_default(self):
+        tokens = self.login('jojo')
+        self.assertNotIn('Server-Timing', self.profile(tokens['access']))
+        with override_settings(METRICS={**settings.METRICS, 'SERVER_TIMING': True}):
+            response = self.profile(tokens['access'])
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ quer(y|ies)".*total;dur=')
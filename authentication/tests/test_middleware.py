@@ -0,0 +1,40 @@
+from .base import APITestCase
+
+
+class MiddlewareProfileTests(APITestCase):
+    """The admin gets the full stack, the API its lean profile - over WSGI and ASGI."""
+
+    def assertFullStack(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('csrftoken', response.cookies)
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+
+    def assertLean(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('csrftoken', response.cookies)
+        self.assertNotIn('X-Frame-Options', response)
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+
+    def test_admin(self):
+        self.assertFullStack(self.client.get('/admin/login/'))
+
+    async def test_admin_async(self):
+        self.assertFullStack(await self.async_client.get('/admin/login/'))
+
+    def test_api(self):
+        response = self.client.get('/auth/.well-known/jwks.json')
+        self.assertLean(response)
+        # SecurityMiddleware comes before PrefixMiddleware, so every path gets it
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+
+    async def test_api_async(self):
+        self.assertLean(await self.async_client.get('/auth/.well-known/jwks.json'))
+
+    def test_probes(self):
+        self.assertLean(self.client.get('/health/live/'))
+
+    def test_api_csrf_is_left_to_drf(self):
+        # No CsrfViewMiddleware on the API - a cookie-less POST gets as far as the view
+        self.client = self.client_class(enforce_csrf_checks=True)
+        response = self.client.post('/auth/login/', {'login': 'nobody', 'password': 'x'}, content_type='application/json')
+        self.assertNotEqual(response.status_code, 403)
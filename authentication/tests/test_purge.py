@@ -0,0 +1,66 @@
+import os
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.utils import timezone
+
+from ..models import PurgeCheckpoint, RevokedToken, TokenFamily, User
+from ..purge import purge, purge_table
+from ..sharding import user_db
+from .base import PASSWORD, APITestCase
+
+
+class PurgeTests(APITestCase):
+    """Expired rows go in small batches, resumably - unexpired ones stay."""
+
+    def setUp(self):
+        super().setUp()
+        self.jojo = User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+        now = timezone.now()
+        self.expired = [now - timedelta(days=days) for days in range(1, 6)]
+        self.current = now + timedelta(days=1)
+        for number, expires_at in enumerate([*self.expired, self.current]):
+            RevokedToken.objects.create(jti=f'jti-{number}', expires_at=expires_at)
+            Session.objects.create(session_key=f'session-{number}', session_data='', expire_date=expires_at)
+            TokenFamily.objects.using(user_db(self.jojo.pk)).create(user=self.jojo, expires_at=expires_at)
+
+    def checkpoint(self, name):
+        return PurgeCheckpoint.objects.get(name=name)
+
+    def test_purge_everything(self):
+        results = purge(batch_size=2, sleep=0)
+        self.assertEqual({result['target'] for result in results}, {'revoked_tokens', 'token_families', 'sessions'})
+        self.assertTrue(all(result['complete'] for result in results))
+        self.assertEqual(sum(result['deleted'] for result in results), 15)
+
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['jti-5'])
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['session-5'])
+        self.assertEqual(self.families(self.jojo).get().expires_at, self.current)
+
+    def test_batches(self):
+        result = purge_table('revoked_tokens', batch_size=2, sleep=0)
+        self.assertEqual((result['deleted'], result['batches'], result['complete']), (5, 3, True))
+        self.assertGreater(result['rows_per_second'], 0)
+        self.assertIsNone(self.checkpoint('revoked_tokens:default').position)
+        self.assertEqual(self.checkpoint('revoked_tokens:default').deleted, 5)
+
+    def test_an_interrupted_run_resumes_from_its_checkpoint(self):
+        result = purge_table('revoked_tokens', batch_size=2, sleep=0, deadline=time.monotonic())
+        self.assertEqual((result['deleted'], result['complete']), (2, False))
+        # Oldest first - the checkpoint is the newest expiry deleted so far
+        self.assertEqual(self.checkpoint('revoked_tokens:default').position, self.expired[3])
+
+        result = purge_table('revoked_tokens', batch_size=2, sleep=0)
+        self.assertEqual((result['deleted'], result['complete']), (3, True))
+        self.assertIsNone(self.checkpoint('revoked_tokens:default').position)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('purge_expired', '--only', 'sessions', '--batch-size', '10', '--sleep', '0', stdout=out)
+        self.assertIn('sessions on default: 5 rows in 1 batches', out.getvalue())
+        self.assertEqual(RevokedToken.objects.count(), 6)
+        call_command('purge_expired', '--only', 'sessions', stdout=open(os.devnull, 'w'))
+        self.assertEqual(Session.objects.count(), 1)
@@ -0,0 +1,41 @@
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase
+from rest_framework import renderers
+
+from ..renderers import FastJSONRenderer, orjson, render_json
+
+DATA = {
+    'username': 'jojo',
+    'bio': 'line\u2028separator\u2029paragraph, café',
+    'joined': datetime(2024, 5, 17, 12, 30, 15, 123456, tzinfo=timezone.utc),
+    'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'balance': Decimal('1.50'),
+    'counts': {1: 'one', 'two': [None, True, 2.5]},
+}
+
+
+class RenderingTests(SimpleTestCase):
+    """Same bytes as DRF's JSONRenderer, with orjson and without it."""
+
+    def expected(self, data=DATA, media_type='application/json'):
+        return renderers.JSONRenderer().render(data, media_type)
+
+    def check(self):
+        self.assertEqual(render_json(DATA), self.expected())
+        self.assertEqual(FastJSONRenderer().render(DATA, 'application/json'), self.expected())
+        indented = 'application/json; indent=4'
+        self.assertEqual(FastJSONRenderer().render(DATA, indented), self.expected(media_type=indented))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_with_orjson(self):
+        if orjson is None:
+            self.skipTest('orjson is not installed')
+        self.check()
+
+    def test_without_orjson(self):
+        with mock.patch('authentication.renderers.orjson', None):
+            self.check()
@@ -0,0 +1,32 @@
+from ..models import RevokedToken, User
+from ..revocation import revocations
+from ..tokens import RefreshToken
+from .base import PASSWORD, APITestCase
+
+
+class RevocationTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+
+    def test_logout_revokes_the_access_token_by_jti(self):
+        tokens, other = self.login('jojo'), self.login('jojo')
+        self.post('/auth/logout/', tokens['access'], {'refresh': tokens['refresh']})
+
+        self.assertEqual(self.profile(tokens['access']).status_code, 401)
+        # Only that session - the token_version is untouched
+        self.assertEqual(self.profile(other['access']).status_code, 200)
+
+    def test_revoked_jtis_reach_the_database(self):
+        token = RefreshToken(self.login('jojo')['refresh'])
+        token.revoke()
+        self.assertTrue(revocations.is_revoked(token['jti']))
+
+        revocations.flush()
+        self.assertTrue(RevokedToken.objects.filter(jti=token['jti']).exists())
+
+    def test_revoked_refresh_token_is_rejected(self):
+        refresh = self.login('jojo')['refresh']
+        RefreshToken(refresh).revoke()
+        self.assertEqual(self.refresh(refresh).status_code, 401)
@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test import override_settings
+
+from ..models import RevokedToken, User
+from ..routers import PrimaryReplicaRouter, is_pinned, read_replica, read_user
+from .base import PASSWORD, APITestCase
+
+
+class SQLiteTuningTests(APITestCase):
+    """Every SQLite connection comes up with the PRAGMAs from SQLITE_OPTIONS."""
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            return cursor.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def test_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('temp_store'), 2)  # MEMORY
+        # WAL needs a file - the in-memory test database reports "memory"
+        self.assertIn(self.pragma('journal_mode'), ('wal', 'memory'))
+
+
+class ReplicaRoutingTests(APITestCase):
+    """Which reads go to the replica, with a replica configured (nothing here queries it)."""
+
+    def setUp(self):
+        super().setUp()
+        self.jojo = User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+        self.enterContext(mock.patch('authentication.routers.replica_alias', return_value='replica'))
+        self.router = PrimaryReplicaRouter()
+
+    def test_only_opted_in_reads_use_the_replica(self):
+        self.assertEqual(read_replica(RevokedToken).all().db, 'replica')
+        self.assertEqual(RevokedToken.objects.all().db, DEFAULT_DB_ALIAS)
+        self.assertEqual(self.router.db_for_read(RevokedToken, replica=True), 'replica')
+        self.assertEqual(self.router.db_for_read(RevokedToken), DEFAULT_DB_ALIAS)
+
+    def test_writes_and_migrations_stay_on_the_primary(self):
+        self.assertEqual(self.router.db_for_write(RevokedToken, replica=True), DEFAULT_DB_ALIAS)
+        self.assertIs(self.router.allow_migrate('replica', 'authentication'), False)
+        self.assertIsNone(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'authentication'))
+
+    def test_written_users_are_read_from_the_primary(self):
+        mojo = User.objects.create_user('mojo', 'mojo@example.com', PASSWORD)
+        self.assertEqual(read_user(User, self.jojo.pk).all().db, 'replica')
+
+        self.jojo.first_name = 'Jo'
+        self.jojo.save()
+        self.assertTrue(is_pinned(self.jojo.pk))
+        self.assertEqual(read_user(User, self.jojo.pk, mojo.pk).all().db, DEFAULT_DB_ALIAS)
+
+
+@override_settings(DATABASE_REPLICA={'ALIAS': 'no-such-database'})
+class NoReplicaTests(APITestCase):
+
+    def test_everything_on_the_primary(self):
+        jojo = User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+        self.assertFalse(is_pinned(jojo.pk))
+        self.assertEqual(read_replica(RevokedToken).all().db, DEFAULT_DB_ALIAS)
+        self.assertIsNone(PrimaryReplicaRouter().db_for_read(RevokedToken, replica=True))
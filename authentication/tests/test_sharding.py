@@ -0,0 +1,86 @@
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import override_settings
+
+from ..models import EmailClaim, User
+from ..sharding import email_owners, is_sharded, login_db, user_db
+from .base import APITestCase
+
+
+class EmailClaimTests(APITestCase):
+    """
+    Emails with sharded users (sharding.py).
+
+    Runs on the real shards when AUTH_DB_SHARDS is set, e.g.
+
+        AUTH_DB_SHARDS=shard1.sqlite3,shard2.sqlite3 python manage.py test authentication
+
+    and otherwise with 'default' standing in for two shards, which still goes
+    through every claim and release, just not across databases.
+    """
+
+    def setUp(self):
+        super().setUp()
+        if not is_sharded():
+            self.enterContext(override_settings(USER_SHARDS={'DATABASES': ['default', 'default']}))
+
+    def claims(self, email):
+        return list(EmailClaim.objects.using(login_db(email)).filter(email=email.lower()).values_list('user_id', flat=True))
+
+    def test_registering_claims_the_email(self):
+        self.assertEqual(self.register('jojo', 'Jojo@Example.com').status_code, 201)
+        jojo = self.user('jojo')
+        self.assertEqual(user_db(jojo.pk), login_db('jojo'))
+        self.assertEqual(self.claims('jojo@example.com'), [jojo.pk])
+        self.assertEqual(list(email_owners('JOJO@example.com')), [jojo.pk])
+        self.assertEqual(self.login('jojo@EXAMPLE.com')['user']['id'], jojo.pk)
+
+    def test_registering_with_a_claimed_email(self):
+        self.register('jojo', 'jojo@example.com')
+        response = self.register('mojo', 'JOJO@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'email': ['A user with this email already exists.']})
+        # The user row went in first, on its own shard - it has to be gone again
+        self.assertFalse(User.objects.using(login_db('mojo')).filter(username='mojo').exists())
+        self.assertEqual(self.register('mojo', 'mojo@example.com').status_code, 201)
+
+    def test_changing_email_moves_the_claim(self):
+        tokens = self.register('jojo', 'jojo@example.com').json()
+        response = self.client.put('/auth/user/', {'email': 'jojo@new.example.com'}, content_type='application/json',
+                                   headers={'Authorization': f"Bearer {tokens['access']}"})
+        self.assertEqual(response.status_code, 200, response.content)
+
+        jojo = self.user('jojo')
+        self.assertEqual(self.claims('jojo@new.example.com'), [jojo.pk])
+        self.assertEqual(self.claims('jojo@example.com'), [])
+        self.assertEqual(self.login('jojo@new.example.com')['user']['id'], jojo.pk)
+        # The old address is free for somebody else
+        self.assertEqual(self.register('mojo', 'jojo@example.com').status_code, 201)
+
+    def test_changing_to_a_claimed_email_keeps_the_old_claim(self):
+        self.register('jojo', 'jojo@example.com')
+        mojo = self.register('mojo', 'mojo@example.com').json()
+        response = self.client.put('/auth/user/', {'email': 'jojo@example.com'}, content_type='application/json',
+                                   headers={'Authorization': f"Bearer {mojo['access']}"})
+        self.assertEqual(response.status_code, 400)
+
+        mojo_id = self.user('mojo').pk
+        self.assertEqual(self.user('mojo').email, 'mojo@example.com')
+        self.assertEqual(self.claims('mojo@example.com'), [mojo_id])
+        self.assertEqual(self.claims('jojo@example.com'), [self.user('jojo').pk])
+
+    def test_claim_is_released_when_the_update_fails(self):
+        self.register('jojo', 'jojo@example.com')
+        jojo = self.user('jojo')
+        jojo.email = 'jojo@new.example.com'
+        with mock.patch('django.contrib.auth.models.AbstractUser.save', side_effect=IntegrityError('boom')):
+            with self.assertRaises(IntegrityError):
+                jojo.save()
+        self.assertEqual(self.claims('jojo@new.example.com'), [])
+        self.assertEqual(self.claims('jojo@example.com'), [jojo.pk])
+
+    def test_deleting_the_user_releases_the_claim(self):
+        self.register('jojo', 'jojo@example.com')
+        self.user('jojo').delete()
+        self.assertEqual(self.claims('jojo@example.com'), [])
@@ -0,0 +1,50 @@
+from ..models import User
+from .base import PASSWORD, APITestCase
+
+
+class TokenVersionTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.jojo = User.objects.create_user('jojo', 'jojo@example.com', PASSWORD)
+
+    def test_password_change_revokes_every_token(self):
+        here, elsewhere = self.login('jojo'), self.login('jojo@example.com')
+        response = self.post('/auth/change-password/', here['access'], {
+            'current_password': PASSWORD,
+            'new_password': 'weewoo12345!',
+            'new_password_confirm': 'weewoo12345!',
+        })
+        self.assertEqual(response.status_code, 200, response.content)
+
+        for tokens in (here, elsewhere):
+            self.assertEqual(self.profile(tokens['access']).status_code, 401)
+            self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+        fresh = self.login('jojo', 'weewoo12345!')
+        self.assertEqual(self.profile(fresh['access']).status_code, 200)
+
+    def test_logout_all_revokes_every_token(self):
+        here, elsewhere = self.login('jojo'), self.login('jojo')
+        self.assertEqual(self.post('/auth/logout/all/', here['access']).status_code, 200)
+
+        for tokens in (here, elsewhere):
+            self.assertEqual(self.profile(tokens['access']).status_code, 401)
+            self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+        self.assertFalse(self.families(self.jojo).exists())
+
+    def test_other_users_are_left_alone(self):
+        User.objects.create_user('mojo', 'mojo@example.com', PASSWORD)
+        theirs = self.login('mojo')
+        self.post('/auth/logout/all/', self.login('jojo')['access'])
+        self.assertEqual(self.profile(theirs['access']).status_code, 200)
+
+    def test_only_password_and_deactivation_bump_the_version(self):
+        self.jojo.first_name = 'Jo'
+        self.jojo.save()
+        self.assertEqual(self.jojo.token_version, 0)
+        self.jojo.set_password('weewoo12345!')
+        self.jojo.save()
+        self.assertEqual(self.jojo.token_version, 1)
+        self.jojo.is_active = False
+        self.jojo.save()
+        self.assertEqual(self.jojo.token_version, 2)
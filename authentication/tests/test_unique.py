@@ -0,0 +1,86 @@
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from rest_framework import serializers
+
+from ..models import User
+from ..serializers import UserProfileUpdateSerializer, UserRegistrationSerializer, unique_violation_error
+from ..sharding import login_db
+from .base import PASSWORD, APITestCase
+
+
+class UniqueViolationTests(APITestCase):
+    """Taken usernames/emails are left to the unique constraints - the IntegrityError has to come back as a 400."""
+
+    def setUp(self):
+        super().setUp()
+        self.register('jojo', 'jojo@example.com')
+
+    def test_register_with_a_taken_username(self):
+        response = self.register('JoJo', 'other@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'username': ['A user with this username already exists.']})
+
+    def test_register_with_a_taken_email(self):
+        response = self.register('mojo', 'JOJO@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'email': ['A user with this email already exists.']})
+        self.assertFalse(User.objects.using(login_db('mojo')).filter(username='mojo').exists())
+
+    def test_profile_update_to_a_taken_email(self):
+        mojo = self.register('mojo', 'mojo@example.com').json()
+        response = self.client.put('/auth/user/', {'email': 'Jojo@Example.com'}, content_type='application/json',
+                                   headers={'Authorization': f"Bearer {mojo['access']}"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'email': ['A user with this email already exists.']})
+
+    def _racing_update(self):
+        # defer_unique_checks skips the up-front check, like losing the race against another request
+        serializer = UserProfileUpdateSerializer(
+            User.objects.create_user('mojo', 'mojo@example.com', PASSWORD),
+            data={'email': 'JOJO@example.com'},
+            partial=True,
+            context={'defer_unique_checks': True},
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer
+
+    def test_profile_update_losing_the_race(self):
+        serializer = self._racing_update()
+        with self.assertRaises(serializers.ValidationError) as raised:
+            serializer.save()
+        self.assertEqual(raised.exception.detail, {'email': ['A user with this email already exists.']})
+        self.assertEqual(self.user('mojo').email, 'mojo@example.com')
+
+    async def test_async_profile_update_losing_the_race(self):
+        serializer = await sync_to_async(self._racing_update)()
+        with self.assertRaises(serializers.ValidationError) as raised:
+            await serializer.asave()
+        self.assertEqual(raised.exception.detail, {'email': ['A user with this email already exists.']})
+
+    async def test_async_register_with_a_taken_username(self):
+        serializer = UserRegistrationSerializer(data={
+            'username': 'JOJO', 'email': 'mojo@example.com', 'password': PASSWORD, 'password_confirm': PASSWORD,
+        })
+        self.assertTrue(await sync_to_async(serializer.is_valid)(), serializer.errors)
+        with self.assertRaises(serializers.ValidationError) as raised:
+            await serializer.acreate()
+        self.assertEqual(raised.exception.detail, {'username': ['A user with this username already exists.']})
+        # The savepoint kept the test's transaction usable
+        self.assertFalse(await User.objects.using(login_db('JOJO')).filter(email='mojo@example.com').aexists())
+
+    def test_constraint_names_per_database(self):
+        messages = {
+            "UNIQUE constraint failed: index 'auth_user_email_lower_uniq'": 'email',
+            'UNIQUE constraint failed: auth_user.username': 'username',
+            'duplicate key value violates unique constraint "auth_user_username_lower_uniq"': 'username',
+            # MySQL names the duplicate value first, and it may look like a constraint itself
+            "Duplicate entry 'auth_user.username' for key 'auth_user.auth_user_email_lower_uniq'": 'email',
+            'UNIQUE constraint failed: auth_user_email_claim.email': 'email',
+        }
+        for message, field in messages.items():
+            with self.subTest(message):
+                self.assertEqual(list(unique_violation_error(IntegrityError(message)).detail), [field])
+
+    def test_other_integrity_errors_are_not_swallowed(self):
+        self.assertIsNone(unique_violation_error(IntegrityError('FOREIGN KEY constraint failed')))
+        self.assertIsNone(unique_violation_error(IntegrityError('NOT NULL constraint failed: auth_user.email')))
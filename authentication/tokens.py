@@ -0,0 +1,116 @@
+"""
+JWT token classes used everywhere in the app.
+
+Same as SimpleJWT's tokens, plus a few user claims baked into every token so
+most requests can be authenticated without loading the User row at all (see
+authentication.py):
+
+    user_id        - primary key (SimpleJWT's USER_ID_CLAIM)
+    username       - username when the token was issued / last refreshed
+    is_active      - active flag when the token was issued / last refreshed
+    token_version  - User.token_version when the token was issued
+
+Access tokens copy these from their refresh token. Refreshing re-stamps them
+from the current User row, so they never lag behind by more than one refresh.
+
+Single tokens are revoked by jti through the revocation store (revocation.py)
+rather than SimpleJWT's blacklist app. Refresh tokens also belong to a family
+(one per login, see families.py), which is what rotation and logout use.
+
+Tokens are signed with the asymmetric keyring from keys.py (RS256/EdDSA with
+a kid header) unless JWT_KEYS['ALGORITHM'] is HS256.
+"""
+
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import families
+from .keys import get_token_backend
+from .revocation import revocations
+
+USERNAME_CLAIM = 'username'
+IS_ACTIVE_CLAIM = 'is_active'
+VERSION_CLAIM = 'token_version'
+
+
+def user_claims(user):
+    """The claims we put in a token for user."""
+    return {
+        USERNAME_CLAIM: user.get_username(),
+        IS_ACTIVE_CLAIM: user.is_active,
+        VERSION_CLAIM: user.token_version,
+    }
+
+
+def is_current(token, user):
+    """
+    Whether token was issued for the user's current token_version.
+
+    Tokens from before the claim existed count as version 0, so they keep
+    working until the user's version is bumped for the first time.
+    """
+    return token.get(VERSION_CLAIM, 0) == user.token_version
+
+
+class UserClaimsMixin:
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_user_claims(user)
+        return token
+
+    def set_user_claims(self, user):
+        for claim, value in user_claims(user).items():
+            self[claim] = value
+
+
+class RevocableMixin:
+    """revoke()/check_revoked() backed by the revocation store, in place of SimpleJWT's blacklist()."""
+
+    def revoke(self):
+        revocations.revoke_token(self)
+
+    def check_revoked(self):
+        if revocations.is_revoked(self[jwt_settings.JTI_CLAIM]):
+            raise TokenError('Token is revoked')
+
+    async def acheck_revoked(self):
+        if await revocations.ais_revoked(self[jwt_settings.JTI_CLAIM]):
+            raise TokenError('Token is revoked')
+
+
+class KeyringMixin:
+    """Sign and verify with keys.py's backend instead of SimpleJWT's HS256 one."""
+
+    def get_token_backend(self):
+        return get_token_backend()
+
+
+class AccessToken(KeyringMixin, RevocableMixin, UserClaimsMixin, tokens.AccessToken):
+    pass
+
+
+class RefreshToken(KeyringMixin, RevocableMixin, UserClaimsMixin, tokens.RefreshToken):
+    access_token_class = AccessToken
+    # Session bookkeeping, nothing an access token needs to carry
+    no_copy_claims = (*tokens.RefreshToken.no_copy_claims, families.FAMILY_CLAIM, families.GENERATION_CLAIM)
+
+    @classmethod
+    def for_user(cls, user):
+        """A refresh token for user, starting a new token family."""
+        token = super().for_user(user)
+        families.start(token, user)
+        return token
+
+    @classmethod
+    async def afor_user(cls, user):
+        """Async for_user()."""
+        token = super().for_user(user)
+        await families.astart(token, user)
+        return token
+
+
+class UntypedToken(KeyringMixin, RevocableMixin, tokens.UntypedToken):
+    pass
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -8,21 +9,33 @@ from . import views
 
 app_name = 'authentication'
 
+# Under ASGI the hot paths are served by native async views (see async_views.py)
+if settings.ASYNC_API:
+    from . import async_views as api_views
+    token_refresh_view = api_views.TokenRefreshView
+else:
+    api_views = views
+    token_refresh_view = TokenRefreshView
+
 urlpatterns = [
     # Authentication endpoints
-    path('register/', views.UserRegistrationView.as_view(), name='register'),
-    path('login/', views.UserLoginView.as_view(), name='login'),
-    path('logout/', views.LogoutView.as_view(), name='logout'),
+    path('register/', api_views.UserRegistrationView.as_view(), name='register'),
+    path('login/', api_views.UserLoginView.as_view(), name='login'),
+    path('logout/', api_views.LogoutView.as_view(), name='logout'),
+    path('logout/all/', views.LogoutAllView.as_view(), name='logout_all'),
     
     # User profile endpoints
-    path('user/', views.UserProfileView.as_view(), name='user_profile'),
+    path('user/', api_views.UserProfileView.as_view(), name='user_profile'),
     path('change-password/', views.ChangePasswordView.as_view(), name='change_password'),
+    path('availability/', api_views.availability, name='availability'),
     
     # JWT token management
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/refresh/', token_refresh_view.as_view(), name='token_refresh'),
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),
+    path('token/verify/batch/', views.TokenBatchVerifyView.as_view(), name='token_verify_batch'),
+    path('.well-known/jwks.json', views.jwks, name='jwks'),
     
     # Status and health check
     path('status/', views.api_status, name='api_status'),
-]
\ No newline at end of file
+]
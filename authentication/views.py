@@ -1,19 +1,36 @@
+import hmac
+
 from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model
-from django.contrib.auth import login
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
 
 from .serializers import (
     UserRegistrationSerializer, 
     UserLoginSerializer, 
-    UserSerializer,
+    serialize_user,
     UserProfileUpdateSerializer,
-    ChangePasswordSerializer
+    ChangePasswordSerializer,
+    TokenBatchVerifySerializer
 )
+from . import audit, families, logs
+from .availability import availability_index, availability_response, check_availability, throttle
+from .bulk_actions import bulk_jobs
+from .cache import user_cache
+from .health import health
+from .keys import get_config as get_jwt_keys_config, keyring, uses_keyring
+from .last_login import last_logins, logged_in
+from .metrics import exposition, get_config as get_metrics_config, stats_exposition, timed
+from .models import AuthEvent
+from .revocation import revocations
+from .tokens import RefreshToken
 
 User = get_user_model()
 
@@ -40,15 +57,20 @@ class UserRegistrationView(APIView):
         serializer = UserRegistrationSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
+            audit.record(AuthEvent.REGISTER, user.pk, request)
             
             # Generate JWT tokens for the new user
-            refresh = RefreshToken.for_user(user)
+            with timed('tokens'):
+                refresh = RefreshToken.for_user(user)
+                tokens = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+            
+            with timed('serialize'):
+                user_data = serialize_user(user)
             
             return Response({
                 'message': 'User registered successfully',
-                'user': UserSerializer(user).data,
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
+                'user': user_data,
+                **tokens,
             }, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -76,16 +98,21 @@ class UserLoginView(APIView):
             user = serializer.validated_data['user']
             
             # Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
+            with timed('tokens'):
+                refresh = RefreshToken.for_user(user)
+                tokens = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+            
+            # Buffered last_login, and a session only if LOGIN_WRITES['CREATE_SESSION']
+            with timed('session'):
+                logged_in(request, user)
             
-            # Update last login
-            login(request, user)
+            with timed('serialize'):
+                user_data = serialize_user(user)
             
             return Response({
                 'message': 'Login successful',
-                'user': UserSerializer(user).data,
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
+                'user': user_data,
+                **tokens,
             }, status=status.HTTP_200_OK)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -102,8 +129,7 @@ class UserProfileView(APIView):
     
     def get(self, request):
         """Get current user information."""
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data)
+        return Response(serialize_user(request.user))
     
     def put(self, request):
         """Update user profile information."""
@@ -117,7 +143,7 @@ class UserProfileView(APIView):
             serializer.save()
             return Response({
                 'message': 'Profile updated successfully',
-                'user': UserSerializer(request.user).data
+                'user': serialize_user(request.user)
             })
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -144,14 +170,11 @@ class ChangePasswordView(APIView):
         
         if serializer.is_valid():
             serializer.save()
+            audit.record(AuthEvent.PASSWORD_CHANGE, request.user.pk, request)
             
-            # Invalidate all existing tokens for this user
-            # This forces the user to login again with new password and gets new tokens to avoid funny business
-            try:
-                refresh_token = RefreshToken.for_user(request.user)
-                refresh_token.blacklist()
-            except Exception:
-                pass  # Token blacklisting might not be available in everyone's project but it's nice if it is
+            # Changing the password bumped user.token_version, which invalidates all existing
+            # tokens for this user (see tokens.py). This forces the user to login again with
+            # new password and gets new tokens to avoid funny business
             
             return Response({
                 'message': 'Password changed successfully. Please login again.'
@@ -162,7 +185,7 @@ class ChangePasswordView(APIView):
 
 class LogoutView(APIView):
     """
-    Logout user by blacklisting the refresh token.
+    Logout user by revoking the refresh token (and the access token used to call this).
     
     POST /auth/logout/
     {
@@ -175,15 +198,66 @@ class LogoutView(APIView):
         try:
             refresh_token = request.data["refresh"]
             token = RefreshToken(refresh_token)
-            token.blacklist()
-            
-            return Response({
-                'message': 'Logout successful'
-            }, status=status.HTTP_200_OK)
-        except Exception as e:
+        except (KeyError, TypeError, TokenError):  # TypeError: body isn't a JSON object
             return Response({
                 'error': 'Invalid token'
             }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Ends the refresh token's session (families.py). The jti revocations go to the
+        # revocation store, which batches the database writes
+        families.end(token)
+        token.revoke()
+        if request.auth is not None:  # None for session (admin) logins
+            request.auth.revoke()
+        audit.record(AuthEvent.LOGOUT, request.user.pk, request)
+        
+        return Response({
+            'message': 'Logout successful'
+        }, status=status.HTTP_200_OK)
+
+
+class LogoutAllView(APIView):
+    """
+    Logout everywhere: invalidates every access and refresh token of the user,
+    on every device, including the one making this request.
+    
+    POST /auth/logout/all/
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        request.user.revoke_tokens()
+        audit.record(AuthEvent.LOGOUT_ALL, request.user.pk, request)
+        
+        return Response({
+            'message': 'Logged out of all sessions'
+        }, status=status.HTTP_200_OK)
+
+
+class TokenBatchVerifyView(APIView):
+    """
+    Verify many tokens in one request (for gateways and other services).
+    
+    POST /auth/token/verify/batch/
+    {"tokens": ["<token>", ...]}
+    
+    Answers 200 with one result per token, in the same order - validity,
+    claims, expiry and revocation status (see introspection.py). Open to
+    anyone like /auth/token/verify/: it only tells callers what the tokens
+    they already hold say.
+    """
+    authentication_classes = ()
+    permission_classes = [permissions.AllowAny]
+    
+    def post(self, request):
+        serializer = TokenBatchVerifySerializer(data=request.data)
+        
+        if serializer.is_valid():
+            return Response({
+                'results': serializer.get_results()
+            }, status=status.HTTP_200_OK)
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['GET'])
@@ -208,16 +282,122 @@ def api_status(request):
     })
 
 
-# Optional: Health check endpoint for monitoring
-@api_view(['GET'])
-@permission_classes([permissions.AllowAny])
+@require_safe
+def availability(request):
+    """
+    Whether a username and/or email can still be registered.
+    
+    GET /auth/availability/?username=jdoe&email=jdoe@example.com
+    
+    {"username": {"value": "jdoe", "valid": true, "available": false},
+     "email": {"value": "jdoe@example.com", "valid": true, "available": true}}
+    
+    Meant for signup forms checking as the user types, so it's a plain Django
+    view and most answers come from the in-memory index (see availability.py).
+    It's a hint: registration can still lose a race for the same name.
+    Clients get AVAILABILITY['MAX_CHECKS'] checks per WINDOW, then a 429.
+    """
+    throttled = throttle(request)
+    if throttled is not None:
+        return throttled
+    return availability_response(check_availability(request.GET))
+
+
+@require_safe
+def jwks(request):
+    """
+    Public keys for verifying our tokens locally (JSON Web Key Set, RFC 7517).
+    
+    GET /auth/.well-known/jwks.json
+    
+    Plain Django view on purpose - no DRF dispatch, no authentication. Consumers
+    should cache it (see Cache-Control) and only refetch when they meet a kid
+    they don't know yet.
+    """
+    document = keyring.jwks() if uses_keyring() else {'keys': []}
+    etag = quote_etag(','.join(key['kid'] for key in document['keys']))
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(document)
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=get_jwt_keys_config()['JWKS_MAX_AGE'])
+    return response
+
+
+@require_safe
+def metrics(request):
+    """
+    Request and phase histograms in Prometheus' text format (see metrics.py).
+    
+    GET /metrics
+    
+    Plain Django view like jwks. Scrapers have to send METRICS['AUTH_TOKEN']
+    as "Authorization: Bearer <token>" - without one configured it answers
+    403, unless METRICS['PUBLIC'] is on.
+    
+    The counters of the in-process stores and buffers come along as gauges
+    (see component_stats()).
+    """
+    config = get_metrics_config()
+    token = config['AUTH_TOKEN']
+    if token:
+        sent = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(sent.encode(), token.encode()):
+            return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer realm="metrics"'})
+    elif not config['PUBLIC']:
+        return HttpResponse("Set METRICS['AUTH_TOKEN'] (AUTH_METRICS_TOKEN) to scrape /metrics.\n",
+                            status=403, content_type='text/plain')
+    body = exposition() + stats_exposition(component_stats())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def component_stats():
+    """This process' stores and buffers - their sizes and hit/drop counters are for operators only."""
+    return {
+        'user_cache': user_cache.stats(),
+        'revocations': revocations.stats(),
+        'availability': availability_index.stats(),
+        'last_login_writes': last_logins.stats(),
+        'bulk_jobs': bulk_jobs.stats(),
+        'logging': logs.stats(),
+        'audit': audit.audit_log.stats(),
+    }
+
+
+# Health checks for load balancers and orchestrators (see health.py)
+@require_safe
+def liveness(request):
+    """
+    Liveness probe - the process is up and answering. Checks nothing else.
+    
+    GET /health/live/
+    """
+    response = JsonResponse({'status': 'alive'})
+    patch_cache_control(response, no_store=True)
+    return response
+
+
+@require_safe
 def health_check(request):
     """
-    Health check endpoint for monitoring services.
+    Readiness probe - database, hasher pool and signing key all work.
+    
+    GET /health/ready/ (and /health/, which monitors already use)
     
-    GET /health/
+    503 when any check fails. Results are cached for HEALTH_CHECKS['CACHE_TTL']
+    seconds, so probes can be frequent without hammering the database.
     """
-    return Response({
-        'status': 'healthy',
-        'database': 'connected'
-    })
+    result, cached = health.readiness()
+    ready = result['ready']
+    response = JsonResponse({
+        'status': 'healthy' if ready else 'unhealthy',
+        'database': 'connected' if result['checks']['database']['ok'] else 'unavailable',
+        'checks': result['checks'],
+        'checked_at': result['checked_at'],
+        'cached': cached,
+        'age_ms': round(health.age() * 1000, 1),
+        'latency': health.latency_stats(),
+    }, status=200 if ready else 503)
+    patch_cache_control(response, no_store=True)
+    return response
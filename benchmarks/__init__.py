@@ -0,0 +1,9 @@
+"""
+Performance benchmarks for the auth service.
+
+These are not unit tests - each module is a standalone script that spins up
+Django against a throwaway database and prints timings. Run them from the repo
+root, e.g.:
+
+    python -m benchmarks.login_lookup
+"""
@@ -0,0 +1,75 @@
+"""
+WSGI vs. ASGI benchmark at high connection counts.
+
+Starts the service under gunicorn (gthread workers, DRF sync views) and then
+under uvicorn (native async views, see authentication/async_views.py), and drives
+each with the same number of concurrent keep-alive connections hitting the
+authenticated profile endpoint. Prints req/s and latency percentiles per mode.
+
+    pip install gunicorn uvicorn
+    python -m benchmarks.asgi_vs_wsgi --concurrency 1000 --duration 30 --workers 4
+"""
+
+import argparse
+import asyncio
+import resource
+
+from benchmarks.loadgen import Request, request_once, run_load
+from benchmarks.servers import SERVER_PACKAGES, prepare_database, require, running_server
+
+USER = {
+    'username': 'bench_user',
+    'email': 'bench_user@bench.example.com',
+    'password': 'BenchPass123!',
+    'password_confirm': 'BenchPass123!',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--workers', type=int, default=2, help='server worker processes')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--modes', nargs='+', default=['wsgi', 'asgi'], choices=['wsgi', 'asgi'])
+    args = parser.parse_args()
+
+    require(*(SERVER_PACKAGES[mode] for mode in args.modes))
+    raise_fd_limit(args.concurrency)
+    prepare_database()
+
+    results = {}
+    for mode in args.modes:
+        with running_server(mode, args.port, args.workers):
+            results[mode] = asyncio.run(bench(args.port, args.concurrency, args.duration))
+
+    print(f"\n{'mode':<6} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'errors':>8}")
+    for mode, (summary, errors) in results.items():
+        print(f"{mode:<6} {summary['rps']:>10.0f} {summary['p50_ms']:>10.1f} "
+              f"{summary['p95_ms']:>10.1f} {summary['p99_ms']:>10.1f} {errors:>8}")
+
+
+def raise_fd_limit(concurrency):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, max(soft, concurrency * 2 + 256))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+
+async def bench(port, concurrency, duration):
+    host = '127.0.0.1'
+    # Registering twice is fine - the second attempt just 400s and we log in
+    await request_once(host, port, Request('POST', '/auth/register/', USER))
+    login = await request_once(host, port, Request(
+        'POST', '/auth/login/', {'login': USER['username'], 'password': USER['password']}
+    ))
+    token = login.json()['access']
+
+    profile = Request('GET', '/auth/user/', headers={'Authorization': f'Bearer {token}'}, label='profile')
+    result = await run_load(host, port, lambda worker_id: profile, concurrency, duration)
+    summary = result.summary()['profile']
+    non_200 = sum(count for code, count in summary['statuses'].items() if code != 200)
+    return summary, sum(result.errors.values()) + non_200
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Audit trail cost: record() per call, sustained events/s, and login latency with auditing on vs. off.
+
+Three parts, against a file-backed test database so the audit writer thread
+can reach it:
+
+    record      --events calls of audit.record() on one thread - what a view
+                pays per event. No database involved.
+    sustained   --threads threads recording --events events each while the
+                writer inserts them, as fast as they can and then paced at
+                each --rate (events/s over all threads). Reports events/s
+                recorded, rows/s that reached AuthEvent, and how many were
+                dropped because MAX_PENDING filled up.
+    login       --logins POSTs to /auth/login/ through the test client with
+                AUDIT_LOG['ENABLED'] off and as many with it on, alternating
+                (each login records an event).
+
+Passwords use MD5, hashed inline, so the login numbers aren't all PBKDF2.
+
+    python -m benchmarks.audit --events 200000 --threads 8 --rate 20000 50000 --logins 500
+"""
+
+import argparse
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django, summarize, teardown_django, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=200000, help='events per thread')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rate', type=int, nargs='*', default=[20000, 50000], help='paced events/s to try')
+    parser.add_argument('--logins', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django(test_db_file=Path(tempfile.gettempdir()) / 'auth_bench_audit.sqlite3')
+    try:
+        from django.conf import settings
+
+        settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+        settings.PASSWORD_HASHER_POOL = {**getattr(settings, 'PASSWORD_HASHER_POOL', {}), 'WORKERS': 0}
+        record_cost(args.events)
+        for rate in [None, *args.rate]:
+            sustained(args.events, args.threads, rate)
+        login_latency(args.logins)
+    finally:
+        teardown_django()
+
+
+def _reset():
+    """Write out and delete whatever earlier parts left behind."""
+    from authentication.audit import audit_log
+    from authentication.models import AuthEvent
+
+    audit_log.flush()
+    AuthEvent.objects.all().delete()
+
+
+def record_cost(events):
+    from authentication import audit
+    from authentication.models import AuthEvent
+
+    _reset()
+    samples = time_calls(lambda: audit.record(AuthEvent.REFRESH, 42), events)
+    result = summarize(samples)
+    print(f"record    mean {result['mean_us']:.2f}us  p50 {result['p50_us']:.2f}us  p99 {result['p99_us']:.2f}us")
+
+
+def sustained(events, threads, rate=None):
+    from authentication import audit
+    from authentication.audit import audit_log
+    from authentication.models import AuthEvent
+
+    _reset()
+    before = audit_log.stats()
+    start = threading.Barrier(threads + 1)
+
+    def worker(n):
+        start.wait()
+        began = time.perf_counter()
+        for i in range(events):
+            audit.record(AuthEvent.LOGIN, n * events + i)
+            if rate and i % 100 == 99:
+                # Sleep off however far ahead of rate / threads this thread got
+                ahead = (i + 1) * threads / rate - (time.perf_counter() - began)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    recorded_in = time.perf_counter() - started
+    # Let the writer catch up on its own, then time how long that took overall
+    while audit_log.stats()['flushed'] < audit_log.stats()['recorded']:
+        time.sleep(0.01)
+    written_in = time.perf_counter() - started
+
+    after = audit_log.stats()
+    recorded = after['recorded'] - before['recorded']
+    dropped = after['dropped'] - before['dropped']
+    rows = AuthEvent.objects.count()
+    pace = f'{rate:,}/s' if rate else 'flat out'
+    print(f"sustained {threads} threads, {pace}: {recorded / recorded_in:,.0f} events/s recorded, "
+          f"{rows / written_in:,.0f} rows/s written ({rows:,} rows in "
+          f"{after['flushes'] - before['flushes']} flushes), {dropped:,} dropped")
+
+
+def login_latency(logins):
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    _reset()
+    User = get_user_model()
+    User.objects.create_user('audit_bench', 'audit_bench@bench.example.com', 'redemption!')
+    body = json.dumps({'login': 'audit_bench', 'password': 'redemption!'})
+    client = Client()
+
+    def login():
+        response = client.post('/auth/login/', body, content_type='application/json')
+        assert response.status_code == 200, response.content
+
+    # Alternate on and off call by call, so drift and the writer's flushes hit both alike
+    samples = {False: [], True: []}
+    for i in range(2 * logins + 100):
+        enabled = bool(i % 2)
+        settings.AUDIT_LOG = {**getattr(settings, 'AUDIT_LOG', {}), 'ENABLED': enabled}
+        started = time.perf_counter()
+        login()
+        if i >= 100:  # warm up
+            samples[enabled].append(time.perf_counter() - started)
+    for enabled in (False, True):
+        result = summarize(samples[enabled])
+        print(f"login     audit {'on ' if enabled else 'off'}  mean {result['mean_us'] / 1000:.3f}ms  "
+              f"p50 {result['p50_us'] / 1000:.3f}ms  p99 {result['p99_us'] / 1000:.3f}ms")
+
+
+if __name__ == '__main__':
+    main()
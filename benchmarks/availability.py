@@ -0,0 +1,85 @@
+"""
+Username/email availability check cost as auth_user grows: indexed query vs. Bloom filter.
+
+Fills auth_user in steps, builds the availability filter from it and times
+three kinds of checks:
+
+    query   the LOWER() unique index probe every check used to need
+    free    availability_index for names nobody has (the common case, a filter miss)
+    taken   availability_index for existing names (filter hit + the same index probe)
+
+"free" should stay flat and query-free as the table grows; only the build time
+and the filter size scale.
+
+    python -m benchmarks.availability --sizes 100000 1000000
+"""
+
+import argparse
+import random
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from benchmarks.common import bulk_create_users, setup_django, summarize, teardown_django, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    # The index syncs in a background thread, which needs a file database
+    setup_django(test_db_file=Path(tempfile.gettempdir()) / 'auth_bench_availability.sqlite3')
+    try:
+        run(sorted(args.sizes), args.iterations)
+    finally:
+        teardown_django()
+
+
+def run(sizes, iterations):
+    from django.db import connection
+
+    from authentication.availability import availability_index, build_filter
+
+    print(f"{'users':>10} {'build':>8} {'filter':>9} {'query p50':>11} {'query p99':>11} "
+          f"{'free p50':>10} {'free p99':>10} {'taken p50':>11} {'taken p99':>11} {'free db':>10}")
+
+    created = 0
+    for size in sizes:
+        bulk_create_users(size - created, start=created)
+        created = size
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        started = time.perf_counter()
+        build_filter()
+        build = time.perf_counter() - started
+        availability_index.load()
+
+        def free_name():
+            return f'free_{uuid.uuid4().hex[:12]}'
+
+        def taken_name():
+            # bulk_create_users() names, in another case
+            return f'USER_{random.randrange(created)}'
+
+        query = summarize(time_calls(
+            lambda: availability_index._taken_query('username', free_name()).exists(), iterations,
+        ))
+        db_checks = availability_index.db_checks
+        free = summarize(time_calls(lambda: availability_index.is_available('username', free_name()), iterations))
+        false_positives = availability_index.db_checks - db_checks
+        taken = summarize(time_calls(lambda: availability_index.is_available('username', taken_name()), iterations))
+
+        stats = availability_index.stats()
+        print(f"{size:>10} {build:>7.1f}s {stats['filter_bytes'] / 2**20:>7.1f}MB "
+              f"{query['p50_us']:>9.1f}us {query['p99_us']:>9.1f}us "
+              f"{free['p50_us']:>8.1f}us {free['p99_us']:>8.1f}us "
+              f"{taken['p50_us']:>9.1f}us {taken['p99_us']:>9.1f}us "
+              f"{false_positives:>5}/{iterations}")
+
+
+if __name__ == '__main__':
+    main()
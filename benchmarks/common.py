@@ -0,0 +1,106 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Everything here runs against a throwaway test database (created the same way
+`manage.py test` does it) so benchmarks never touch db.sqlite3.
+"""
+
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(verbosity=0, test_db_file=None):
+    """
+    Configure Django and create a fresh, fully migrated test database.
+
+    SQLite test databases live in memory, where concurrent access from a second
+    thread fails with "table is locked" instead of waiting. Pass test_db_file
+    for benchmarks that exercise background threads.
+    """
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'auth_service.settings')
+
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    if test_db_file is not None:
+        connection.settings_dict['TEST']['NAME'] = str(test_db_file)
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+
+
+def teardown_django():
+    from django.db import connection
+    from django.test.utils import teardown_test_environment
+
+    from authentication.audit import audit_log
+    from authentication.last_login import last_logins
+    from authentication.revocation import revocations
+
+    # Their atexit flushes would only find the test database gone
+    last_logins.shutdown()
+    revocations.shutdown()
+    audit_log.shutdown()
+
+    connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
+    teardown_test_environment()
+
+
+def bulk_create_users(count, start=0, batch_size=5000):
+    """
+    Insert `count` users quickly.
+
+    Passwords are left unusable so we don't pay PBKDF2 per row - benchmarks that
+    need a real login create those users separately.
+    """
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+
+    User = get_user_model()
+    unusable = make_password(None)
+    for offset in range(start, start + count, batch_size):
+        stop = min(offset + batch_size, start + count)
+        User.objects.bulk_create([
+            User(
+                username=f'User_{i}',
+                email=f'user_{i}@bench.example.com',
+                password=unusable,
+            )
+            for i in range(offset, stop)
+        ])
+
+
+def time_calls(func, iterations):
+    """Call func() `iterations` times and return per-call latencies in seconds."""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Return mean/p50/p99 in microseconds for a list of second-based samples."""
+    return {
+        'mean_us': statistics.fmean(samples) * 1e6 if samples else 0.0,
+        'p50_us': percentile(samples, 50) * 1e6,
+        'p99_us': percentile(samples, 99) * 1e6,
+    }
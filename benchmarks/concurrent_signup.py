@@ -0,0 +1,154 @@
+"""
+Concurrent duplicate signups: check-then-INSERT vs. INSERT against the unique constraints.
+
+Every round, --threads threads register the same username/email at the same
+moment (in different letter case). Two registration paths are compared:
+
+    checked     the old flow - username__iexact and email__iexact exists() checks,
+                then create_user(). Three queries, two of them unindexed scans,
+                and racy: threads that pass the checks together collide on INSERT.
+                The IntegrityError that escapes is a 500 in the real view (and
+                before the case-insensitive constraints, a duplicate account).
+    constraint  UserRegistrationSerializer.save() - one INSERT, the unique
+                constraint picks the winner, losers get the usual 400 field error.
+
+Exactly one thread per round should create the user. Password hashing is swapped
+for MD5 and run inline so the numbers show the database side only.
+
+    python -m benchmarks.concurrent_signup --users 100000 --threads 16 --rounds 50
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from benchmarks.common import bulk_create_users, percentile, setup_django, teardown_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000, help='existing users in auth_user')
+    parser.add_argument('--threads', type=int, default=16, help='concurrent signups per round')
+    parser.add_argument('--rounds', type=int, default=30)
+    args = parser.parse_args()
+
+    # Threads need a shared database, which the in-memory SQLite test database can't do
+    setup_django(test_db_file=Path(tempfile.gettempdir()) / 'auth_bench_signup.sqlite3')
+    try:
+        from django.conf import settings
+
+        settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+        settings.PASSWORD_HASHER_POOL = {**getattr(settings, 'PASSWORD_HASHER_POOL', {}), 'WORKERS': 0}
+        run(args.users, args.threads, args.rounds)
+    finally:
+        teardown_django()
+
+
+def checked_signup(data):
+    from django.contrib.auth import get_user_model
+    from django.db import IntegrityError
+
+    User = get_user_model()
+    if User.objects.filter(username__iexact=data['username']).exists():
+        return 'duplicate'
+    if User.objects.filter(email__iexact=data['email']).exists():
+        return 'duplicate'
+    try:
+        User.objects.create_user(data['username'], data['email'].lower(), data['password'])
+    except IntegrityError:
+        return 'unhandled'
+    return 'created'
+
+
+def constraint_signup(data):
+    from django.db import IntegrityError
+    from rest_framework.exceptions import ValidationError
+
+    from authentication.serializers import UserRegistrationSerializer
+
+    serializer = UserRegistrationSerializer(data=data)
+    if not serializer.is_valid():
+        return 'invalid'
+    try:
+        serializer.save()
+    except ValidationError:
+        # What the view answers with a 400
+        return 'duplicate'
+    except IntegrityError:
+        return 'unhandled'
+    return 'created'
+
+
+def run(users, threads, rounds):
+    from django.db import connection
+
+    bulk_create_users(users)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    print(f"{users} existing users, {threads} concurrent signups x {rounds} rounds\n")
+    print(f"{'mode':<11} {'created':>8} {'400':>6} {'500':>6} {'rounds ok':>10} {'queries':>8} "
+          f"{'p50 ms':>8} {'p99 ms':>8}")
+
+    for mode, signup in (('checked', checked_signup), ('constraint', constraint_signup)):
+        outcomes, latencies, queries, rounds_ok = Counter(), [], [], 0
+        for round_number in range(rounds):
+            name = f'race_{mode}_{round_number}'
+            results = race(signup, name, threads)
+            round_outcomes = Counter(outcome for outcome, _, _ in results)
+            outcomes.update(round_outcomes)
+            latencies.extend(latency for _, latency, _ in results)
+            queries.extend(count for _, _, count in results)
+            rounds_ok += round_outcomes['created'] == 1 and round_outcomes['unhandled'] == 0
+
+        print(f"{mode:<11} {outcomes['created']:>8} {outcomes['duplicate']:>6} {outcomes['unhandled']:>6} "
+              f"{rounds_ok:>5}/{rounds:<4} {sum(queries) / len(queries):>8.2f} "
+              f"{percentile(latencies, 50) * 1000:>8.2f} {percentile(latencies, 99) * 1000:>8.2f}")
+
+
+def race(signup, name, threads):
+    """Run threads signups of name (in different case) at once; [(outcome, seconds, queries)]."""
+    barrier = threading.Barrier(threads)
+    results = []
+    lock = threading.Lock()
+
+    def worker(i):
+        from django.db import connection
+
+        variant = name.upper() if i % 2 else name.title()
+        data = {
+            'username': variant,
+            'email': f'{variant}@Race.Example.com',
+            'password': 'RacePass123!',
+            'password_confirm': 'RacePass123!',
+        }
+        count = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            count[0] += 1
+            return execute(sql, params, many, context)
+
+        try:
+            with connection.execute_wrapper(count_queries):
+                barrier.wait()
+                started = time.perf_counter()
+                outcome = signup(data)
+                elapsed = time.perf_counter() - started
+            with lock:
+                results.append((outcome, elapsed, count[0]))
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""
+Mixed-workload load test with per-endpoint throughput, latency and query counts.
+
+Every concurrent worker plays one user: it registers, then keeps picking its
+next request from the mix (login, refresh, profile GET/PUT, verify, logout,
+or registering a fresh user), carrying its tokens from one step to the next.
+Results are printed per endpoint and saved as JSON so runs can be compared:
+
+    # In-process (Django test client in threads, no server needed)
+    python -m benchmarks.load_test --concurrency 16 --duration 20
+
+    # Against a locally started gunicorn / uvicorn (pip install gunicorn uvicorn)
+    python -m benchmarks.load_test --server wsgi --workers 4 --concurrency 200
+    python -m benchmarks.load_test --server asgi --workers 4 --concurrency 200
+
+    # Custom mix, and a comparison with an earlier run
+    python -m benchmarks.load_test --mix profile_get=80,verify=20 --compare benchmarks/results/old.json
+
+DB query counts come from the X-DB-Queries header benchmarks.settings adds
+(see benchmarks/query_count.py). Results go to benchmarks/results/ unless
+--output says otherwise.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.common import BASE_DIR, setup_django, teardown_django
+from benchmarks.loadgen import LoadResult, Request, Response, run_load
+
+PASSWORD = 'LoadTest123!'
+
+DEFAULT_MIX = {
+    'profile_get': 40,
+    'verify': 15,
+    'refresh': 10,
+    'profile_put': 10,
+    'login': 10,
+    'logout': 5,
+    'register': 5,
+}
+
+RESULTS_DIR = BASE_DIR / 'benchmarks' / 'results'
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r} (one of {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class VirtualUser:
+    """One worker's user and tokens, and the request it sends next."""
+
+    def __init__(self, run_id, worker_id, mix, rng):
+        self.run_id = run_id
+        self.worker_id = worker_id
+        self.rng = rng
+        self.operations = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.operations]
+        self.registered = 0
+        self.username = None
+        self.access_token = None
+        self.refresh_token = None
+
+    def auth(self):
+        return {'Authorization': f'Bearer {self.access_token}'}
+
+    def next_request(self):
+        if self.username is None:
+            return self.register()
+        if self.access_token is None:
+            return self.login()
+        operation = self.rng.choices(self.operations, self.weights)[0]
+        return getattr(self, operation)()
+
+    # Operations
+
+    def register(self):
+        self.registered += 1
+        username = f'load_{self.run_id}_{self.worker_id}_{self.registered}'
+        return Request('POST', '/auth/register/', {
+            'username': username,
+            'email': f'{username}@load.example.com',
+            'password': PASSWORD,
+            'password_confirm': PASSWORD,
+        }, label='register')
+
+    def login(self):
+        return Request('POST', '/auth/login/', {'login': self.username, 'password': PASSWORD}, label='login')
+
+    def refresh(self):
+        return Request('POST', '/auth/token/refresh/', {'refresh': self.refresh_token}, label='refresh')
+
+    def profile_get(self):
+        return Request('GET', '/auth/user/', headers=self.auth(), label='profile_get')
+
+    def profile_put(self):
+        return Request('PUT', '/auth/user/', {'first_name': f'Load{self.rng.randrange(1000)}'},
+                       headers=self.auth(), label='profile_put')
+
+    def verify(self):
+        return Request('POST', '/auth/token/verify/', {'token': self.access_token}, label='verify')
+
+    def logout(self):
+        return Request('POST', '/auth/logout/', {'refresh': self.refresh_token}, headers=self.auth(), label='logout')
+
+    def on_response(self, request, response):
+        if request.label == 'register':
+            if response.status == 201:
+                self.username = request.body['username']
+                self.take_tokens(response)
+        elif request.label in ('login', 'refresh'):
+            if response.status == 200:
+                self.take_tokens(response)
+            elif request.label == 'refresh':
+                self.access_token = self.refresh_token = None
+        elif request.label == 'logout' and response.status == 200:
+            self.access_token = self.refresh_token = None
+        elif response.status == 401:
+            # Token got revoked or expired under us - log in again
+            self.access_token = self.refresh_token = None
+
+    def take_tokens(self, response):
+        data = response.json()
+        self.access_token = data['access']
+        self.refresh_token = data.get('refresh', self.refresh_token)
+
+
+def make_users(concurrency, mix, seed):
+    run_id = uuid.uuid4().hex[:6]
+    return [VirtualUser(run_id, i, mix, random.Random(seed + i)) for i in range(concurrency)]
+
+
+# Drivers
+
+def inprocess(users, duration):
+    # Same settings the benchmark servers run with, so the query counts show up here too
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    # Worker threads share the database, which an in-memory SQLite test database can't do
+    setup_django(test_db_file=Path(tempfile.gettempdir()) / 'auth_bench_load.sqlite3')
+    try:
+        return run_inprocess(users, duration)
+    finally:
+        teardown_django()
+
+
+def run_inprocess(users, duration):
+    """Drive the app through Django's test client, one thread per virtual user."""
+    from django.test import Client
+
+    result = LoadResult(elapsed=0.0)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(user):
+        from django.db import connection
+
+        # 500s (e.g. SQLite lock timeouts) are results too, not reasons to stop
+        client = Client(raise_request_exception=False)
+        try:
+            while time.perf_counter() < deadline:
+                request = user.next_request()
+                started = time.perf_counter()
+                raw = client.generic(
+                    request.method, request.path,
+                    data=json.dumps(request.body) if request.body is not None else '',
+                    content_type='application/json',
+                    headers=request.headers,
+                )
+                latency = time.perf_counter() - started
+                # Real clients don't keep the session cookie login() sets
+                client.cookies.clear()
+                response = Response(raw.status_code, {k.lower(): v for k, v in raw.items()}, raw.content)
+                with lock:
+                    result.record(request.label, latency, response)
+                user.on_response(request, response)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def run_server(kind, users, duration, port, workers):
+    from benchmarks.servers import prepare_database, running_server
+
+    prepare_database()
+    with running_server(kind, port, workers):
+        return asyncio.run(run_load(
+            '127.0.0.1', port,
+            lambda worker_id: users[worker_id].next_request(),
+            len(users), duration,
+            on_response=lambda worker_id, request, response: users[worker_id].on_response(request, response),
+        ))
+
+
+# Reporting
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(args, mix, result):
+    endpoints = result.summary()
+    total = sum(stats['requests'] for stats in endpoints.values())
+    failed = sum(
+        count for stats in endpoints.values() for code, count in stats['statuses'].items() if code >= 400
+    )
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'server': args.server,
+            'workers': args.workers if args.server != 'inprocess' else None,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'mix': mix,
+            'seed': args.seed,
+        },
+        'elapsed': result.elapsed,
+        'total': {
+            'requests': total,
+            'rps': total / result.elapsed if result.elapsed else 0.0,
+            'failed': failed,
+            'errors': dict(result.errors),
+        },
+        'endpoints': endpoints,
+    }
+
+
+def print_report(report, baseline=None):
+    print(f"\n{'endpoint':<12} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'queries':>8} {'non-2xx':>8}")
+    for label, stats in report['endpoints'].items():
+        queries = f"{stats['db_queries_mean']:.2f}" if stats['db_queries_mean'] is not None else '-'
+        failed = sum(count for code, count in stats['statuses'].items() if code >= 300)
+        print(f"{label:<12} {stats['requests']:>9} {stats['rps']:>8.1f} {stats['p50_ms']:>8.1f} "
+              f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {queries:>8} {failed:>8}")
+    total = report['total']
+    print(f"{'total':<12} {total['requests']:>9} {total['rps']:>8.1f}")
+    if total['errors']:
+        print(f"connection errors: {total['errors']}")
+
+    if baseline is not None:
+        print(f"\ncompared to {baseline['timestamp']} ({baseline.get('git_revision') or 'unknown revision'}):")
+        print(f"{'endpoint':<12} {'req/s':>10} {'p99':>10} {'queries':>10}")
+        for label, stats in report['endpoints'].items():
+            old = baseline['endpoints'].get(label)
+            if old is None:
+                continue
+            print(f"{label:<12} {change(old['rps'], stats['rps']):>10} "
+                  f"{change(old['p99_ms'], stats['p99_ms']):>10} "
+                  f"{change(old['db_queries_mean'], stats['db_queries_mean']):>10}")
+
+
+def change(old, new):
+    if old is None or new is None:
+        return '-'
+    if old == 0:
+        return 'same' if new == 0 else 'new'
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--server', choices=['inprocess', 'wsgi', 'asgi'], default='inprocess')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds')
+    parser.add_argument('--workers', type=int, default=2, help='server worker processes (wsgi/asgi)')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='operation weights, e.g. profile_get=40,verify=15,login=5 '
+                             f"(default: {','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())})")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, help='JSON results file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', type=Path, help='earlier JSON results to compare against')
+    args = parser.parse_args()
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    users = make_users(args.concurrency, args.mix, args.seed)
+
+    if args.server == 'inprocess':
+        result = inprocess(users, args.duration)
+    else:
+        from benchmarks.servers import SERVER_PACKAGES, require
+
+        require(SERVER_PACKAGES[args.server])
+        result = run_server(args.server, users, args.duration, args.port, args.workers)
+
+    report = build_report(args, args.mix, result)
+    print_report(report, baseline)
+
+    output = args.output or RESULTS_DIR / f"load-{args.server}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f'\nresults saved to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Small asyncio HTTP/1.1 load generator.
+
+Opens `concurrency` keep-alive connections to a running server and has each of
+them fire requests back to back for a fixed duration. Only what the benchmarks
+need is implemented (Content-Length bodies, no TLS, no chunked encoding), which
+keeps the client overhead low enough to push a local server at 1k connections
+without any third-party dependencies.
+"""
+
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+from benchmarks.common import percentile
+
+QUERY_COUNT_HEADER = 'x-db-queries'
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    body: object = None
+    headers: dict = field(default_factory=dict)
+    label: str = None
+
+    def encode(self, host):
+        payload = b''
+        headers = {'Host': host, 'Connection': 'keep-alive', **self.headers}
+        if self.body is not None:
+            payload = json.dumps(self.body).encode()
+            headers['Content-Type'] = 'application/json'
+        headers['Content-Length'] = str(len(payload))
+        head = f'{self.method} {self.path} HTTP/1.1\r\n'
+        head += ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+        return head.encode('latin-1') + b'\r\n' + payload
+
+
+@dataclass
+class Response:
+    status: int
+    headers: dict
+    body: bytes
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class Connection:
+    """A single keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def send(self, request):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(request.encode(f'{self.host}:{self.port}'))
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('server closed the connection')
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        body = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return Response(status, headers, body)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self.reader = self.writer = None
+
+
+async def request_once(host, port, request):
+    """Send a single request on a fresh connection (handy for setup steps)."""
+    connection = Connection(host, port)
+    try:
+        return await connection.send(request)
+    finally:
+        await connection.close()
+
+
+@dataclass
+class LoadResult:
+    elapsed: float
+    latencies: dict = field(default_factory=lambda: defaultdict(list))
+    statuses: dict = field(default_factory=lambda: defaultdict(Counter))
+    queries: dict = field(default_factory=lambda: defaultdict(list))
+    errors: Counter = field(default_factory=Counter)
+
+    def record(self, label, latency, response):
+        self.latencies[label].append(latency)
+        self.statuses[label][response.status] += 1
+        # Only servers running benchmarks.settings report their query counts
+        if QUERY_COUNT_HEADER in response.headers:
+            self.queries[label].append(int(response.headers[QUERY_COUNT_HEADER]))
+
+    def summary(self):
+        """Per-label throughput and latency percentiles (milliseconds), plus DB queries per request."""
+        report = {}
+        for label, samples in sorted(self.latencies.items()):
+            queries = self.queries.get(label)
+            report[label] = {
+                'requests': len(samples),
+                'rps': len(samples) / self.elapsed if self.elapsed else 0.0,
+                'p50_ms': percentile(samples, 50) * 1000,
+                'p95_ms': percentile(samples, 95) * 1000,
+                'p99_ms': percentile(samples, 99) * 1000,
+                'max_ms': max(samples) * 1000 if samples else 0.0,
+                'statuses': dict(self.statuses[label]),
+                'db_queries_mean': statistics.fmean(queries) if queries else None,
+                'db_queries_max': max(queries) if queries else None,
+            }
+        return report
+
+
+async def run_load(host, port, next_request, concurrency, duration, on_response=None):
+    """
+    Drive load against host:port.
+
+    next_request(worker_id) returns the Request a worker should send next
+    (or a coroutine producing one). on_response(worker_id, request, response)
+    is called after every successful exchange, which lets stateful workloads
+    carry tokens from one step to the next.
+    """
+    result = LoadResult(elapsed=0.0)
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id):
+        connection = Connection(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                request = next_request(worker_id)
+                if asyncio.iscoroutine(request):
+                    request = await request
+                label = request.label or f'{request.method} {request.path}'
+                started = time.perf_counter()
+                try:
+                    response = await connection.send(request)
+                except (ConnectionError, OSError, asyncio.IncompleteReadError) as exc:
+                    result.errors[type(exc).__name__] += 1
+                    await connection.close()
+                    continue
+                result.record(label, time.perf_counter() - started, response)
+                if on_response is not None:
+                    on_response(worker_id, request, response)
+        finally:
+            await connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,103 @@
+"""
+Per-call logging overhead: synchronous file/stream handlers vs. the JSON queue handler.
+
+Sets up the 'authentication' logger the way settings.LOGGING does in each
+mode - a file handler at INFO plus a console handler at DEBUG, the console
+going to a second file so the terminal doesn't set the pace - and times
+logger.info() and logger.debug() calls from --threads threads at once. The
+queue handlers' writer threads run meanwhile, as they would in production.
+Afterwards it reports how many records the queue mode dropped or sampled out.
+
+    python -m benchmarks.logging_pipeline --iterations 20000 --threads 8
+"""
+
+import argparse
+import logging
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.common import BASE_DIR, summarize
+
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000, help='Log calls per thread.')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--queue-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'mode':>6} {'call':>6} {'mean':>9} {'p50':>9} {'p99':>9} {'dropped':>9} {'sampled':>9} {'written':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ('sync', 'queue'):
+            for call in ('info', 'debug'):
+                run(Path(directory), mode, call, args)
+
+
+def make_handlers(directory, mode, queue_size):
+    if mode == 'sync':
+        file_handler = logging.FileHandler(directory / 'sync.log')
+        console = logging.StreamHandler(open(directory / 'sync-console.log', 'a'))
+    else:
+        from authentication.logs import QueueLogHandler
+        file_handler = QueueLogHandler(filename=directory / 'queue.log', queue_size=queue_size)
+        console = QueueLogHandler(filename=directory / 'queue-console.log', queue_size=queue_size,
+                                  sampling={'DEBUG': 0.01})
+    file_handler.setLevel(logging.INFO)
+    console.setLevel(logging.DEBUG)
+    return [file_handler, console]
+
+
+def run(directory, mode, call, args):
+    logger = logging.getLogger(f'bench.{mode}.{call}')
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handlers = make_handlers(directory, mode, args.queue_size)
+    for handler in handlers:
+        logger.addHandler(handler)
+    log = getattr(logger, call)
+
+    samples = []
+    lock = threading.Lock()
+    start = threading.Barrier(args.threads)
+
+    def worker(n):
+        mine = []
+        start.wait()
+        for i in range(args.iterations):
+            started = time.perf_counter()
+            log('Login for user %s took %.1fms', n * args.iterations + i, 12.5, extra={'status_code': 200})
+            mine.append(time.perf_counter() - started)
+        with lock:
+            samples.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    dropped = sampled = written = 0
+    for handler in handlers:
+        handler.flush()
+        if mode == 'queue':
+            stats = handler.stats()
+            dropped += stats['dropped']
+            sampled += stats['sampled_out']
+            written += stats['written']
+        logger.removeHandler(handler)
+        handler.close()
+
+    result = summarize(samples)
+    extra = f"{dropped:>9} {sampled:>9} {written:>9}" if mode == 'queue' else f"{'-':>9} {'-':>9} {'-':>9}"
+    print(f"{mode:>6} {call:>6} {result['mean_us']:>7.1f}us {result['p50_us']:>7.1f}us "
+          f"{result['p99_us']:>7.1f}us {extra}")
+
+
+if __name__ == '__main__':
+    main()
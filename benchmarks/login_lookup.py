@@ -0,0 +1,75 @@
+"""
+Login lookup benchmark: legacy OR/__iexact query vs. the indexed LOWER() probe.
+
+Grows auth_user in steps and times the user lookup half of a login (no password
+hashing) at each size. The indexed probe should stay flat while the legacy query
+grows linearly with the table.
+
+    python -m benchmarks.login_lookup --sizes 1000 10000 100000 --iterations 200
+"""
+
+import argparse
+import random
+
+from benchmarks.common import bulk_create_users, setup_django, summarize, teardown_django, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    try:
+        run(sorted(args.sizes), args.iterations)
+    finally:
+        teardown_django()
+
+
+def run(sizes, iterations):
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.db.models import Q, Value
+    from django.db.models.functions import Lower
+
+    from authentication.backends import find_user_by_login, lookup_field_for
+
+    User = get_user_model()
+
+    def legacy(login):
+        return User.objects.get(Q(username__iexact=login) | Q(email__iexact=login))
+
+    print(f"{'users':>10} {'lookup':>10} {'legacy p50':>12} {'legacy p99':>12} "
+          f"{'indexed p50':>12} {'indexed p99':>12}")
+
+    created = 0
+    for size in sizes:
+        bulk_create_users(size - created, start=created)
+        created = size
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        for kind in ('username', 'email'):
+            def pick():
+                i = random.randrange(size)
+                # Mixed case on purpose - lookups must be case-insensitive
+                return f'USER_{i}' if kind == 'username' else f'User_{i}@Bench.Example.com'
+
+            legacy_stats = summarize(time_calls(lambda: legacy(pick()), iterations))
+            indexed_stats = summarize(time_calls(lambda: find_user_by_login(pick()), iterations))
+            print(f"{size:>10} {kind:>10} {legacy_stats['p50_us']:>10.1f}us "
+                  f"{legacy_stats['p99_us']:>10.1f}us {indexed_stats['p50_us']:>10.1f}us "
+                  f"{indexed_stats['p99_us']:>10.1f}us")
+
+    print('\nQuery plans:')
+    legacy_qs = User.objects.filter(Q(username__iexact='someone') | Q(email__iexact='someone'))
+    print(f'  legacy: {legacy_qs.explain()}')
+    for login in ('someone', 'someone@example.com'):
+        field = lookup_field_for(login)
+        indexed_qs = User.objects.alias(lookup=Lower(field)).filter(lookup=Lower(Value(login)))
+        print(f'  indexed ({field}): {indexed_qs.explain()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Per-request middleware overhead: one full stack for everything vs. per-prefix profiles.
+
+Drives a WSGIHandler directly (no server, no test client) with a few typical
+requests, once with the old MIDDLEWARE (sessions, CSRF, auth, messages,
+clickjacking on every request) and once with the current settings
+(MIDDLEWARE + MIDDLEWARE_PROFILES, see authentication/middleware.py):
+
+    jwks        GET /auth/.well-known/jwks.json - a cheap API view
+    profile     GET /auth/user/ with a bearer token - a typical authenticated API call
+    preflight   OPTIONS /auth/login/ - a CORS preflight (CorsMiddleware short-circuited these before too)
+    liveness    GET /health/live/ - a load balancer probe
+    admin       GET /admin/login/ - should cost the same either way
+
+    python -m benchmarks.middleware --iterations 5000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django, summarize, teardown_django
+
+LEGACY_MIDDLEWARE = [
+    'authentication.middleware.ServerTimingMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    # Throwaway signing keys and no request logging, like the other server benchmarks
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    setup_django(test_db_file=Path(tempfile.gettempdir()) / 'auth_bench_middleware.sqlite3')
+    try:
+        run(args.iterations)
+    finally:
+        teardown_django()
+
+
+def requests(access_token):
+    auth = {'Authorization': f'Bearer {access_token}'}
+    preflight = {'Origin': 'http://localhost:3000', 'Access-Control-Request-Method': 'POST'}
+    return {
+        'jwks': ('GET', '/auth/.well-known/jwks.json', {}),
+        'profile': ('GET', '/auth/user/', auth),
+        'preflight': ('OPTIONS', '/auth/login/', preflight),
+        'liveness': ('GET', '/health/live/', {}),
+        'admin': ('GET', '/admin/login/', {}),
+    }
+
+
+def time_handler(handler, environ, iterations):
+    """Latencies (seconds) of handler answering environ, body included, and the statuses seen."""
+    from django.test.client import FakePayload
+
+    statuses = set()
+
+    def start_response(status, headers, exc_info=None):
+        statuses.add(status.split()[0])
+
+    samples = []
+    for _ in range(iterations):
+        request_environ = {**environ, 'wsgi.input': FakePayload(b'')}
+        started = time.perf_counter()
+        response = handler(request_environ, start_response)
+        b''.join(response)
+        response.close()
+        samples.append(time.perf_counter() - started)
+    return samples, statuses
+
+
+def compare(legacy, profiles, environ, iterations, rounds=10):
+    """Alternate between the two handlers so drift (GC, CPU clocks) hits both alike."""
+    full, profiled, statuses = [], [], set()
+    for _ in range(rounds):
+        samples, seen = time_handler(legacy, environ, iterations // rounds)
+        full.extend(samples)
+        statuses |= seen
+        samples, seen = time_handler(profiles, environ, iterations // rounds)
+        profiled.extend(samples)
+        statuses |= seen
+    return full, profiled, statuses
+
+
+def run(iterations):
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import RequestFactory
+    from django.test.utils import override_settings
+
+    from authentication.models import User
+    from authentication.tokens import RefreshToken
+
+    # Stock middleware relies on the Host check passing
+    settings.ALLOWED_HOSTS = ['*']
+    user = User.objects.create_user('middleware_bench', 'middleware_bench@bench.example.com', None)
+    access_token = str(RefreshToken.for_user(user).access_token)
+
+    with override_settings(MIDDLEWARE=LEGACY_MIDDLEWARE):
+        legacy = WSGIHandler()
+    profiles = WSGIHandler()
+
+    factory = RequestFactory()
+    print(f"{'request':<10} {'status':>7} {'full p50':>10} {'profiled p50':>13} {'full mean':>10} "
+          f"{'profiled mean':>14} {'saved':>9}")
+    for name, (method, path, headers) in requests(access_token).items():
+        environ = factory.generic(method, path, headers=headers).environ
+        # Warm up caches (user cache, JWKS) so only the middleware differs
+        time_handler(legacy, environ, 10)
+        time_handler(profiles, environ, 10)
+        full_samples, profiled_samples, statuses = compare(legacy, profiles, environ, iterations)
+        full, profiled = summarize(full_samples), summarize(profiled_samples)
+        saved = full['mean_us'] - profiled['mean_us']
+        print(f"{name:<10} {','.join(sorted(statuses)):>7} {full['p50_us']:>8.1f}us {profiled['p50_us']:>11.1f}us "
+              f"{full['mean_us']:>8.1f}us {profiled['mean_us']:>12.1f}us "
+              f"{saved:>7.1f}us ({saved / full['mean_us'] * 100:.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Purging expired revoked tokens: one big DELETE vs. throttled batches.
+
+Fills RevokedToken with --rows rows (--expired of them already expired),
+then deletes the expired ones, once with a single DELETE ... WHERE
+expires_at <= now and once with purge.purge_table(). Meanwhile a writer
+thread keeps revoking a token every few milliseconds, like the service
+would, and records how long each of its INSERTs waited. The single DELETE is
+faster in rows per second but holds the write lock for all of it; the
+batched purge should keep the writer's worst case near one batch.
+
+    python -m benchmarks.purge --rows 20000000 --batch-size 5000 --sleep 0.01
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from benchmarks.common import percentile, setup_django, teardown_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--expired', type=float, default=0.9, help='Share of rows that are expired.')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--sleep', type=float, default=0.01)
+    parser.add_argument('--methods', nargs='+', choices=['single', 'batched'], default=['single', 'batched'])
+    args = parser.parse_args()
+
+    # The writer thread needs its own connection to the same database
+    setup_django(test_db_file=Path(tempfile.gettempdir()) / 'auth_bench_purge.sqlite3')
+    try:
+        run(args)
+    finally:
+        teardown_django()
+
+
+def fill(rows, expired):
+    """rows RevokedTokens, the first expired share of them already expired, in one INSERT ... SELECT."""
+    from django.db import connection
+
+    from authentication.models import RevokedToken
+
+    RevokedToken.objects.all().delete()
+    now = time.time()
+    # Expired ones spread over the last week, the rest over the next one
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < %s)
+            INSERT INTO {RevokedToken._meta.db_table} (jti, expires_at, revoked_at)
+            SELECT lower(hex(randomblob(16))),
+                   datetime(CASE WHEN i < %s THEN %s - abs(random() %% 604800) ELSE %s + abs(random() %% 604800) END,
+                            'unixepoch'),
+                   datetime(%s, 'unixepoch')
+              FROM n
+            ''',
+            [rows, int(rows * expired), now, now + 60, now],
+        )
+        cursor.execute('ANALYZE')
+
+
+class Writer(threading.Thread):
+    """Revokes a token every interval seconds and records each INSERT's latency."""
+
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self.errors = 0
+        self.stopping = threading.Event()
+
+    def run(self):
+        from django.db import OperationalError, connection
+        from django.utils import timezone
+
+        from authentication.models import RevokedToken
+
+        expires_at = timezone.now() + timedelta(days=1)
+        while not self.stopping.is_set():
+            started = time.perf_counter()
+            try:
+                RevokedToken.objects.create(jti=uuid.uuid4().hex, expires_at=expires_at)
+            except OperationalError:  # database is locked, after SQLite's busy timeout
+                self.errors += 1
+            self.samples.append(time.perf_counter() - started)
+            time.sleep(self.interval)
+        connection.close()
+
+
+def delete_single():
+    from django.utils import timezone
+
+    from authentication.models import RevokedToken
+
+    deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def delete_batched(batch_size, sleep):
+    from authentication.purge import purge_table
+
+    return purge_table('revoked_tokens', batch_size=batch_size, sleep=sleep, restart=True)['deleted']
+
+
+def run(args):
+    print(f"{'method':>8} {'rows':>10} {'deleted':>10} {'seconds':>8} {'rows/s':>9} "
+          f"{'write p50':>10} {'write p99':>10} {'write max':>10} {'failed':>7}")
+    for method in args.methods:
+        fill(args.rows, args.expired)
+        writer = Writer()
+        writer.start()
+        started = time.perf_counter()
+        if method == 'single':
+            deleted = delete_single()
+        else:
+            deleted = delete_batched(args.batch_size, args.sleep)
+        seconds = time.perf_counter() - started
+        writer.stopping.set()
+        writer.join()
+
+        print(f"{method:>8} {args.rows:>10} {deleted:>10} {seconds:>7.1f}s {deleted / seconds:>9.0f} "
+              f"{percentile(writer.samples, 50) * 1e3:>8.1f}ms {percentile(writer.samples, 99) * 1e3:>8.1f}ms "
+              f"{max(writer.samples, default=0) * 1e3:>8.1f}ms {writer.errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Per-request database query counts for the load test.
+
+QueryCountMiddleware counts every query a request runs and reports the total
+in an X-DB-Queries response header, which the load generator reads. It's only
+installed by benchmarks.settings.
+
+The count lives in a context variable, so it follows the request into
+sync_to_async threads (the async views' ORM calls) but not into background
+threads like the revocation store's.
+"""
+
+import contextvars
+
+from asgiref.sync import iscoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.decorators import sync_and_async_middleware
+
+HEADER = 'X-DB-Queries'
+
+_counter = contextvars.ContextVar('db_query_counter', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    counter = _counter.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install(connection):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+@receiver(connection_created, dispatch_uid='benchmark_query_count')
+def install_on_connect(sender, connection, **kwargs):
+    install(connection)
+
+
+@sync_and_async_middleware
+def QueryCountMiddleware(get_response):
+    # Connections opened before this module was imported never sent connection_created
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            counter = [0]
+            token = _counter.set(counter)
+            try:
+                response = await get_response(request)
+            finally:
+                _counter.reset(token)
+            response[HEADER] = str(counter[0])
+            return response
+    else:
+        def middleware(request):
+            counter = [0]
+            token = _counter.set(counter)
+            try:
+                response = get_response(request)
+            finally:
+                _counter.reset(token)
+            response[HEADER] = str(counter[0])
+            return response
+
+    return middleware
@@ -0,0 +1,81 @@
+"""
+Revocation check cost as the revoked-token table grows.
+
+Fills RevokedToken in steps, warms the Bloom filter from it and times
+is_revoked() for tokens that were never revoked (the common case, answered by
+the filter) and for revoked ones (filter hit + jti index lookup). Both should
+stay flat as the table grows; only the warm-up time and filter size scale.
+
+    python -m benchmarks.revocation_store --sizes 100000 1000000 10000000
+"""
+
+import argparse
+import random
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from benchmarks.common import setup_django, summarize, teardown_django, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=20000)
+    args = parser.parse_args()
+
+    # The store's background thread reads the table too, so use a file database
+    setup_django(test_db_file=Path(tempfile.gettempdir()) / 'auth_bench_revocations.sqlite3')
+    try:
+        run(sorted(args.sizes), args.iterations, args.batch_size)
+    finally:
+        teardown_django()
+
+
+def run(sizes, iterations, batch_size):
+    from django.db import connection
+    from django.utils import timezone
+
+    from authentication.models import RevokedToken
+    from authentication.revocation import revocations
+
+    expires_at = timezone.now() + timedelta(days=7)
+    revoked_sample = []
+
+    print(f"{'rows':>10} {'warm-up':>9} {'filter':>9} {'unrevoked p50':>14} {'unrevoked p99':>14} "
+          f"{'revoked p50':>12} {'revoked p99':>12} {'db checks':>10}")
+
+    created = 0
+    for size in sizes:
+        while created < size:
+            count = min(batch_size, size - created)
+            jtis = [uuid.uuid4().hex for _ in range(count)]
+            RevokedToken.objects.bulk_create(
+                [RevokedToken(jti=jti, expires_at=expires_at) for jti in jtis]
+            )
+            revoked_sample.extend(random.sample(jtis, min(len(jtis), 50)))
+            created += count
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        started = time.perf_counter()
+        revocations.rebuild()
+        warm_up = time.perf_counter() - started
+
+        checks_before = revocations.db_checks
+        unrevoked = summarize(time_calls(lambda: revocations.is_revoked(uuid.uuid4().hex), iterations))
+        false_positives = revocations.db_checks - checks_before
+        revoked = summarize(time_calls(lambda: revocations.is_revoked(random.choice(revoked_sample)), iterations))
+
+        stats = revocations.stats()
+        print(f"{size:>10} {warm_up:>8.1f}s {stats['filter_bytes'] / 2**20:>7.1f}MB "
+              f"{unrevoked['p50_us']:>12.1f}us {unrevoked['p99_us']:>12.1f}us "
+              f"{revoked['p50_us']:>10.1f}us {revoked['p99_us']:>10.1f}us "
+              f"{false_positives:>5}/{iterations}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Per-response serialization cost: DRF ModelSerializer + stdlib JSON vs. compiled representation + orjson.
+
+Times the two steps every login/register/profile response goes through -
+building the user dict and rendering the whole body to JSON - for:
+
+    drf        UserSerializer(user).data through ModelSerializer's field machinery, DRF's JSONRenderer
+    compiled   serialize_user() (compiled_representation()), DRF's JSONRenderer
+    fast       serialize_user() and FastJSONRenderer (orjson, if installed) - what the views use
+
+and checks that all three produce the same bytes.
+
+    python -m benchmarks.serialization --iterations 20000
+"""
+
+import argparse
+from datetime import datetime, timezone
+
+from benchmarks.common import setup_django, summarize, teardown_django, time_calls
+
+# Roughly the size of a real RS256 token pair
+FAKE_TOKEN = 'eyJhbGciOiJSUzI1NiIsImtpZCI6ImJlbmNoIiwidHlwIjoiSldUIn0.' + 'x' * 560
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django()
+    try:
+        run(args.iterations)
+    finally:
+        teardown_django()
+
+
+def run(iterations):
+    from rest_framework import serializers
+    from rest_framework.renderers import JSONRenderer as DRFJSONRenderer
+
+    from authentication.models import User
+    from authentication.renderers import FastJSONRenderer, orjson
+    from authentication.serializers import UserSerializer, serialize_user
+
+    class ModelUserSerializer(UserSerializer):
+        """UserSerializer the way DRF would run it."""
+
+        def to_representation(self, instance):
+            return serializers.ModelSerializer.to_representation(self, instance)
+
+    user = User(
+        id=123456, username='Jo_Doe', email='jo@example.com', first_name='Jo', last_name='Doe',
+        date_joined=datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+        last_login=datetime(2026, 10, 17, 8, 9, 10, 111213, tzinfo=timezone.utc),
+    )
+
+    def body(user_data):
+        return {'message': 'Login successful', 'user': user_data, 'refresh': FAKE_TOKEN, 'access': FAKE_TOKEN}
+
+    def drf_serialize(user):
+        return ModelUserSerializer(user).data
+
+    variants = {
+        'drf': (drf_serialize, DRFJSONRenderer()),
+        'compiled': (serialize_user, DRFJSONRenderer()),
+        'fast': (serialize_user, FastJSONRenderer()),
+    }
+
+    outputs = {
+        name: renderer.render(body(serialize(user)))
+        for name, (serialize, renderer) in variants.items()
+    }
+    same = len(set(outputs.values())) == 1
+    print(f"orjson {'installed' if orjson else 'not installed (fast = compiled)'}, "
+          f"{len(outputs['drf'])} byte body, identical output: {'yes' if same else 'NO'}\n")
+    if not same:
+        for name, output in outputs.items():
+            print(f'{name}: {output!r}')
+
+    print(f"{'variant':<10} {'serialize p50':>14} {'render p50':>11} {'total mean':>11} {'total p99':>10} {'speedup':>8}")
+    baseline = None
+    for name, (serialize, renderer) in variants.items():
+        data = body(serialize(user))
+        serialized = summarize(time_calls(lambda: serialize(user), iterations))
+        rendered = summarize(time_calls(lambda: renderer.render(data), iterations))
+        total = summarize(time_calls(lambda: renderer.render(body(serialize(user))), iterations))
+        baseline = baseline or total['mean_us']
+        print(f"{name:<10} {serialized['p50_us']:>12.1f}us {rendered['p50_us']:>9.1f}us "
+              f"{total['mean_us']:>9.1f}us {total['p99_us']:>8.1f}us {baseline / total['mean_us']:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Start and stop local WSGI/ASGI servers for the HTTP benchmarks.
+
+Servers run with benchmarks.settings (a throwaway SQLite file) so they never
+touch db.sqlite3. gunicorn and uvicorn aren't app dependencies, install them
+to run these benchmarks:
+
+    pip install gunicorn uvicorn
+"""
+
+import importlib.util
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from benchmarks.common import BASE_DIR
+
+SETTINGS_MODULE = 'benchmarks.settings'
+
+SERVER_PACKAGES = {'wsgi': 'gunicorn', 'asgi': 'uvicorn'}
+
+
+def server_command(kind, port, workers, threads=32):
+    if kind == 'wsgi':
+        return [
+            sys.executable, '-m', 'gunicorn', 'auth_service.wsgi:application',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+            '--worker-class', 'gthread', '--threads', str(threads),
+            '--backlog', '4096', '--log-level', 'warning',
+        ]
+    if kind == 'asgi':
+        return [
+            sys.executable, '-m', 'uvicorn', 'auth_service.asgi:application',
+            '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers),
+            '--backlog', '4096', '--log-level', 'warning', '--no-access-log',
+        ]
+    raise ValueError(f'unknown server kind {kind!r}')
+
+
+def require(*modules):
+    missing = [name for name in modules if importlib.util.find_spec(name) is None]
+    if missing:
+        sys.exit(f"Missing benchmark dependencies: {', '.join(missing)} (pip install {' '.join(missing)})")
+
+
+def server_env(**extra):
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': SETTINGS_MODULE, **extra}
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(BASE_DIR), env.get('PYTHONPATH')]))
+    return env
+
+
+def prepare_database():
+    """Create (or reset) the benchmark database by running migrations into it."""
+    from benchmarks.settings import DATABASES
+
+    path = DATABASES['default']['NAME']
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    subprocess.run(
+        [sys.executable, 'manage.py', 'migrate', '--verbosity', '0'],
+        cwd=BASE_DIR, env=server_env(), check=True,
+    )
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.1)
+    raise TimeoutError(f'server did not start listening on port {port}')
+
+
+@contextmanager
+def running_server(kind, port, workers, **env):
+    # Own session so teardown can signal the whole tree (server workers, hasher pools)
+    process = subprocess.Popen(
+        server_command(kind, port, workers), cwd=BASE_DIR, env=server_env(**env), start_new_session=True,
+    )
+    try:
+        wait_for_port(port)
+        yield process
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            pass
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
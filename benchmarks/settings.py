@@ -0,0 +1,43 @@
+"""
+Settings for servers started by the benchmark scripts.
+
+Same as the real settings, except the database and signing keys are separate
+throwaway files, request logging to the console is turned off so it doesn't
+skew the numbers, and every response reports its query count (see
+benchmarks/query_count.py).
+"""
+
+import os
+import tempfile
+
+from auth_service.settings import *  # noqa: F401,F403
+from auth_service.settings import JWT_KEYS, LOGGING, MIDDLEWARE, SQLITE_OPTIONS
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['*']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('AUTH_BENCH_DB', os.path.join(tempfile.gettempdir(), 'auth_bench.sqlite3')),
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': SQLITE_OPTIONS,
+    }
+}
+
+JWT_KEYS = {
+    **JWT_KEYS,
+    'KEY_DIR': os.environ.get('AUTH_JWT_KEY_DIR', os.path.join(tempfile.gettempdir(), 'auth_bench_keys')),
+    'CREATE_FIRST_KEY': True,
+}
+
+MIDDLEWARE = ['benchmarks.query_count.QueryCountMiddleware', *MIDDLEWARE]
+
+LOGGING = {
+    **LOGGING,
+    'loggers': {
+        name: {**logger, 'handlers': ['file'], 'level': 'WARNING'}
+        for name, logger in LOGGING['loggers'].items()
+    },
+}
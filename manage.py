@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'auth_service.settings')
+    # The test suite runs without background writers and console logging (see test_settings.py)
+    testing = sys.argv[1:2] == ['test']
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'auth_service.test_settings' if testing else 'auth_service.settings')
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc: